@@ -0,0 +1,180 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.validation import fingerprints
+
+# Колонки выгрузки банка в том же порядке, что и в data/operations.xlsx
+EXPORT_COLUMNS = [
+    "Дата операции",
+    "Дата платежа",
+    "Номер карты",
+    "Статус",
+    "Сумма операции",
+    "Валюта операции",
+    "Сумма платежа",
+    "Валюта платежа",
+    "Кэшбэк",
+    "Категория",
+    "MCC",
+    "Описание",
+    "Бонусы (включая кэшбэк)",
+    "Округление на инвесткопилку",
+    "Сумма операции с округлением",
+]
+
+# Категория -> (MCC, вес, медиана суммы, описания); доли примерно как в реальной выгрузке
+CATEGORIES: Dict[str, Tuple[float, float, float, List[str]]] = {
+    "Супермаркеты": (5411, 0.34, 250, ["Колхоз", "Магнит", "SPAR", "Дикси", "Перекрёсток", "Пятёрочка"]),
+    "Фастфуд": (5814, 0.19, 200, ["McDonald's", "Бургер Кинг", "Rumyanyj Khleb", "Kofe s sobojj"]),
+    "Транспорт": (4131, 0.06, 60, ["Метро Санкт-Петербург", "Московский метрополитен"]),
+    "Ж/д билеты": (4112, 0.04, 1500, ["РЖД", "Северо-Западная пригородная пассажирская компания"]),
+    "Различные товары": (5399, 0.035, 900, ["Ozon.ru", "Wildberries"]),
+    "Связь": (7379, 0.03, 400, ["МТС", "Devajs Servis.", "REG.RU"]),
+    "Мобильная связь": (4814, 0.01, 300, ["Я МТС +7 921 11-22-33", "Билайн +7 962 717-08-52"]),
+    "Аптеки": (5912, 0.02, 500, ["Apteka 7", "Аптека Вита"]),
+    "Каршеринг": (7512, 0.02, 350, ["Ситидрайв", "Яндекс Драйв"]),
+    "Рестораны": (5812, 0.02, 1200, ["OOO Frittella", "Mouse Tail"]),
+    "Онлайн-кинотеатры": (7841, 0.005, 299, ["Okko", "Кинопоиск"]),
+    "Топливо": (5541, 0.01, 2000, ["Circle K", "Лукойл"]),
+    "Дом и ремонт": (5200, 0.015, 1700, ["МаксидоМ", "Строитель"]),
+    "Наличные": (6011, 0.015, 3000, ["Снятие в банкомате Сбербанк", "Снятие в банкомате Тинькофф"]),
+    "Переводы": (6012, 0.02, 2500, ["Перевод на карту", "Иван С.", "Сергей З.", "Анна М."]),
+    "Пополнения": (6012, 0.025, 10000, ["Перевод с карты", "Внесение наличных через банкомат Тинькофф"]),
+    "Бонусы": (np.nan, 0.005, 50, ["Вознаграждение за операции покупок"]),
+}
+
+# Категории с поступлениями: сумма операции положительная
+INCOME_CATEGORIES = {"Пополнения", "Бонусы"}
+
+CARDS = ["*7197", "*4556", "*5091", "*5441", None]
+CARD_WEIGHTS = [0.72, 0.17, 0.008, 0.002, 0.1]
+
+CURRENCIES = ["RUB", "TRY", "EUR", "CNY", "USD"]
+CURRENCY_WEIGHTS = [0.98, 0.011, 0.0045, 0.0027, 0.0018]
+# Рублей за единицу валюты: сумма операции в валюте, сумма платежа - в рублях
+CURRENCY_RATES = [1.0, 2.5, 90.0, 12.0, 80.0]
+
+FAILED_SHARE = 0.006
+CASHBACK_SHARE = 0.09
+
+START_DATE = "2018-01-01"
+
+
+def _columns(rows: int, seed: int, days: int) -> Dict[str, np.ndarray]:
+    """Генерирует значения колонок в виде numpy-массивов."""
+    rng = np.random.default_rng(seed)
+
+    names = list(CATEGORIES)
+    weights = np.array([CATEGORIES[name][1] for name in names])
+    category_idx = rng.choice(len(names), size=rows, p=weights / weights.sum())
+
+    # Описание выбирается внутри категории: равномерно по списку её описаний
+    descriptions = [description for name in names for description in CATEGORIES[name][3]]
+    offsets = np.cumsum([0] + [len(CATEGORIES[name][3]) for name in names])
+    counts = np.diff(offsets)
+    description_idx = offsets[category_idx] + (rng.random(rows) * counts[category_idx]).astype(np.int64)
+
+    medians = np.array([CATEGORIES[name][2] for name in names], dtype=np.float64)
+    amount = np.round(rng.lognormal(mean=np.log(medians[category_idx]), sigma=0.8), 2)
+    is_income = np.isin(category_idx, [names.index(name) for name in INCOME_CATEGORIES])
+    amount = np.where(is_income, amount, -amount)
+
+    start = np.datetime64(START_DATE, "s")
+    seconds = np.sort(rng.integers(0, days * 86400, size=rows))[::-1]
+    dates = start + seconds.astype("timedelta64[s]")
+
+    mcc = np.array([CATEGORIES[name][0] for name in names], dtype=np.float64)[category_idx]
+    cashback = np.where(rng.random(rows) < CASHBACK_SHARE, np.floor(np.abs(amount) / 100), np.nan)
+
+    return {
+        "dates": dates,
+        "card_idx": rng.choice(len(CARDS), size=rows, p=CARD_WEIGHTS),
+        "failed": rng.random(rows) < FAILED_SHARE,
+        "amount": amount,
+        "currency_idx": rng.choice(len(CURRENCIES), size=rows, p=CURRENCY_WEIGHTS),
+        "cashback": cashback,
+        "category_idx": category_idx,
+        "mcc": mcc,
+        "description_idx": description_idx,
+        "descriptions": np.array(descriptions, dtype=object),
+        "categories": np.array(names, dtype=object),
+    }
+
+
+def _format_dates(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Форматирует даты как в выгрузке: '%d.%m.%Y %H:%M:%S' и '%d.%m.%Y'.
+
+    strftime вызывается только для уникальных дней, время собирается из готовых двузначных строк.
+    """
+    days = dates.astype("datetime64[D]")
+    unique_days, day_idx = np.unique(days, return_inverse=True)
+    day_labels = pd.DatetimeIndex(unique_days).strftime("%d.%m.%Y").to_numpy(dtype=object)
+
+    seconds = (dates - days).astype(np.int64)
+    two_digits = np.array([f"{i:02d}" for i in range(60)], dtype=object)
+    day_str = day_labels[day_idx]
+    time_str = (
+        two_digits[seconds // 3600] + ":" + two_digits[seconds // 60 % 60] + ":" + two_digits[seconds % 60]
+    )
+    return day_str + " " + time_str, day_str
+
+
+def generate_export(rows: int, seed: int = 42, days: int = 4 * 365) -> pd.DataFrame:
+    """Возвращает синтетическую выгрузку операций в схеме data/operations.xlsx.
+
+    Результат детерминирован для пары (rows, seed); даты идут от новых к старым, как в выгрузке банка.
+    """
+    values = _columns(rows, seed, days)
+    operation_dates, payment_dates = _format_dates(values["dates"])
+    amount = values["amount"]
+    currency = np.array(CURRENCIES, dtype=object)[values["currency_idx"]]
+    operation_amount = np.round(amount / np.array(CURRENCY_RATES)[values["currency_idx"]], 2)
+
+    return pd.DataFrame(
+        {
+            "Дата операции": operation_dates,
+            "Дата платежа": payment_dates,
+            "Номер карты": np.array(CARDS, dtype=object)[values["card_idx"]],
+            "Статус": np.where(values["failed"], "FAILED", "OK"),
+            "Сумма операции": operation_amount,
+            "Валюта операции": currency,
+            "Сумма платежа": amount,
+            "Валюта платежа": "RUB",
+            "Кэшбэк": values["cashback"],
+            "Категория": values["categories"][values["category_idx"]],
+            "MCC": values["mcc"],
+            "Описание": values["descriptions"][values["description_idx"]],
+            "Бонусы (включая кэшбэк)": (np.abs(amount) // 100).astype(np.int64),
+            "Округление на инвесткопилку": np.zeros(rows, dtype=np.int64),
+            "Сумма операции с округлением": np.abs(amount),
+        },
+        columns=EXPORT_COLUMNS,
+    )
+
+
+def generate_normalized(rows: int, seed: int = 42, days: int = 4 * 365) -> pd.DataFrame:
+    """Возвращает те же операции, что generate_export, сразу в виде src.storage.normalize_transactions.
+
+    Позволяет готовить большие наборы без разбора строковых дат. Как и при
+    нормализации, непроведённые операции (FAILED) в набор не входят.
+    """
+    values = _columns(rows, seed, days)
+    frame = pd.DataFrame(
+        {
+            "date": pd.to_datetime(values["dates"]),
+            "card_number": pd.Categorical(np.array(CARDS, dtype=object)[values["card_idx"]]),
+            "status": pd.Categorical(np.where(values["failed"], "FAILED", "OK")),
+            "amount": np.round(values["amount"] / np.array(CURRENCY_RATES)[values["currency_idx"]], 2),
+            "currency": pd.Categorical.from_codes(values["currency_idx"], categories=CURRENCIES),
+            "payment_amount": values["amount"],
+            "payment_currency": pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), categories=["RUB"]),
+            "cashback": values["cashback"],
+            "category": pd.Categorical.from_codes(values["category_idx"], categories=list(values["categories"])),
+            "mcc": values["mcc"],
+            "description": pd.Categorical(values["descriptions"][values["description_idx"]]),
+        }
+    )
+    frame["fingerprint"] = fingerprints(frame)
+    return frame[~values["failed"]].iloc[::-1].reset_index(drop=True)
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.generator import generate_export
+from src.server import TransactionServer
+
+DEFAULT_PATHS = [
+    "/main?" + urlencode({"date": "2021-12-20 14:30:00"}),
+    "/services/cashback-categories?month=2021-11",
+    "/services/invest-bank?month=2021-11&limit=50",
+    "/reports/spending-by-category?" + urlencode({"category": "Супермаркеты", "date": "2021-12-31"}),
+]
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Сервер закрыл соединение")
+    status = int(status_line.split()[1])
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers, body
+
+
+async def _client(
+    host: str,
+    port: int,
+    paths: List[str],
+    counter: List[int],
+    total: int,
+    conditional: bool,
+    latencies: List[float],
+    statuses: Counter,
+) -> None:
+    """Одно keep-alive соединение: отправляет запросы, пока не исчерпан общий счётчик."""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags: Dict[str, str] = {}
+    try:
+        while counter[0] < total:
+            path = paths[counter[0] % len(paths)]
+            counter[0] += 1
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            if conditional and path in etags:
+                request += f"If-None-Match: {etags[path]}\r\n"
+            start = time.perf_counter()
+            writer.write((request + "\r\n").encode("latin-1"))
+            await writer.drain()
+            status, headers, _ = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if "etag" in headers:
+                etags[path] = headers["etag"]
+            if headers.get("connection") == "close":
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+    finally:
+        writer.close()
+
+
+def _percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def run_load(
+    host: str,
+    port: int,
+    paths: Optional[List[str]] = None,
+    connections: int = 10,
+    requests: int = 1000,
+    conditional: bool = False,
+) -> Dict[str, Any]:
+    """Отправляет requests запросов по connections соединениям и возвращает сводку."""
+    paths = paths or DEFAULT_PATHS
+    counter = [0]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(host, port, paths, counter, requests, conditional, latencies, statuses)
+            for _ in range(connections)
+        )
+    )
+    duration = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "connections": connections,
+        "conditional": conditional,
+        "duration_s": round(duration, 3),
+        "rps": round(len(latencies) / duration, 1) if duration else None,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.5) * 1000, 3),
+            "p90": round(_percentile(latencies, 0.9) * 1000, 3),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        }
+        if latencies
+        else {},
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+class LocalServer:
+    """Сервер в фоновом потоке со своим циклом событий - для самодостаточного прогона."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.server = TransactionServer(port=0, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="load-server", daemon=True)
+
+    def __enter__(self) -> "LocalServer":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        asyncio.run_coroutine_threadsafe(self.server.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа: python -m benchmarks.load --serve --rows 100000 --requests 2000"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Нагрузка на HTTP-сервер")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес сервера")
+    parser.add_argument("--port", type=int, default=8000, help="порт сервера")
+    parser.add_argument("--path", dest="paths", action="append", help="путь с параметрами (можно несколько)")
+    parser.add_argument("--connections", type=int, default=10, help="число keep-alive соединений")
+    parser.add_argument("--requests", type=int, default=1000, help="общее число запросов")
+    parser.add_argument("--conditional", action="store_true", help="отправлять If-None-Match с полученным ETag")
+    parser.add_argument("--serve", action="store_true", help="запустить локальный сервер на синтетических данных")
+    parser.add_argument("--rows", type=int, default=100_000, help="размер синтетической выгрузки для --serve")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="пул сервера для --serve")
+    parser.add_argument("--workers", type=int, default=None, help="размер пула сервера для --serve")
+    parser.add_argument("--output", help="файл для JSON с результатами (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    def load(host: str, port: int) -> Dict[str, Any]:
+        return asyncio.run(run_load(host, port, args.paths, args.connections, args.requests, args.conditional))
+
+    if args.serve:
+        with tempfile.TemporaryDirectory(prefix="load-") as work_dir:
+            source = os.path.join(work_dir, "operations.csv")
+            generate_export(args.rows).to_csv(source, index=False)
+            options = dict(source=source, store_dir=os.path.join(work_dir, "store"), executor=args.executor)
+            with LocalServer(workers=args.workers, **options) as local:
+                report = load(local.server.host, local.server.port)
+        report["rows"] = args.rows
+    else:
+        report = load(args.host, args.port)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.run import DEFAULT_SIZES, SCENARIOS, BenchmarkContext
+
+MB = 1024 * 1024
+# Как часто фоновый поток читает RSS процесса, секунды
+RSS_INTERVAL = 0.002
+METRICS = ["traced_peak_mb", "rss_peak_mb"]
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> Optional[int]:
+    """Текущий RSS процесса в байтах (по /proc/self/statm); None, если он недоступен."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RSSSampler:
+    """Пиковый RSS за время блока with: фоновый поток читает RSS каждые interval секунд.
+
+    Короткий всплеск между замерами может быть пропущен, поэтому пик RSS -
+    оценка снизу; точный пик выделений Python и numpy даёт tracemalloc.
+    """
+
+    def __init__(self, interval: float = RSS_INTERVAL) -> None:
+        self.interval = interval
+        self.start: Optional[int] = None
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+
+    def _update(self) -> None:
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._update()
+
+    def __enter__(self) -> "RSSSampler":
+        self.start = current_rss()
+        self.peak = self.start
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._update()
+
+
+def measure_call(call: Callable[[], Any]) -> Dict[str, Optional[float]]:
+    """Пиковая память одного вызова после прогрева, в мегабайтах.
+
+    traced_peak_mb - пик выделений сверх уже занятых (tracemalloc, включая
+    массивы numpy и pandas), rss_peak_mb - прирост RSS процесса, rss_mb -
+    пиковый RSS целиком. Прогрев заполняет кэши, поэтому замер показывает
+    память, которую вызов занимает каждый раз (например, копии DataFrame).
+    """
+    call()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        with RSSSampler() as rss:
+            call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "traced_peak_mb": (peak - baseline) / MB,
+        "rss_peak_mb": (rss.peak - rss.start) / MB if rss.start is not None and rss.peak is not None else None,
+        "rss_mb": rss.peak / MB if rss.peak is not None else None,
+    }
+
+
+def run_memory(sizes: List[int], scenarios: Optional[List[str]] = None, seed: int = 42) -> Dict[str, Any]:
+    """Замеряет пиковую память сценариев benchmarks.run на синтетических данных заданных размеров."""
+    # Без ключа apilayer сетевые вызовы заменяются демонстрационными значениями
+    os.environ.pop("API_KEY", None)
+    names = scenarios or list(SCENARIOS)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="transaction_memory_") as work_dir:
+        for rows in sizes:
+            ctx = BenchmarkContext(rows, seed, work_dir)
+            for name in names:
+                record: Dict[str, Any] = {"scenario": name, "rows": rows}
+                try:
+                    record.update(measure_call(SCENARIOS[name](ctx)))
+                except Exception as e:
+                    record["error"] = f"{type(e).__name__}: {e}"
+                results.append(record)
+                print(json.dumps(record, ensure_ascii=False), file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def parse_budget(value: str) -> Dict[str, Any]:
+    """Бюджет вида "сценарий=МБ" или "сценарий@строк=МБ" (только для этого размера)."""
+    target, _, limit = value.rpartition("=")
+    scenario, _, rows = target.partition("@")
+    try:
+        return {"scenario": scenario, "rows": int(rows) if rows else None, "limit_mb": float(limit)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Бюджет должен иметь вид сценарий[@строк]=МБ: {value}")
+
+
+def check_budgets(
+    report: Dict[str, Any], budgets: List[Dict[str, Any]], metric: str = "traced_peak_mb"
+) -> List[Dict[str, Any]]:
+    """Замеры, превысившие бюджеты; бюджет для конкретного размера важнее общего для сценария."""
+    violations = []
+    for record in report["results"]:
+        if record.get(metric) is None:
+            continue
+        matching = [b for b in budgets if b["scenario"] == record["scenario"] and b["rows"] in (None, record["rows"])]
+        if not matching:
+            continue
+        budget = max(matching, key=lambda b: b["rows"] is not None)
+        if record[metric] > budget["limit_mb"]:
+            violations.append(
+                {
+                    "scenario": record["scenario"],
+                    "rows": record["rows"],
+                    "metric": metric,
+                    "value_mb": record[metric],
+                    "limit_mb": budget["limit_mb"],
+                }
+            )
+    return violations
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа: python -m benchmarks.memory --sizes 10000 100000 --budget spending_by_category=200"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory", description="Пиковая память сценариев")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="размеры наборов (строк)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="замеряемые сценарии")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора данных")
+    parser.add_argument("--output", help="файл для JSON с результатами (по умолчанию stdout)")
+    parser.add_argument(
+        "--budget", type=parse_budget, action="append", default=[], help="бюджет сценарий[@строк]=МБ (можно несколько)"
+    )
+    parser.add_argument("--metric", choices=METRICS, default=METRICS[0], help="величина, сравниваемая с бюджетом")
+    args = parser.parse_args(argv)
+
+    report = run_memory(args.sizes, args.scenarios, args.seed)
+    exit_code = 0
+    if args.budget:
+        report["violations"] = check_budgets(report, args.budget, args.metric)
+        for violation in report["violations"]:
+            print(
+                f"Превышен бюджет памяти: {violation['scenario']} на {violation['rows']} строк - "
+                f"{violation['value_mb']:.1f} МБ при лимите {violation['limit_mb']:.1f} МБ",
+                file=sys.stderr,
+            )
+        exit_code = 1 if report["violations"] else 0
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generator import generate_export, generate_normalized
+from src.reports import spending_by_category, spending_by_weekday
+from src.services import (
+    analyze_profitable_categories,
+    find_recurring_payments,
+    forecast_spending,
+    investment_bank,
+    period_summary,
+    simulate_cashback,
+    spending_distribution,
+)
+from src.storage import EXPORT_NAMES, TransactionStore
+from src.utils import get_card_stats, get_top_transactions
+from src.views import get_main_page_json
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Сценарий: имя -> функция, которая готовит данные и возвращает замеряемый вызов
+Scenario = Callable[["BenchmarkContext"], Callable[[], Any]]
+
+
+class BenchmarkContext:
+    """Данные одного размера, общие для всех сценариев."""
+
+    def __init__(self, rows: int, seed: int, work_dir: str) -> None:
+        self.rows = rows
+        self.seed = seed
+        self.work_dir = work_dir
+        self.normalized = generate_normalized(rows, seed)
+        self.end_date = self.normalized["date"].max()
+        self._source: Optional[str] = None
+        self._history: Optional[pd.DataFrame] = None
+
+    @property
+    def source(self) -> str:
+        """CSV-выгрузка того же размера (создаётся по требованию)."""
+        if self._source is None:
+            self._source = os.path.join(self.work_dir, f"operations_{self.rows}.csv")
+            generate_export(self.rows, self.seed).to_csv(self._source, index=False)
+        return self._source
+
+    @property
+    def store_dir(self) -> str:
+        return os.path.join(self.work_dir, f"store_{self.rows}")
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """Нормализованные данные, отсортированные по дате, как их возвращает хранилище."""
+        if self._history is None:
+            self._history = self.normalized.sort_values("date", kind="stable").reset_index(drop=True)
+        return self._history
+
+    @property
+    def export(self) -> pd.DataFrame:
+        """Нормализованные данные с колонками выгрузки для src.reports."""
+        return self.normalized.rename(columns=EXPORT_NAMES)
+
+
+def _ingest(ctx: BenchmarkContext) -> Callable[[], Any]:
+    source = ctx.source
+    return lambda: TransactionStore(ctx.store_dir).ingest(source)
+
+
+def _main_page(ctx: BenchmarkContext) -> Callable[[], Any]:
+    store = TransactionStore(ctx.store_dir)
+    if not store.is_fresh(ctx.source):
+        store.ingest(ctx.source)
+    date_str = ctx.end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: get_main_page_json(date_str, store_dir=ctx.store_dir, source=ctx.source)
+
+
+def _card_stats(ctx: BenchmarkContext) -> Callable[[], Any]:
+    return lambda: get_card_stats(ctx.normalized)
+
+
+def _top_transactions(ctx: BenchmarkContext) -> Callable[[], Any]:
+    return lambda: get_top_transactions(ctx.normalized, top_n=5)
+
+
+def _spending_by_category(ctx: BenchmarkContext) -> Callable[[], Any]:
+    transactions = ctx.export
+    date = ctx.end_date.strftime("%Y-%m-%d")
+    return lambda: spending_by_category.__wrapped__(transactions, "Супермаркеты", date=date)
+
+
+def _spending_by_weekday(ctx: BenchmarkContext) -> Callable[[], Any]:
+    transactions = ctx.export
+    date = ctx.end_date.strftime("%Y-%m-%d")
+    return lambda: spending_by_weekday.__wrapped__(transactions, date=date)
+
+
+def _profitable_categories(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data = ctx.normalized.copy(deep=False)
+    end = ctx.end_date
+    return lambda: analyze_profitable_categories(data, end.year, end.month)
+
+
+def _investment_bank(ctx: BenchmarkContext) -> Callable[[], Any]:
+    transactions = [
+        {EXPORT_NAMES["date"]: date, EXPORT_NAMES["amount"]: amount}
+        for date, amount in zip(ctx.normalized["date"].dt.strftime("%Y-%m-%d"), ctx.normalized["amount"])
+    ]
+    month = ctx.end_date.strftime("%Y-%m")
+    return lambda: investment_bank(month, transactions, 50)
+
+
+def _period_summary(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data, date_str = ctx.history, ctx.end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: period_summary(data, date_str, "Y")
+
+
+def _spending_distribution(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data, date_str = ctx.history, ctx.end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: spending_distribution(data, date_str, "Y")
+
+
+def _recurring_payments(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data = ctx.history
+    return lambda: find_recurring_payments(data)
+
+
+def _forecast_spending(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data, date_str = ctx.history, ctx.end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: forecast_spending(data, date_str)
+
+
+def _cashback_simulation(ctx: BenchmarkContext) -> Callable[[], Any]:
+    data = ctx.history
+    return lambda: simulate_cashback(data)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "ingest": _ingest,
+    "get_main_page_json": _main_page,
+    "get_card_stats": _card_stats,
+    "get_top_transactions": _top_transactions,
+    "spending_by_category": _spending_by_category,
+    "spending_by_weekday": _spending_by_weekday,
+    "analyze_profitable_categories": _profitable_categories,
+    "investment_bank": _investment_bank,
+    "period_summary": _period_summary,
+    "spending_distribution": _spending_distribution,
+    "find_recurring_payments": _recurring_payments,
+    "forecast_spending": _forecast_spending,
+    "simulate_cashback": _cashback_simulation,
+}
+
+
+def time_call(call: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Выполняет вызов repeat раз после одного прогрева и возвращает статистику в секундах."""
+    call()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        durations.append(time.perf_counter() - start)
+    return {"min": min(durations), "median": statistics.median(durations), "max": max(durations)}
+
+
+def run_benchmarks(
+    sizes: List[int], scenarios: Optional[List[str]] = None, repeat: int = 3, seed: int = 42
+) -> Dict[str, Any]:
+    """Прогоняет сценарии на синтетических данных заданных размеров."""
+    # Без ключа apilayer сетевые вызовы заменяются демонстрационными значениями
+    os.environ.pop("API_KEY", None)
+    names = scenarios or list(SCENARIOS)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="transaction_bench_") as work_dir:
+        for rows in sizes:
+            ctx = BenchmarkContext(rows, seed, work_dir)
+            for name in names:
+                record: Dict[str, Any] = {"scenario": name, "rows": rows, "repeat": repeat}
+                try:
+                    record.update(time_call(SCENARIOS[name](ctx), repeat))
+                except Exception as e:
+                    record["error"] = f"{type(e).__name__}: {e}"
+                results.append(record)
+                print(json.dumps(record, ensure_ascii=False), file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Сравнивает медианы двух прогонов: ratio > 1 означает замедление."""
+
+    def key(record: Dict[str, Any]) -> Tuple[str, int]:
+        return record["scenario"], record["rows"]
+
+    before = {key(r): r for r in baseline["results"] if "median" in r}
+    rows = []
+    for record in current["results"]:
+        old = before.get(key(record))
+        if old is None or "median" not in record:
+            continue
+        rows.append(
+            {
+                "scenario": record["scenario"],
+                "rows": record["rows"],
+                "baseline": old["median"],
+                "current": record["median"],
+                "ratio": record["median"] / old["median"] if old["median"] else float("inf"),
+            }
+        )
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа: python -m benchmarks.run --sizes 10000 100000 --output bench.json"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Бенчмарки Transaction Service")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="размеры наборов (строк)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="запускаемые сценарии")
+    parser.add_argument("--repeat", type=int, default=3, help="число замеров на сценарий")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора данных")
+    parser.add_argument("--output", help="файл для JSON с результатами (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения медиан")
+    parser.add_argument("--max-ratio", type=float, default=None, help="код 1, если замедление превышает порог")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.scenarios, args.repeat, args.seed)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+        if args.max_ratio is not None and any(row["ratio"] > args.max_ratio for row in report["comparison"]):
+            exit_code = 1
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,28 @@
+import os
 from pathlib import Path
+from typing import Optional
 
 CURRENT_FILE = Path(__file__).resolve()
 ROOT_DIR = CURRENT_FILE.parent
 
 FILE_XLSX = f"{ROOT_DIR}/data/operations.xlsx"
 FILE_JSON = f"{ROOT_DIR}/data/user_settings.json"
+USER_SETTINGS_DIR = f"{ROOT_DIR}/data/users"
+STORE_DIR = f"{ROOT_DIR}/data/store"
+FX_RATES_FILE = f"{ROOT_DIR}/data/fx_rates.csv"
+LOG_FILE = "app.log"
+
+
+def init_app(env_file: Optional[str] = None, log_file: str = LOG_FILE) -> None:
+    """Явная инициализация приложения: переменные окружения из .env и журналирование.
+
+    Вызывается точкой входа (main.py), а не при импорте модулей src.
+    Журнал пишется фоновым потоком в JSON Lines с ротацией (см. src.logger);
+    при LOG_METRICS=1 в окружении в него попадают и метрики запросов.
+    """
+    from dotenv import load_dotenv
+
+    from src.logger import setup_logging
+
+    load_dotenv(env_file)
+    setup_logging(log_file, log_metrics=os.getenv("LOG_METRICS") == "1")
@@ -1,23 +1,19 @@
-import json
-from datetime import datetime
-from src.views import get_main_page_json
+import sys
 
+from src.cli import run_cli
 
-def main():
-    """Основная функция запуска проекта"""
 
-    print("===========================================")
-    print("      💳 Transaction Service запущен       ")
-    print("===========================================\n")
+def main() -> int:
+    """Основная функция запуска проекта
 
-    # Пример использования - текущая дата
-    date_str = "2020-05-20 14:30:00"
-
-    print("Главная страница (пример JSON):")
-    result = get_main_page_json(date_str)
-    print(json.dumps(result, indent=2, ensure_ascii=False))
-    print("\n✅ Работа программы завершена.")
+    Примеры:
+        python main.py main-page --date "2020-05-20 14:30:00"
+        python main.py spending-by-weekday --date 2021-12-31 --format table
+        python main.py ingest --store data/store
+        python main.py main-page --store data/store --repeat 20 --profile
+    """
+    return run_cli(sys.argv[1:])
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import json
+import math
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence
+
+from src.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+class CashbackProgram:
+    """Программа кэшбэка: ставки по категориям и MCC, повышенные категории и месячный лимит.
+
+    Ставка операции - ставка её MCC из mcc_rates, иначе ставка категории из
+    category_rates, иначе base_rate (ставки - доли: 0.01 = 1%). В
+    повышенных категориях (increased; пустой список - любые категории)
+    вместо обычной ставки начисляется increased_rate: при choose = 0 во всех
+    них, иначе в choose категориях на выбор, которые выбираются каждый
+    месяц с наибольшей выгодой. Кэшбэк за месяц не больше monthly_cap.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_rate: float = 0.01,
+        category_rates: Optional[Mapping[str, float]] = None,
+        mcc_rates: Optional[Mapping[int, float]] = None,
+        increased: Sequence[str] = (),
+        increased_rate: float = 0.0,
+        choose: int = 0,
+        monthly_cap: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.base_rate = base_rate
+        self.category_rates = dict(category_rates or {})
+        self.mcc_rates = {int(mcc): rate for mcc, rate in (mcc_rates or {}).items()}
+        self.increased = list(increased)
+        self.increased_rate = increased_rate
+        self.choose = choose
+        self.monthly_cap = monthly_cap
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "CashbackProgram":
+        """Программа из словаря с ключами аргументов конструктора (например, из JSON)."""
+        return cls(**data)
+
+    def __repr__(self) -> str:
+        return f"CashbackProgram({self.name!r})"
+
+
+# Программы для сравнения по умолчанию; первая - текущие 1% на все покупки (см. src.utils.get_card_stats)
+DEFAULT_PROGRAMS = [
+    CashbackProgram("1% на всё"),
+    CashbackProgram("5% в 3 категориях на выбор", increased_rate=0.05, choose=3, monthly_cap=3000),
+    CashbackProgram(
+        "3% на супермаркеты и фастфуд",
+        base_rate=0.005,
+        category_rates={"Супермаркеты": 0.03, "Фастфуд": 0.03},
+        monthly_cap=5000,
+    ),
+    CashbackProgram("10% на топливо", mcc_rates={5541: 0.1, 5542: 0.1}, monthly_cap=1000),
+]
+
+
+def load_programs(path: str) -> List[CashbackProgram]:
+    """Читает программы из JSON-файла: список словарей с ключами аргументов CashbackProgram."""
+    with open(path, encoding="utf-8") as f:
+        return [CashbackProgram.from_dict(item) for item in json.load(f)]
+
+
+class CashbackSimulator:
+    """Кэшбэк нескольких программ для всех карт и месяцев за один проход.
+
+    Расходы операций (по модулю, в рублях) один раз складываются в массив
+    карты x месяцы x корзины, где корзина - пара (категория, MCC). Ставки
+    программ - матрица программы x корзины, поэтому обычный кэшбэк всех
+    программ - одно произведение массивов. Для повышенных категорий
+    выгода от повышенной ставки в каждой категории сортируется по убыванию,
+    и выбираются первые choose; после этого применяется месячный лимит.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        amount = np.nan_to_num(df["amount"].to_numpy(dtype=float, na_value=np.nan))
+        rows = np.flatnonzero((amount < 0) & df["card_number"].notna().to_numpy() & df["date"].notna().to_numpy())
+        spent = -amount[rows]
+
+        cards, self.cards = pd.factorize(df["card_number"].to_numpy()[rows], sort=True)
+        months = df["date"].to_numpy()[rows].astype("datetime64[M]")
+        month_codes, self.months = pd.factorize(months, sort=True)
+        categories = df["category"].to_numpy()[rows] if "category" in df.columns else np.full(len(rows), None)
+        category_codes, self.categories = pd.factorize(categories, use_na_sentinel=False)
+        if "mcc" in df.columns:
+            mcc = pd.to_numeric(df["mcc"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)[rows]
+        else:
+            mcc = np.full(len(rows), np.nan)
+        mcc_codes, self.mccs = pd.factorize(mcc, use_na_sentinel=False)
+
+        # Корзина - встречающаяся в данных пара (категория, MCC)
+        pairs = category_codes.astype(np.int64) * (len(self.mccs) + 1) + mcc_codes
+        bucket_codes, bucket_pairs = pd.factorize(pairs)
+        self.bucket_category = (bucket_pairs // (len(self.mccs) + 1)).astype(np.int64)
+        self.bucket_mcc = (bucket_pairs % (len(self.mccs) + 1)).astype(np.int64)
+
+        shape = (len(self.cards), len(self.months), len(bucket_pairs))
+        flat = (cards.astype(np.int64) * shape[1] + month_codes) * shape[2] + bucket_codes
+        self.spent = np.bincount(flat, weights=spent, minlength=math.prod(shape)).reshape(shape)
+        # Корзины -> категории: матрица для сложения расходов корзин по категориям
+        self.category_matrix = np.zeros((len(bucket_pairs), len(self.categories)))
+        self.category_matrix[np.arange(len(bucket_pairs)), self.bucket_category] = 1.0
+
+    def _rates(self, programs: Sequence[CashbackProgram]) -> np.ndarray:
+        """Ставки программ в корзинах: матрица программы x корзины."""
+        rates = np.empty((len(programs), len(self.bucket_category)))
+        category_names = [None if pd.isna(value) else str(value) for value in self.categories]
+        mcc_values = [None if pd.isna(value) else int(value) for value in self.mccs]
+        for p, program in enumerate(programs):
+            # Операции без категории или MCC получают базовую ставку и не совпадают ни с одной ставкой по MCC
+            by_category = np.array(
+                [
+                    program.base_rate if name is None else program.category_rates.get(name, program.base_rate)
+                    for name in category_names
+                ]
+            )
+            by_mcc = np.array([np.nan if mcc is None else program.mcc_rates.get(mcc, np.nan) for mcc in mcc_values])
+            mcc_rate = by_mcc[self.bucket_mcc]
+            rates[p] = np.where(np.isnan(mcc_rate), by_category[self.bucket_category], mcc_rate)
+        return rates
+
+    def simulate(self, programs: Sequence[CashbackProgram]) -> Dict[str, np.ndarray]:
+        """Кэшбэк программ по картам и месяцам.
+
+        Возвращает cashback - массив программы x карты x месяцы и chosen -
+        булев массив программы x карты x месяцы x категории с повышенными
+        категориями, в которых начислена повышенная ставка.
+        """
+        rates = self._rates(programs)
+        regular = np.einsum("cmb,pb->pcmb", self.spent, rates)
+        by_category = regular @ self.category_matrix
+        category_spent = self.spent @ self.category_matrix
+
+        names = [None if pd.isna(value) else str(value) for value in self.categories]
+        increased_rates = np.array([program.increased_rate for program in programs])
+        offered = np.array(
+            [[not program.increased or name in program.increased for name in names] for program in programs],
+            dtype=bool,
+        ).reshape(len(programs), len(names))
+        # Выгода повышенной ставки в каждой категории вместо обычных ставок её корзин
+        gain = increased_rates[:, None, None, None] * category_spent[None] - by_category
+        gain = np.where(offered[:, None, None, :], np.maximum(gain, 0.0), 0.0)
+
+        order = np.argsort(-gain, axis=-1, kind="stable")
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(len(names))[None, None, None, :], axis=-1)
+        limits = np.array([program.choose or len(names) for program in programs])
+        chosen = (ranks < limits[:, None, None, None]) & (gain > 0)
+
+        caps = np.array([math.inf if program.monthly_cap is None else program.monthly_cap for program in programs])
+        cashback = regular.sum(axis=-1) + np.where(chosen, gain, 0.0).sum(axis=-1)
+        return {"cashback": np.minimum(cashback, caps[:, None, None]), "chosen": chosen}
+
+    def best(self, programs: Sequence[CashbackProgram]) -> List[Dict[str, Any]]:
+        """Лучшая программа для каждой карты по сумме кэшбэка за все месяцы и кэшбэк каждой программы."""
+        result = self.simulate(programs)
+        totals = result["cashback"].sum(axis=-1)
+        best = totals.argmax(axis=0) if len(programs) else np.zeros(len(self.cards), dtype=np.int64)
+        months = [str(month)[:7] for month in self.months]
+        names = [None if pd.isna(value) else str(value) for value in self.categories]
+
+        cards: List[Dict[str, Any]] = []
+        for c, card in enumerate(self.cards):
+            p = int(best[c])
+            chosen = result["chosen"][p, c]
+            cards.append(
+                {
+                    "card_number": str(card),
+                    "best": programs[p].name,
+                    "spent": round(float(self.spent[c].sum()), 2),
+                    "cashback": {program.name: round(float(totals[i, c]), 2) for i, program in enumerate(programs)},
+                    "months": [
+                        {
+                            "month": month,
+                            "cashback": round(float(result["cashback"][p, c, m]), 2),
+                            "increased": [names[k] for k in np.flatnonzero(chosen[m])],
+                        }
+                        for m, month in enumerate(months)
+                        if self.spent[c, m].any()
+                    ],
+                }
+            )
+        return cards
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from src.metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Сколько ошибок подряд открывают цепь
+FAILURE_THRESHOLD = 3
+# Пауза перед первой пробой, секунды; после каждой неудачной пробы удваивается
+BASE_BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён, потому что цепь открыта."""
+
+
+class CircuitBreaker:
+    """Предохранитель для вызовов внешнего сервиса.
+
+    После failure_threshold ошибок подряд цепь открывается, и вызовы сразу
+    отклоняются без обращения к сервису. Когда истекает пауза, пропускается
+    один пробный вызов (half-open): при успехе цепь закрывается, при ошибке
+    снова открывается с удвоенной паузой (не больше max_backoff).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        base_backoff: float = BASE_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self._retry_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Можно ли обращаться к сервису сейчас; в half-open пропускает одну пробу."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() >= self._retry_at:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info("Цепь %s: пробный запрос", self.name)
+                return True
+        current_metrics().incr(f"circuit_rejected.{self.name}")
+        return False
+
+    def record_success(self) -> None:
+        """Учитывает успешный вызов: цепь закрывается, пауза сбрасывается."""
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Цепь %s закрыта", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Учитывает ошибку вызова; при достижении порога или неудачной пробе открывает цепь."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._probing = False
+        self._retry_at = self._clock() + self.backoff
+        logger.warning("Цепь %s открыта на %.1f с после %d ошибок", self.name, self.backoff, self.failures)
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Вызывает func через предохранитель; при открытой цепи бросает CircuitOpenError."""
+        if not self.allow():
+            raise CircuitOpenError(f"Цепь {self.name} открыта")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def reset(self) -> None:
+        """Возвращает предохранитель в исходное закрытое состояние."""
+        self.record_success()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs: Any) -> CircuitBreaker:
+    """Общий предохранитель для endpoint name; параметры применяются только при создании."""
+    with _breakers_lock:
+        breaker: Optional[CircuitBreaker] = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def reset_breakers() -> None:
+    """Закрывает все предохранители (например, между тестами)."""
+    with _breakers_lock:
+        for breaker in _breakers.values():
+            breaker.reset()
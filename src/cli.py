@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import argparse
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from config import FILE_XLSX, STORE_DIR, init_app
+from src.lazy import lazy_import
+from src.query import Query
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+OUTPUT_FORMATS = ["json", "csv", "table"]
+
+# Сколько строк статистики cProfile выводить в stderr
+PROFILE_LINES = 25
+
+
+def _load(args: argparse.Namespace, query: Optional[Query] = None) -> pd.DataFrame:
+    """Загружает нормализованные транзакции из файла или хранилища (только подходящие под query)."""
+    from src.storage import load_transactions
+
+    return load_transactions(args.file, store_dir=args.store, query=query)
+
+
+def _sqlite(args: argparse.Namespace) -> Any:
+    """Открывает базу SQLite, перестраивая её при изменении выгрузки."""
+    from src.sqlite_store import open_sqlite_store
+
+    return open_sqlite_store(args.sqlite, args.file)
+
+
+def _month(value: Optional[str]) -> datetime:
+    """Разбирает месяц из строки 'YYYY-MM' (или полной даты), по умолчанию - текущий."""
+    if not value:
+        return datetime.now()
+    return datetime.strptime(value[:7], "%Y-%m")
+
+
+def _main_page(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.views import get_main_page_json
+
+    date_str = args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: get_main_page_json(
+        date_str,
+        store_dir=args.store,
+        source=args.file,
+        debug=args.debug,
+        sqlite_path=args.sqlite,
+        period=args.period,
+    )
+
+
+def _spending_by_category(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.reports import save_report, spending_by_category
+    from src.storage import EXPORT_NAMES
+
+    if args.sqlite:
+        store = _sqlite(args)
+        sql_report = save_report()(store.spending_by_category) if args.save else store.spending_by_category
+        return lambda: sql_report(args.category, date=args.date)
+
+    # Без даты период отсчитывается от момента вызова отчёта, поэтому заранее отбираем только категорию
+    if args.date:
+        query = Query.last_months(args.date, 3, categories=[args.category])
+    else:
+        query = Query(categories=[args.category])
+    transactions = _load(args, query).rename(columns=EXPORT_NAMES)
+    report = spending_by_category if args.save else spending_by_category.__wrapped__
+    return lambda: report(transactions, args.category, date=args.date)
+
+
+def _spending_by_weekday(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.reports import save_report, spending_by_weekday
+    from src.storage import EXPORT_NAMES
+
+    if args.sqlite:
+        store = _sqlite(args)
+        sql_report = store.spending_by_weekday
+        if args.save:
+            sql_report = save_report("report_weekday.csv")(sql_report)
+        return lambda: sql_report(date=args.date)
+
+    transactions = _load(args).rename(columns=EXPORT_NAMES)
+    report = spending_by_weekday if args.save else spending_by_weekday.__wrapped__
+    return lambda: report(transactions, date=args.date)
+
+
+def _cashback_categories(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import analyze_profitable_categories
+
+    month = _month(args.date)
+    data = _load(args, Query.month(month.year, month.month))
+    return lambda: analyze_profitable_categories(data, month.year, month.month)
+
+
+def _invest_bank(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import investment_bank
+    from src.storage import EXPORT_NAMES
+
+    month = _month(args.date)
+    df = _load(args, Query.month(month.year, month.month))
+    transactions = [
+        {EXPORT_NAMES["date"]: date, EXPORT_NAMES["amount"]: amount}
+        for date, amount in zip(df["date"].dt.strftime("%Y-%m-%d"), df["amount"])
+    ]
+    return lambda: investment_bank(month.strftime("%Y-%m"), transactions, args.limit)
+
+
+def _period_summary(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import period_summary
+
+    data = _load(args)
+    date_str = args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: period_summary(data, date_str, args.period)
+
+
+def _spending_distribution(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import spending_distribution
+
+    data = _load(args)
+    date_str = args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: spending_distribution(data, date_str, args.period, args.side)
+
+
+def _recurring_payments(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import find_recurring_payments
+
+    data = _load(args)
+    return lambda: find_recurring_payments(data, args.min_occurrences)
+
+
+def _budget(value: str) -> Tuple[str, float]:
+    name, _, limit = value.rpartition("=")
+    try:
+        return name, float(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Бюджет должен иметь вид НАЗВАНИЕ=СУММА: {value}")
+
+
+def _forecast(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import forecast_spending
+
+    data = _load(args)
+    date_str = args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return lambda: forecast_spending(data, date_str, dict(args.budget or []), args.half_life)
+
+
+def _cashback_simulation(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.cashback import load_programs
+    from src.services import simulate_cashback
+
+    programs = load_programs(args.programs) if args.programs else None
+    data = _load(args, Query(start=args.start, end=args.end))
+    return lambda: simulate_cashback(data, programs, args.start, args.end)
+
+
+def _near_duplicates(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import find_near_duplicates
+
+    data = _load(args)
+    return lambda: json.loads(find_near_duplicates(data, args.minutes))
+
+
+def _transactions(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.views import list_transactions
+
+    query = Query(start=args.start, end=args.end, cards=args.card, categories=args.category)
+    data = _load(args, query)
+    return lambda: json.loads(list_transactions(data, query, args.cursor, args.limit, not args.oldest_first))
+
+
+def _search(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import search_transactions
+
+    data = _load(args)
+    index = None
+    if args.store:
+        from src.storage import TransactionStore
+
+        # Индекс хранилища строится при первом поиске и переиспользуется следующими
+        index = TransactionStore(args.store).search_index()
+    return lambda: json.loads(
+        search_transactions(data, args.query, index, args.start, args.end, args.card, args.limit)
+    )
+
+
+def _person_transfers(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import find_person_transfers
+
+    data = _load(args)
+    return lambda: json.loads(find_person_transfers(data))
+
+
+def _phone_payments(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.services import find_phone_payments
+
+    data = _load(args)
+    return lambda: json.loads(find_phone_payments(data))
+
+
+def _fx_update(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.fx import RUB, default_history
+
+    data = _load(args)
+    column = "original_currency" if "original_currency" in data.columns else "currency"
+    currencies = args.currencies or sorted(set(data[column].dropna().astype(str)) - {RUB})
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else data["date"].min().date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else data["date"].max().date()
+
+    def update() -> Dict[str, Any]:
+        added = default_history.fetch(currencies, start, end)
+        default_history.save()
+        return {"currencies": currencies, "start": str(start), "end": str(end), "added": added}
+
+    return update
+
+
+def _serve(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.server import serve
+
+    options = dict(
+        source=args.file,
+        store_dir=args.store or STORE_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        executor=args.executor,
+        prewarm=args.prewarm,
+        cpu_budget=args.cpu_budget,
+        peak=args.peak,
+    )
+    return lambda: serve(**options)
+
+
+def _ingest(args: argparse.Namespace) -> Callable[[], Any]:
+    from src.storage import TransactionStore
+
+    if args.sqlite:
+        from src.sqlite_store import SQLiteStore
+
+        sqlite_store = SQLiteStore(args.sqlite)
+
+        def ingest_sqlite() -> Dict[str, Any]:
+            rows = sqlite_store.ingest(args.file)
+            meta = sqlite_store.meta
+            return {
+                "sqlite": sqlite_store.path,
+                "rows": rows,
+                "rejected": meta.get("rejected", 0),
+                "quarantine": sqlite_store.quarantine_path,
+                "version": meta.get("version"),
+            }
+
+        return ingest_sqlite
+
+    store = TransactionStore(args.store or STORE_DIR)
+
+    def ingest() -> Dict[str, Any]:
+        df = store.ingest(args.file)
+        return {
+            "store": store.store_dir,
+            "rows": len(df),
+            "rejected": store.meta.get("rejected", 0),
+            "quarantine": store.quarantine_path,
+            "version": store.version,
+        }
+
+    return ingest
+
+
+COMMANDS: Dict[str, Callable[[argparse.Namespace], Callable[[], Any]]] = {
+    "main-page": _main_page,
+    "spending-by-category": _spending_by_category,
+    "spending-by-weekday": _spending_by_weekday,
+    "cashback-categories": _cashback_categories,
+    "invest-bank": _invest_bank,
+    "period-summary": _period_summary,
+    "distribution": _spending_distribution,
+    "recurring": _recurring_payments,
+    "forecast": _forecast,
+    "cashback-simulation": _cashback_simulation,
+    "near-duplicates": _near_duplicates,
+    "transactions": _transactions,
+    "search": _search,
+    "person-transfers": _person_transfers,
+    "phone-payments": _phone_payments,
+    "fx-update": _fx_update,
+    "serve": _serve,
+    "ingest": _ingest,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Создаёт парсер аргументов командной строки."""
+    from src.rollups import SIDES
+    from src.utils import PERIODS
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--file", default=FILE_XLSX, help="файл выгрузки операций (.xlsx или .csv)")
+    common.add_argument("--store", default=None, help="каталог memory-mapped хранилища транзакций")
+    common.add_argument("--sqlite", default=None, help="файл базы SQLite для отчётов и главной страницы")
+    common.add_argument("--format", choices=OUTPUT_FORMATS, default="json", help="формат вывода результата")
+    common.add_argument("--output", default=None, help="файл для результата (по умолчанию stdout)")
+    common.add_argument("--repeat", type=int, default=1, help="выполнить команду N раз и вывести время в stderr")
+    common.add_argument("--profile", action="store_true", help="профилировать выполнение через cProfile")
+    common.add_argument("--profile-output", default=None, help="файл для сохранения статистики cProfile")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Transaction Service: анализ выгрузки операций")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    main_page = subparsers.add_parser("main-page", parents=[common], help="JSON страницы 'Главная'")
+    main_page.add_argument("--date", help="дата и время 'YYYY-MM-DD HH:MM:SS'")
+    main_page.add_argument("--debug", action="store_true", help="добавить в ответ метрики этапов")
+    main_page.add_argument("--period", choices=PERIODS, default="M", help="период статистики: неделя, месяц, год, всё")
+
+    by_category = subparsers.add_parser("spending-by-category", parents=[common], help="траты по категории")
+    by_category.add_argument("--category", required=True, help="категория операций")
+    by_category.add_argument("--date", help="конец трёхмесячного периода 'YYYY-MM-DD'")
+    by_category.add_argument("--save", action="store_true", help="также сохранить отчёт в data/")
+
+    by_weekday = subparsers.add_parser("spending-by-weekday", parents=[common], help="траты по дням недели")
+    by_weekday.add_argument("--date", help="конец трёхмесячного периода 'YYYY-MM-DD'")
+    by_weekday.add_argument("--save", action="store_true", help="также сохранить отчёт в data/")
+
+    cashback = subparsers.add_parser("cashback-categories", parents=[common], help="выгодные категории кешбэка")
+    cashback.add_argument("--date", help="месяц 'YYYY-MM'")
+
+    invest = subparsers.add_parser("invest-bank", parents=[common], help="накопления в Инвесткопилке")
+    invest.add_argument("--date", help="месяц 'YYYY-MM'")
+    invest.add_argument("--limit", type=int, default=50, help="шаг округления")
+
+    summary = subparsers.add_parser(
+        "period-summary", parents=[common], help="итоги за неделю, месяц, год или всё время"
+    )
+    summary.add_argument("--date", help="конец периода 'YYYY-MM-DD HH:MM:SS'")
+    summary.add_argument("--period", choices=PERIODS, default="M", help="период: W, M, Y или ALL")
+
+    distribution = subparsers.add_parser(
+        "distribution", parents=[common], help="медиана, p90, p99 и гистограмма размеров операций"
+    )
+    distribution.add_argument("--date", help="конец периода 'YYYY-MM-DD HH:MM:SS'")
+    distribution.add_argument("--period", choices=PERIODS, default="M", help="период: W, M, Y или ALL")
+    distribution.add_argument("--side", choices=SIDES, default="expenses", help="расходы или поступления")
+
+    recurring = subparsers.add_parser("recurring", parents=[common], help="регулярные платежи и подписки")
+    recurring.add_argument("--min-occurrences", type=int, default=3, help="минимальное число списаний")
+
+    forecast = subparsers.add_parser("forecast", parents=[common], help="прогноз расходов до конца месяца")
+    forecast.add_argument("--date", help="дата прогноза 'YYYY-MM-DD HH:MM:SS'")
+    forecast.add_argument(
+        "--budget", type=_budget, action="append", help="бюджет месяца: КАТЕГОРИЯ=СУММА или *1234=СУММА"
+    )
+    forecast.add_argument("--half-life", type=float, default=14.0, help="полураспад сглаживания темпа трат, дни")
+
+    simulation = subparsers.add_parser(
+        "cashback-simulation", parents=[common], help="сравнение программ кэшбэка по картам и месяцам"
+    )
+    simulation.add_argument("--programs", help="JSON-файл со списком программ (по умолчанию - встроенные)")
+    simulation.add_argument("--start", help="начало периода 'YYYY-MM-DD'")
+    simulation.add_argument("--end", help="конец периода 'YYYY-MM-DD HH:MM:SS'")
+
+    near = subparsers.add_parser("near-duplicates", parents=[common], help="похожие операции (возможные повторы)")
+    near.add_argument("--minutes", type=float, default=5, help="окно по времени в минутах")
+
+    history = subparsers.add_parser("transactions", parents=[common], help="история операций по страницам")
+    history.add_argument("--card", nargs="*", help="номера карт, например *7197")
+    history.add_argument("--category", nargs="*", help="категории")
+    history.add_argument("--start", help="начало периода 'YYYY-MM-DD[ HH:MM:SS]'")
+    history.add_argument("--end", help="конец периода 'YYYY-MM-DD[ HH:MM:SS]'")
+    history.add_argument("--cursor", help="next_cursor предыдущей страницы")
+    history.add_argument("--limit", type=int, default=50, help="размер страницы")
+    history.add_argument("--oldest-first", action="store_true", help="от старых операций к новым")
+
+    search = subparsers.add_parser("search", parents=[common], help="поиск операций по описанию и категории")
+    search.add_argument("query", help="слова запроса; 'маг*' - поиск по началу слова")
+    search.add_argument("--card", nargs="*", help="номера карт, например *7197")
+    search.add_argument("--start", help="начало периода 'YYYY-MM-DD[ HH:MM:SS]'")
+    search.add_argument("--end", help="конец периода 'YYYY-MM-DD[ HH:MM:SS]'")
+    search.add_argument("--limit", type=int, default=100, help="сколько операций вывести")
+
+    subparsers.add_parser("person-transfers", parents=[common], help="переводы физическим лицам")
+    subparsers.add_parser("phone-payments", parents=[common], help="операции с номером телефона в описании")
+    fx_update = subparsers.add_parser("fx-update", parents=[common], help="загрузить историю курсов валют")
+    fx_update.add_argument("--currencies", nargs="*", help="валюты (по умолчанию - все валюты выгрузки)")
+    fx_update.add_argument("--start", help="начало периода 'YYYY-MM-DD' (по умолчанию - первая операция)")
+    fx_update.add_argument("--end", help="конец периода 'YYYY-MM-DD' (по умолчанию - последняя операция)")
+
+    server = subparsers.add_parser("serve", parents=[common], help="HTTP-сервер с JSON-эндпоинтами")
+    server.add_argument("--host", default="127.0.0.1", help="адрес для входящих соединений")
+    server.add_argument("--port", type=int, default=8000, help="порт")
+    server.add_argument("--workers", type=int, default=None, help="размер пула вычислений")
+    server.add_argument("--concurrency", type=int, default=8, help="сколько запросов выполнять одновременно")
+    server.add_argument("--executor", choices=["process", "thread"], default="process", help="тип пула вычислений")
+    server.add_argument("--prewarm", action="store_true", help="заранее готовить ответы к утреннему пику")
+    server.add_argument("--cpu-budget", type=float, default=0.25, help="доля времени, отдаваемая прогреву")
+    server.add_argument("--peak", default="08:00", help="начало утреннего пика (HH:MM)")
+
+    subparsers.add_parser("ingest", parents=[common], help="построить хранилище транзакций из выгрузки")
+
+    return parser
+
+
+def format_result(result: Any, fmt: str) -> str:
+    """Преобразует результат команды в строку выбранного формата."""
+    if isinstance(result, pd.DataFrame):
+        if fmt == "csv":
+            return str(result.to_csv(index=False))
+        if fmt == "table":
+            return str(result.to_string(index=False))
+        return str(result.to_json(orient="records", force_ascii=False, date_format="iso", indent=2))
+
+    if fmt == "json" or not isinstance(result, (dict, list)):
+        return json.dumps(result, indent=2, ensure_ascii=False, default=str)
+
+    if isinstance(result, dict):
+        frame = pd.DataFrame(list(result.items()), columns=["key", "value"])
+    else:
+        frame = pd.DataFrame(result)
+    return str(frame.to_csv(index=False) if fmt == "csv" else frame.to_string(index=False))
+
+
+def _timings(durations: List[float]) -> Dict[str, float]:
+    """Сводка по замерам времени в секундах."""
+    return {
+        "min": min(durations),
+        "mean": sum(durations) / len(durations),
+        "max": max(durations),
+    }
+
+
+def run_cli(argv: Optional[List[str]] = None) -> int:
+    """Разбирает аргументы, выполняет команду и возвращает код завершения."""
+    args = build_parser().parse_args(argv)
+    init_app()
+
+    profiler = cProfile.Profile() if args.profile else None
+    durations = []
+    load_durations = []
+    result: Any = None
+    # Каждый повтор выполняет команду целиком, вместе с загрузкой данных в построителе команды:
+    # так время всех команд сравнимо, а загрузка дополнительно выводится отдельно
+    for _ in range(max(args.repeat, 1)):
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        call = COMMANDS[args.command](args)
+        load_durations.append(time.perf_counter() - start)
+        result = call()
+        if profiler is not None:
+            profiler.disable()
+        durations.append(time.perf_counter() - start)
+
+    if result is not None:
+        text = format_result(result, args.format)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
+
+    if args.repeat > 1:
+        summary = {
+            "command": args.command,
+            "repeat": len(durations),
+            **_timings(durations),
+            "load": _timings(load_durations),
+        }
+        print(json.dumps(summary), file=sys.stderr)
+
+    if profiler is not None:
+        if args.profile_output:
+            profiler.dump_stats(args.profile_output)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        print(stream.getvalue(), file=sys.stderr)
+
+    return 1 if isinstance(result, dict) and "error" in result else 0
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from config import FX_RATES_FILE
+from src.lazy import lazy_import
+from src.metrics import current_metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    import requests
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+    requests = lazy_import("requests")
+
+logger = logging.getLogger(__name__)
+
+RUB = "RUB"
+
+TIMESERIES_URL = "https://api.apilayer.com/exchangerates_data/timeseries"
+# Наибольший период одного запроса timeseries в apilayer
+MAX_PERIOD_DAYS = 365
+
+# Сколько пересчитанных версий данных держать в памяти
+CACHE_SIZE = 8
+
+# Имена колонок нормализованных транзакций (см. src.storage.COLUMN_NAMES)
+DEFAULT_COLUMNS = {
+    "date": "date",
+    "amount": "amount",
+    "currency": "currency",
+    "payment_amount": "payment_amount",
+    "payment_currency": "payment_currency",
+}
+
+
+class RateHistory:
+    """Локальная история дневных курсов валют к рублю.
+
+    Хранится в CSV с колонками date, currency, rate (сколько рублей стоит
+    единица валюты). Файл перечитывается при изменении mtime или размера;
+    каждое изменение истории увеличивает version.
+    """
+
+    def __init__(self, path: str = FX_RATES_FILE) -> None:
+        self.path = path
+        self._version = 0
+        self._frame: Optional[pd.DataFrame] = None
+        self._stat: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> pd.DataFrame:
+        with self._lock:
+            stat = self._file_stat()
+            if self._frame is None or stat != self._stat:
+                rates = pd.read_csv(self.path) if stat is not None else _empty_rates()
+                self._set(rates)
+                self._stat = stat
+            return self._frame  # type: ignore[return-value]
+
+    @property
+    def version(self) -> int:
+        """Версия истории; перед ответом проверяет, не изменился ли файл."""
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Курсы, отсортированные по дате."""
+        return self._refresh()
+
+    def _set(self, rates: pd.DataFrame) -> None:
+        rates = pd.DataFrame(
+            {
+                "date": pd.to_datetime(rates["date"]).to_numpy(dtype="datetime64[ns]"),
+                "currency": rates["currency"].astype(str).to_numpy(),
+                "rate": pd.to_numeric(rates["rate"], errors="coerce").to_numpy(dtype=float),
+            }
+        ).dropna()
+        # Ключи merge_asof должны совпадать по типу с запросом в lookup
+        rates["currency"] = rates["currency"].astype(str)
+        rates = rates.drop_duplicates(["date", "currency"], keep="last")
+        self._frame = rates.sort_values("date", kind="stable").reset_index(drop=True)
+        self._version += 1
+
+    def add(self, rates: pd.DataFrame) -> int:
+        """Добавляет курсы (колонки date, currency, rate); новые значения заменяют старые за тот же день."""
+        with self._lock:
+            before = len(self.frame)
+            self._set(pd.concat([self.frame, rates], ignore_index=True))
+            return len(self.frame) - before
+
+    def save(self) -> None:
+        """Сохраняет историю в CSV."""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            frame = self.frame.assign(date=self.frame["date"].dt.strftime("%Y-%m-%d"))
+            frame.to_csv(self.path, index=False)
+            self._stat = self._file_stat()
+
+    def fetch(self, currencies: Iterable[str], start: date, end: date, api_key: Optional[str] = None) -> int:
+        """Загружает дневные курсы из apilayer за период и возвращает число новых записей.
+
+        Период разбивается на запросы не длиннее MAX_PERIOD_DAYS.
+        """
+        symbols = sorted({c for c in currencies if c and c != RUB})
+        if not symbols:
+            return 0
+        if not api_key:
+            from src.utils import get_api_key
+
+            api_key = get_api_key()
+        if not api_key:
+            logger.error("API_KEY не установлен, история курсов не обновлена")
+            return 0
+
+        records = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=MAX_PERIOD_DAYS - 1), end)
+            params = {
+                "start_date": chunk_start.isoformat(),
+                "end_date": chunk_end.isoformat(),
+                "base": RUB,
+                "symbols": ",".join(symbols),
+            }
+            response = requests.get(TIMESERIES_URL, params=params, headers={"apikey": api_key}, timeout=30)
+            response.raise_for_status()
+            for day, values in response.json().get("rates", {}).items():
+                for currency, per_rub in values.items():
+                    # API возвращает количество валюты за рубль, храним рубли за единицу валюты
+                    if per_rub:
+                        records.append({"date": day, "currency": currency, "rate": 1 / per_rub})
+            chunk_start = chunk_end + timedelta(days=1)
+
+        added = self.add(pd.DataFrame(records, columns=["date", "currency", "rate"]))
+        logger.info("История курсов: загружено %d записей за %s - %s", len(records), start, end)
+        return added
+
+    def lookup(self, dates: pd.Series, currencies: pd.Series) -> np.ndarray:
+        """Курс на дату операции для каждой пары (дата, валюта): последний известный не позже даты.
+
+        Для рубля курс 1, для неизвестной валюты, пустой даты или даты раньше истории - NaN.
+        """
+        currency = currencies.astype(str).to_numpy(dtype=object)
+        rates = np.ones(len(currency))
+        foreign = currency != RUB
+        if not foreign.any():
+            return rates
+
+        day = dates.to_numpy(dtype="datetime64[ns]")
+        # merge_asof не принимает пустые ключи, поэтому операции без даты остаются с NaN
+        rates[foreign] = np.nan
+        known = foreign & ~np.isnat(day)
+        if not known.any():
+            return rates
+        query = pd.DataFrame(
+            {
+                "date": day[known],
+                "currency": currency[known],
+                "position": np.flatnonzero(known),
+            }
+        ).sort_values("date", kind="stable")
+        query["currency"] = query["currency"].astype(str)
+        merged = pd.merge_asof(query, self.frame, on="date", by="currency", direction="backward")
+        rates[merged["position"].to_numpy()] = merged["rate"].to_numpy(dtype=float)
+        return rates
+
+
+def _empty_rates() -> pd.DataFrame:
+    return pd.DataFrame({"date": [], "currency": [], "rate": []})
+
+
+default_history = RateHistory()
+
+_conversions: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+_conversions_lock = threading.Lock()
+
+
+def to_rub(
+    df: pd.DataFrame, history: Optional[RateHistory] = None, columns: Optional[Dict[str, str]] = None
+) -> np.ndarray:
+    """Возвращает суммы операций df в рублях.
+
+    Рублёвые операции не меняются. Для валютных берётся сумма платежа, если
+    банк списал её в рублях, иначе сумма умножается на курс из истории на
+    дату операции. Операции без известного курса получают NaN и поэтому
+    исключаются из итогов (суммы по картам, топ операций, кэшбэк), пока
+    курс не появится в истории (см. fx-update).
+    """
+    names = {**DEFAULT_COLUMNS, **(columns or {})}
+    amount = df[names["amount"]].to_numpy(dtype=float, na_value=np.nan)
+    result: np.ndarray = amount.copy()
+    if names["currency"] not in df.columns:
+        return result
+
+    currency = df[names["currency"]]
+    foreign = (currency.notna() & (currency != RUB)).to_numpy(dtype=bool)
+    if not foreign.any():
+        return result
+
+    pending = np.flatnonzero(foreign)
+    if names["payment_amount"] in df.columns and names["payment_currency"] in df.columns:
+        paid = df[names["payment_amount"]].to_numpy(dtype=float, na_value=np.nan)[pending]
+        paid_in_rub = (df[names["payment_currency"]].iloc[pending] == RUB).to_numpy(dtype=bool) & ~np.isnan(paid)
+        result[pending[paid_in_rub]] = paid[paid_in_rub]
+        pending = pending[~paid_in_rub]
+
+    if len(pending):
+        history = history or default_history
+        rates = history.lookup(df[names["date"]].iloc[pending], currency.iloc[pending])
+        result[pending] = amount[pending] * rates
+        missing = int(np.isnan(rates).sum())
+        if missing:
+            current_metrics().incr("fx_missing", missing)
+            logger.warning("Нет курса для %d валютных операций: они исключены из расчётов до загрузки курсов", missing)
+    return result
+
+
+def convert_to_rub(
+    df: pd.DataFrame,
+    history: Optional[RateHistory] = None,
+    columns: Optional[Dict[str, str]] = None,
+    version: Optional[str] = None,
+) -> pd.DataFrame:
+    """Возвращает df с суммами в рублях; исходные значения сохраняются в original_amount и original_currency.
+
+    Повторный вызов для уже пересчитанных данных ничего не меняет. Если
+    указана version (версия хранилища), результат кэшируется для пары
+    (версия данных, версия истории курсов).
+    """
+    names = {**DEFAULT_COLUMNS, **(columns or {})}
+    if names["currency"] not in df.columns or df.empty:
+        return df
+    currency = df[names["currency"]]
+    if not (currency.notna() & (currency != RUB)).any():
+        return df
+
+    history = history or default_history
+    amounts: Optional[np.ndarray] = None
+    if version is None:
+        amounts = to_rub(df, history, names)
+    else:
+        key = (version, history.path, history.version, names["amount"])
+        with _conversions_lock:
+            amounts = _conversions.get(key)
+            if amounts is not None:
+                _conversions.move_to_end(key)
+        current_metrics().cache("fx", amounts is not None)
+        if amounts is None:
+            amounts = to_rub(df, history, names)
+            amounts.flags.writeable = False
+            with _conversions_lock:
+                _conversions[key] = amounts
+                while len(_conversions) > CACHE_SIZE:
+                    _conversions.popitem(last=False)
+
+    # Колонки собираются без копирования: остальные колонки остаются memory-mapped массивами хранилища
+    converted: Dict[str, Any] = {name: df[name] for name in df.columns}
+    converted.update(
+        {
+            names["amount"]: pd.Series(amounts, index=df.index, copy=False),
+            names["currency"]: RUB,
+            "original_amount": df[names["amount"]],
+            "original_currency": currency,
+        }
+    )
+    return pd.DataFrame(converted, index=df.index, copy=False)
+
+
+def clear_cache() -> None:
+    """Сбрасывает кэш пересчитанных сумм."""
+    with _conversions_lock:
+        _conversions.clear()
@@ -0,0 +1,31 @@
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Возвращает модуль, который будет загружен при первом обращении к его атрибутам.
+
+    Тяжёлые зависимости (pandas, numpy, requests) подключаются через эту функцию,
+    чтобы импорт пакета src и запуск CLI не тратили время на их загрузку.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    """Проверяет, был ли модуль действительно загружен, а не только зарегистрирован лениво."""
+    module = sys.modules.get(name)
+    # После загрузки LazyLoader меняет класс модуля на обычный ModuleType
+    return module is not None and type(module) is ModuleType
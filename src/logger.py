@@ -0,0 +1,195 @@
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import queue
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from multiprocessing.context import BaseContext
+from typing import Any, Iterator, Optional, Tuple
+
+from src.metrics import add_sink, log_sink, remove_sink
+
+# Ограничение очереди: при медленном диске лишние записи отбрасываются, а не блокируют запрос
+QUEUE_SIZE = 10_000
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def get_request_id() -> Optional[str]:
+    """Идентификатор текущего запроса или None вне request_context()."""
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Связывает записи журнала внутри блока with с одним идентификатором запроса.
+
+    Без явного request_id используется уже установленный идентификатор или создаётся новый.
+    """
+    current = _request_id.get()
+    if request_id is None and current is not None:
+        yield current
+        return
+    token = _request_id.set(request_id or uuid.uuid4().hex[:16])
+    try:
+        yield _request_id.get() or ""
+    finally:
+        _request_id.reset(token)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт записи в ограниченную очередь, не форматируя их в потоке запроса.
+
+    Сообщение собирается из msg и args уже в потоке QueueListener. При
+    переполненной очереди запись отбрасывается и учитывается в счётчике dropped.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Записи из процессов пула (см. forward_worker_logs) уже несут свой идентификатор
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _WorkerQueueHandler(logging.handlers.QueueHandler):
+    """Отправляет записи процесса пула в очередь родительского процесса.
+
+    Сообщение форматируется здесь же, чтобы запись без аргументов можно было
+    передать между процессами; при переполненной очереди запись отбрасывается.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = _request_id.get()
+        prepared: logging.LogRecord = super().prepare(record)
+        return prepared
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        with contextlib.suppress(queue.Full):
+            self.queue.put_nowait(record)
+
+
+class _Forwarder(logging.Handler):
+    """Передаёт записи процессов пула в журнал текущего процесса с учётом его уровней."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        target = logging.getLogger(record.name)
+        if target.isEnabledFor(record.levelno):
+            target.handle(record)
+
+
+class _Listener(logging.handlers.QueueListener):
+    """QueueListener, дожидающийся места в очереди для сигнала остановки."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну JSON-строку (JSON Lines)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(
+    log_file: str = "app.log",
+    level: int = logging.INFO,
+    max_bytes: int = MAX_BYTES,
+    backup_count: int = BACKUP_COUNT,
+    queue_size: int = QUEUE_SIZE,
+    log_metrics: bool = False,
+) -> logging.handlers.QueueListener:
+    """Настраивает корневой журнал: очередь в памяти и фоновую запись JSON-строк с ротацией по размеру.
+
+    При log_metrics=True метрики запросов (см. src.metrics) пишутся в журнал
+    через src.metrics.log_sink. Повторный вызов заменяет предыдущую конфигурацию.
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = _Listener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    if log_metrics:
+        add_sink(log_sink)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Дописывает записи из очереди и отключает фоновый обработчик."""
+    global _listener, _queue_handler
+    remove_sink(log_sink)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def forward_worker_logs(context: BaseContext) -> Tuple[Any, logging.handlers.QueueListener]:
+    """Очередь для журналов процессов пула и слушатель, передающий их записи журналу этого процесса.
+
+    Очередь передаётся процессам пула в setup_worker_logging, поэтому в файл
+    журнала пишет только родительский процесс. Слушатель останавливают после
+    закрытия пула.
+    """
+    log_queue = context.Queue(QUEUE_SIZE)
+    listener = _Listener(log_queue, _Forwarder())
+    listener.start()
+    return log_queue, listener
+
+
+def setup_worker_logging(log_queue: Any, level: int = logging.INFO) -> None:
+    """Настраивает журнал процесса пула: записи уходят в очередь из forward_worker_logs."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_WorkerQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за переполнения очереди."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,136 @@
+import contextlib
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List
+
+# Приёмник метрик: получает имя операции и словарь Metrics.as_dict()
+MetricsSink = Callable[[str, Dict[str, Any]], None]
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Замеры времени этапов, счётчики и попадания в кэши одного запроса."""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.caches: Dict[str, List[int]] = {}
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def _timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def stage(self, name: str) -> contextlib.AbstractContextManager:
+        """Контекстный менеджер, суммирующий время этапа name."""
+        return self._timer(name)
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Увеличивает счётчик name."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def cache(self, name: str, hit: bool) -> None:
+        """Учитывает попадание (hit=True) или промах в кэш name."""
+        hits_misses = self.caches.setdefault(name, [0, 0])
+        hits_misses[0 if hit else 1] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Метрики в виде словаря для JSON-ответа, журнала и приёмников."""
+        return {
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+            "cache_hit_rate": {name: hits / (hits + misses) for name, (hits, misses) in self.caches.items()},
+        }
+
+
+class NullMetrics(Metrics):
+    """Отключённые метрики: все операции ничего не делают."""
+
+    enabled = False
+
+    def stage(self, name: str) -> contextlib.AbstractContextManager:
+        return _NULL_CONTEXT
+
+    def incr(self, name: str, value: int = 1) -> None:
+        pass
+
+    def cache(self, name: str, hit: bool) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+_current: ContextVar[Metrics] = ContextVar("metrics", default=NULL_METRICS)
+_sinks: List[MetricsSink] = []
+
+
+def current_metrics() -> Metrics:
+    """Метрики текущего запроса (NULL_METRICS, если сбор не включён)."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def collect(enabled: bool = True) -> Iterator[Metrics]:
+    """Включает сбор метрик для кода внутри блока with."""
+    metrics = Metrics() if enabled else NULL_METRICS
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def add_sink(sink: MetricsSink) -> None:
+    """Подключает приёмник метрик."""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    """Отключает приёмник метрик."""
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def has_sinks() -> bool:
+    """Проверяет, подключён ли хотя бы один приёмник."""
+    return bool(_sinks)
+
+
+def emit(name: str, metrics: Metrics) -> None:
+    """Передаёт метрики операции name во все приёмники."""
+    if not metrics.enabled or not _sinks:
+        return
+    data = metrics.as_dict()
+    for sink in list(_sinks):
+        try:
+            sink(name, data)
+        except Exception as e:
+            logger.error("Ошибка приёмника метрик %r: %s", sink, e)
+
+
+class _JsonMessage:
+    """Аргумент записи журнала, превращаемый в JSON только при форматировании (в потоке записи журнала)."""
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, ensure_ascii=False)
+
+
+def log_sink(name: str, data: Dict[str, Any]) -> None:
+    """Приёмник, пишущий метрики в журнал одной JSON-строкой (подключается src.logger.setup_logging)."""
+    logger.info("%s", _JsonMessage({"metrics": name, **data}))
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import weakref
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from src.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+Moment = Union[datetime, "pd.Timestamp", str]
+
+# Условие -> нормализованная колонка (см. src.storage.COLUMN_NAMES)
+CONDITION_COLUMNS = {
+    "cards": "card_number",
+    "categories": "category",
+    "statuses": "status",
+    "mcc": "mcc",
+}
+
+
+def _timestamp(moment: Optional[Moment]) -> Optional[pd.Timestamp]:
+    return pd.Timestamp(moment) if moment is not None else None
+
+
+def _values(values: Optional[Iterable[Any]]) -> Optional[Tuple[Any, ...]]:
+    """Набор допустимых значений; строка считается одним значением."""
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return (values,)
+    return tuple(dict.fromkeys(values))
+
+
+def _intersect(left: Optional[Tuple[Any, ...]], right: Optional[Tuple[Any, ...]]) -> Optional[Tuple[Any, ...]]:
+    if left is None or right is None:
+        return left if right is None else right
+    return tuple(value for value in left if value in right)
+
+
+def _bound(left: Optional[Any], right: Optional[Any], pick: Callable[[Any, Any], Any]) -> Optional[Any]:
+    if left is None or right is None:
+        return left if right is None else right
+    return pick(left, right)
+
+
+def ns(moment: Moment) -> int:
+    """Момент времени как число наносекунд (так дата хранится в src.sqlite_store)."""
+    return int(pd.Timestamp(moment).as_unit("ns").value)
+
+
+class Query:
+    """Условия отбора операций: период, карты, категории, диапазон сумм, статусы и MCC.
+
+    Все границы включительные, None - условие не задано. Условия сводятся
+    в одну векторную маску. Если данные отсортированы по дате (как их
+    возвращают src.storage.load_transactions и TransactionStore), период
+    отбирается двоичным поиском как срез без копирования, а остальные
+    условия проверяются только внутри него. Тот же запрос передаётся в
+    SQLiteStore (условие WHERE) и в load_transactions (отбор при чтении
+    выгрузки по частям). Запросы объединяются оператором &.
+
+    Найденные строки запоминаются для последнего DataFrame, поэтому
+    повторный отбор из тех же данных в рамках запроса ничего не пересчитывает.
+    """
+
+    def __init__(
+        self,
+        start: Optional[Moment] = None,
+        end: Optional[Moment] = None,
+        cards: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[str]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        statuses: Optional[Iterable[str]] = None,
+        mcc: Optional[Iterable[float]] = None,
+    ) -> None:
+        self.start = _timestamp(start)
+        self.end = _timestamp(end)
+        self.cards = _values(cards)
+        self.categories = _values(categories)
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.statuses = _values(statuses)
+        self.mcc = _values(mcc)
+        self._last: Optional[Tuple[Any, Tuple[Any, ...], np.ndarray]] = None
+
+    @classmethod
+    def last_months(cls, end: Moment, months: int = 3, **conditions: Any) -> "Query":
+        """За months месяцев до указанного момента (период отчётов src.reports)."""
+        end = pd.Timestamp(end)
+        return cls(start=end - pd.DateOffset(months=months), end=end, **conditions)
+
+    @classmethod
+    def month(cls, year: int, month: int, **conditions: Any) -> "Query":
+        """Весь календарный месяц."""
+        start = pd.Timestamp(year=year, month=month, day=1)
+        end = start + pd.DateOffset(months=1) - pd.Timedelta(1, "ns")
+        return cls(start=start, end=end, **conditions)
+
+    def __and__(self, other: "Query") -> "Query":
+        return Query(
+            start=_bound(self.start, other.start, max),
+            end=_bound(self.end, other.end, min),
+            cards=_intersect(self.cards, other.cards),
+            categories=_intersect(self.categories, other.categories),
+            min_amount=_bound(self.min_amount, other.min_amount, max),
+            max_amount=_bound(self.max_amount, other.max_amount, min),
+            statuses=_intersect(self.statuses, other.statuses),
+            mcc=_intersect(self.mcc, other.mcc),
+        )
+
+    @property
+    def key(self) -> Tuple[Any, ...]:
+        """Условия запроса в виде кортежа (для сравнения и ключей кэша)."""
+        return (
+            self.start,
+            self.end,
+            self.cards,
+            self.categories,
+            self.min_amount,
+            self.max_amount,
+            self.statuses,
+            self.mcc,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Query) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        names = ["start", "end", "cards", "categories", "min_amount", "max_amount", "statuses", "mcc"]
+        parts = [f"{name}={value!r}" for name, value in zip(names, self.key) if value is not None]
+        return f"Query({', '.join(parts)})"
+
+    def _bounds(self, dates: pd.Series) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """Границы периода в единицах колонки дат.
+
+        pandas не сравнивает даты в секундах с границей в наносекундах без
+        потери точности, поэтому начало округляется вверх, а конец - вниз.
+        """
+        unit = getattr(dates.dt, "unit", None) if dates.dtype.kind == "M" else None
+        if unit is None:
+            return self.start, self.end
+        start = self.start.ceil(unit).as_unit(unit) if self.start is not None else None
+        end = self.end.floor(unit).as_unit(unit) if self.end is not None else None
+        return start, end
+
+    def date_slice(self, dates: pd.Series, assume_sorted: bool = False) -> Optional[slice]:
+        """Срез строк периода для отсортированных дат; None, если даты не упорядочены.
+
+        assume_sorted=True пропускает проверку порядка (она просматривает всю колонку).
+        """
+        if not assume_sorted and not dates.is_monotonic_increasing:
+            return None
+        start, end = self._bounds(dates)
+        lower = int(dates.searchsorted(start, side="left")) if start is not None else 0
+        upper = int(dates.searchsorted(end, side="right")) if end is not None else len(dates)
+        return slice(lower, max(lower, upper))
+
+    def _conditions(self, df: pd.DataFrame, names: Mapping[str, str], dates: bool) -> Optional[np.ndarray]:
+        """Маска условий по строкам df; None, если условий нет."""
+        mask: Optional[np.ndarray] = None
+
+        def combine(condition: pd.Series) -> None:
+            nonlocal mask
+            values = condition.to_numpy(dtype=bool, na_value=False)
+            mask = values if mask is None else mask & values
+
+        if dates:
+            start, end = self._bounds(df[names["date"]])
+            if start is not None:
+                combine(df[names["date"]] >= start)
+            if end is not None:
+                combine(df[names["date"]] <= end)
+        for field, column in CONDITION_COLUMNS.items():
+            values = getattr(self, field)
+            if values is not None:
+                combine(df[names[column]].isin(values))
+        if self.min_amount is not None:
+            combine(df[names["amount"]] >= self.min_amount)
+        if self.max_amount is not None:
+            combine(df[names["amount"]] <= self.max_amount)
+        return mask
+
+    def rows(self, df: pd.DataFrame, columns: Optional[Mapping[str, str]] = None) -> np.ndarray:
+        """Номера подходящих строк df по порядку.
+
+        columns - имена колонок df для нормализованных имён, например
+        src.storage.EXPORT_NAMES для данных в колонках выгрузки.
+        """
+        names: Dict[str, str] = {name: name for name in ("date", "amount", *CONDITION_COLUMNS.values())}
+        names.update(columns or {})
+        names_key = tuple(sorted(names.items()))
+        if self._last is not None and self._last[0]() is df and self._last[1] == names_key:
+            return self._last[2]
+
+        window = self.date_slice(df[names["date"]]) if self.start is not None or self.end is not None else None
+        if window is None:
+            part = df
+            mask = self._conditions(df, names, dates=True)
+            offset = 0
+        else:
+            part = df.iloc[window]
+            mask = self._conditions(part, names, dates=False)
+            offset = window.start
+        if mask is None:
+            result = np.arange(offset, offset + len(part))
+        else:
+            result = np.flatnonzero(mask) + offset
+        self._last = (weakref.ref(df), names_key, result)
+        return result
+
+    def apply(self, df: pd.DataFrame, columns: Optional[Mapping[str, str]] = None) -> pd.DataFrame:
+        """Подходящие строки df; период из отсортированных данных возвращается срезом без копирования."""
+        rows = self.rows(df, columns)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return df.iloc[rows[0] : rows[-1] + 1]
+        return df.iloc[rows]
+
+    def mask(self, df: pd.DataFrame, columns: Optional[Mapping[str, str]] = None) -> np.ndarray:
+        """Логическая маска подходящих строк df."""
+        mask = np.zeros(len(df), dtype=bool)
+        mask[self.rows(df, columns)] = True
+        return mask
+
+    def sql(self) -> Tuple[str, List[Any]]:
+        """Условие WHERE для таблицы src.sqlite_store (даты в наносекундах) и его параметры."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if self.start is not None:
+            clauses.append("date >= ?")
+            params.append(ns(self.start))
+        if self.end is not None:
+            clauses.append("date <= ?")
+            params.append(ns(self.end))
+        for field, column in CONDITION_COLUMNS.items():
+            values = getattr(self, field)
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+        if self.min_amount is not None:
+            clauses.append("amount >= ?")
+            params.append(float(self.min_amount))
+        if self.max_amount is not None:
+            clauses.append("amount <= ?")
+            params.append(float(self.max_amount))
+        return " AND ".join(clauses) or "1", params
@@ -1,8 +1,23 @@
-import pandas as pd
+from __future__ import annotations
+
 import datetime as dt
-from typing import Optional, Callable
 import functools
 import os
+from typing import TYPE_CHECKING, Callable, Optional
+
+from src.fx import DEFAULT_COLUMNS, convert_to_rub
+from src.lazy import lazy_import
+from src.query import Query
+from src.storage import EXPORT_NAMES
+from src.utils import parse_dates
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Колонки выгрузки для пересчёта сумм в рубли
+FX_COLUMNS = {key: EXPORT_NAMES[key] for key in DEFAULT_COLUMNS}
 
 
 def save_report(file_name: Optional[str] = None):
@@ -37,13 +52,13 @@ def spending_by_category(transactions: pd.DataFrame, category: str, date: Option
     else:
         end_date = pd.Timestamp.now()
 
-    start_date = end_date - pd.DateOffset(months=3)
+    query = Query.last_months(end_date, 3, categories=[category])
 
     df = transactions.copy()
-    df["Дата операции"] = pd.to_datetime(df["Дата операции"], errors="coerce")
+    df["Дата операции"] = parse_dates(df["Дата операции"])
+    df = convert_to_rub(df, columns=FX_COLUMNS)
 
-    mask = (df["Дата операции"].between(start_date, end_date)) & (df["Категория"] == category)
-    report = df.loc[mask, ["Дата операции", "Сумма операции", "Категория", "Описание"]]
+    report = query.apply(df, columns=EXPORT_NAMES)[["Дата операции", "Сумма операции", "Категория", "Описание"]]
 
     report = report[report["Сумма операции"] > 0]
 
@@ -58,13 +73,13 @@ def spending_by_weekday(transactions: pd.DataFrame, date: Optional[str] = None)
     else:
         end_date = pd.Timestamp.now()
 
-    start_date = end_date - pd.DateOffset(months=3)
+    query = Query.last_months(end_date, 3)
 
     df = transactions.copy()
-    df["Дата операции"] = pd.to_datetime(df["Дата операции"], errors="coerce")
+    df["Дата операции"] = parse_dates(df["Дата операции"])
+    df = convert_to_rub(df, columns=FX_COLUMNS)
 
-    mask = df["Дата операции"].between(start_date, end_date)
-    df = df.loc[mask, ["Дата операции", "Сумма операции"]]
+    df = query.apply(df, columns=EXPORT_NAMES)[["Дата операции", "Сумма операции"]]
 
     df["weekday"] = df["Дата операции"].dt.day_name(locale="ru_RU")  # день недели
     report = df.groupby("weekday", as_index=False)["Сумма операции"].mean()
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import logging
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from src.lazy import lazy_import
+from src.metrics import current_metrics
+from src.query import Moment, Query
+from src.stats import DailySketches, Sketch
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Величины, для которых хранятся накопленные суммы: сумма операций, расходы
+# (отрицательные суммы), поступления (положительные), кэшбэк и число операций
+MEASURES = ("amount", "expenses", "income", "cashback", "count")
+
+KEYS = ("card_number", "category")
+
+# Распределения размеров операций: расходы (по модулю) и поступления
+SIDES = ("expenses", "income")
+
+
+class _KeyRollup:
+    """Накопленные суммы по значениям одной колонки.
+
+    Строки упорядочены по значению ключа, а внутри ключа - по номеру строки
+    (то есть по дате). Составной номер code * (size + 1) + row возрастает
+    по всему массиву, поэтому границы периода для всех ключей сразу
+    находятся одним np.searchsorted.
+    """
+
+    def __init__(self, column: pd.Series, values: np.ndarray) -> None:
+        codes, self.uniques = pd.factorize(column, sort=True)
+        self.codes = codes
+        rows = np.flatnonzero(codes >= 0)
+        order = np.argsort(codes[rows], kind="stable")
+        rows = rows[order]
+        self.stride = len(column) + 1
+        self.composite = codes[rows].astype(np.int64) * self.stride + rows
+        self.cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values[rows], axis=0)])
+
+    def totals(self, lower: int, upper: int) -> np.ndarray:
+        """Итоги строк [lower, upper) по каждому ключу: массив len(uniques) x len(MEASURES)."""
+        base = np.arange(len(self.uniques), dtype=np.int64) * self.stride
+        left = np.searchsorted(self.composite, base + lower, side="left")
+        right = np.searchsorted(self.composite, base + upper, side="left")
+        totals: np.ndarray = self.cumulative[right] - self.cumulative[left]
+        return totals
+
+
+class Rollups:
+    """Накопленные (префиксные) суммы по картам и категориям над операциями, отсортированными по дате.
+
+    Итоги за любой период - сумма, расходы, поступления, кэшбэк и число
+    операций - получаются разностью двух накопленных сумм без фильтрации
+    и groupby. Суммы считаются в float64, поэтому могут отличаться от
+    groupby().sum() в последних разрядах (много меньше копейки).
+
+    Распределения размеров операций (медиана, p90, p99, гистограмма) берутся
+    из дневных распределений src.stats.DailySketches, которые строятся при
+    первом запросе для каждого ключа и хранятся вместе с накопленными суммами,
+    то есть живут в кэше rollups_for, пока жива та же версия данных.
+    """
+
+    def __init__(self, df: pd.DataFrame, keys: Sequence[str] = KEYS) -> None:
+        dates = df["date"]
+        if not dates.is_monotonic_increasing:
+            raise ValueError("Операции для накопленных сумм должны быть отсортированы по дате")
+        # Своя Series поверх того же массива: ссылка на колонку не должна удерживать сам df
+        self.dates = pd.Series(dates.to_numpy(), copy=False)
+        self.size = len(df)
+
+        amount = np.nan_to_num(df["amount"].to_numpy(dtype=float, na_value=np.nan))
+        if "cashback" in df.columns:
+            cashback = np.nan_to_num(pd.to_numeric(df["cashback"], errors="coerce").to_numpy(dtype=float))
+        else:
+            cashback = np.zeros(self.size)
+        values = np.column_stack(
+            [amount, np.minimum(amount, 0.0), np.maximum(amount, 0.0), cashback, np.ones(self.size)]
+        )
+        self._amount = amount
+        self._sketches: Dict[Tuple[Optional[str], str], DailySketches] = {}
+        self._sketches_lock = threading.Lock()
+        self._total = np.vstack([np.zeros((1, len(MEASURES))), np.cumsum(values, axis=0)])
+        self._keys: Dict[str, _KeyRollup] = {key: _KeyRollup(df[key], values) for key in keys if key in df.columns}
+
+    def _rows(self, start: Optional[Moment], end: Optional[Moment]) -> Tuple[int, int]:
+        window = Query(start=start, end=end).date_slice(self.dates, assume_sorted=True)
+        if window is None:
+            raise ValueError("Операции для накопленных сумм должны быть отсортированы по дате")
+        return window.start, window.stop
+
+    def summary(self, start: Optional[Moment] = None, end: Optional[Moment] = None) -> Dict[str, float]:
+        """Итоги по всем операциям периода (границы включительные, None - без границы)."""
+        lower, upper = self._rows(start, end)
+        totals = self._total[upper] - self._total[lower]
+        return dict(zip(MEASURES, totals.tolist()))
+
+    def totals(self, key: str, start: Optional[Moment] = None, end: Optional[Moment] = None) -> pd.DataFrame:
+        """Итоги периода по значениям колонки key (только значения, встречающиеся в периоде)."""
+        lower, upper = self._rows(start, end)
+        rollup = self._keys[key]
+        frame = pd.DataFrame(rollup.totals(lower, upper), columns=list(MEASURES))
+        frame.index = pd.Index(rollup.uniques, name=key)
+        frame["count"] = frame["count"].round().astype(np.int64)
+        return frame[frame["count"] > 0]
+
+    def card_stats(self, start: Optional[Moment] = None, end: Optional[Moment] = None) -> List[Dict[str, Any]]:
+        """То же, что src.utils.get_card_stats для операций периода."""
+        from src.utils import card_stats_from_totals
+
+        return card_stats_from_totals(self.totals("card_number", start, end)["amount"].reset_index())
+
+    def _daily(self, key: Optional[str], side: str) -> DailySketches:
+        if side not in SIDES:
+            raise ValueError(f"Неизвестный вид операций: {side}. Допустимые: {', '.join(SIDES)}")
+        with self._sketches_lock:
+            daily = self._sketches.get((key, side))
+            current_metrics().cache("sketches", daily is not None)
+            if daily is None:
+                values = -self._amount if side == "expenses" else self._amount
+                with current_metrics().stage("sketches"):
+                    if key is None:
+                        daily = DailySketches(self.dates, values)
+                    else:
+                        daily = DailySketches(self.dates, values, self._keys[key].codes, self._keys[key].uniques)
+                self._sketches[(key, side)] = daily
+        return daily
+
+    def distribution(
+        self, start: Optional[Moment] = None, end: Optional[Moment] = None, side: str = "expenses"
+    ) -> Sketch:
+        """Распределение размеров операций периода (расходы - по модулю)."""
+        lower, upper = self._rows(start, end)
+        return self._daily(None, side).total(lower, upper)
+
+    def distributions(
+        self, key: str, start: Optional[Moment] = None, end: Optional[Moment] = None, side: str = "expenses"
+    ) -> Dict[Any, Sketch]:
+        """Распределения размеров операций периода по значениям колонки key."""
+        lower, upper = self._rows(start, end)
+        return self._daily(key, side).sketches(lower, upper)
+
+
+_cache: Dict[int, Tuple[Any, Rollups]] = {}
+_cache_lock = threading.Lock()
+
+
+def rollups_for(df: pd.DataFrame) -> Rollups:
+    """Накопленные суммы для df; строятся один раз и живут, пока жив сам DataFrame.
+
+    Подходит для долгоживущих данных (хранилище, данные сервера): построение
+    стоит одной сортировки, а каждый следующий запрос - только поиска границ.
+    Кэш опознаёт данные по объекту DataFrame, поэтому для одной версии данных
+    вызывающий код передаёт один и тот же объект (см. src.server.Repository.data).
+    """
+    key = id(df)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0]() is df:
+            current_metrics().cache("rollups", True)
+            return entry[1]
+
+    current_metrics().cache("rollups", False)
+    with current_metrics().stage("rollups"):
+        rollups = Rollups(df)
+    logger.info("Накопленные суммы построены: %d строк", rollups.size)
+
+    def forget(_ref: Any) -> None:
+        with _cache_lock:
+            _cache.pop(key, None)
+
+    with _cache_lock:
+        _cache[key] = (weakref.ref(df, forget), rollups)
+    return rollups
+
+
+# Полураспад веса дневных расходов в экспоненциальном сглаживании, дни
+HALF_LIFE_DAYS = 14.0
+FORECAST_KEYS = ("card_number", "category")
+# Сколько последних состояний дневных расходов держать для дописываемых данных
+DAILY_CACHE_SIZE = 4
+
+
+def _day_numbers(dates: Any) -> np.ndarray:
+    """Номера дней (от 1970-01-01) для дат."""
+    return np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+
+class DailySpending:
+    """Дневные расходы по рядам (карта, категория), дописываемые по мере загрузки операций.
+
+    Хранит по записи на (день, ряд) с суммой расходов (по модулю), записи
+    упорядочены по дню. append() обрабатывает только строки после уже
+    учтённых, поэтому после дописывания операций в хранилище (см.
+    TransactionStore.append) пересчитываются лишь новые дни. Итоги любого
+    ряда за любой период - один np.bincount по записям периода, сразу для
+    всех рядов.
+    """
+
+    def __init__(self) -> None:
+        self.series: Dict[Tuple[Any, ...], int] = {}
+        self.days = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0)
+        self.first_day: Optional[int] = None
+        self.rows = 0
+        self._last: Optional[Tuple[Any, Any]] = None
+
+    @staticmethod
+    def _row_id(df: pd.DataFrame, row: int) -> Tuple[Any, Any]:
+        """Опознаёт строку: по отпечатку (см. src.validation), а без него - по дате и сумме."""
+        column = "fingerprint" if "fingerprint" in df.columns else "amount"
+        return df["date"].iloc[row], df[column].iloc[row]
+
+    def continues(self, df: pd.DataFrame) -> bool:
+        """Начинается ли df с уже учтённых строк (то есть дописаны ли к ним новые операции)."""
+        return 0 < self.rows <= len(df) and self._row_id(df, self.rows - 1) == self._last
+
+    def copy(self) -> "DailySpending":
+        """Копия состояния; массивы не меняются на месте, поэтому копируется только словарь рядов."""
+        state = DailySpending()
+        state.__dict__.update(self.__dict__)
+        state.series = dict(self.series)
+        return state
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Учитывает строки df после уже учтённых; df - те же данные с дописанными в конец операциями."""
+        if not df["date"].is_monotonic_increasing:
+            raise ValueError("Операции для дневных расходов должны быть отсортированы по дате")
+        tail = df.iloc[self.rows :]
+        if tail.empty:
+            return
+        days = _day_numbers(tail["date"].to_numpy())
+        if self.first_day is None:
+            self.first_day = int(days[0])
+        amount = np.nan_to_num(tail["amount"].to_numpy(dtype=float, na_value=np.nan))
+        spent = np.maximum(-amount, 0.0)
+        rows = np.flatnonzero(spent > 0)
+        keys = list(FORECAST_KEYS)
+        frame = pd.DataFrame(
+            {key: tail[key].to_numpy()[rows] if key in tail.columns else np.full(len(rows), None) for key in keys}
+        )
+        frame["day"] = days[rows]
+        frame["spent"] = spent[rows]
+        daily = frame.groupby(["day", *keys], dropna=False, observed=True, sort=True)["spent"].sum().reset_index()
+
+        # Ряды новых строк получают номера состояния; новые ряды добавляются в конец
+        local = daily.groupby(keys, dropna=False, observed=True, sort=False).ngroup().to_numpy()
+        codes, first = np.unique(local, return_index=True)
+        mapping = np.empty(len(codes), dtype=np.int64)
+        for code, values in zip(codes, daily[keys].iloc[first].itertuples(index=False)):
+            key = tuple(None if pd.isna(value) else value for value in values)
+            mapping[code] = self.series.setdefault(key, len(self.series))
+
+        self.days = np.concatenate([self.days, daily["day"].to_numpy(dtype=np.int64)])
+        self.codes = np.concatenate([self.codes, mapping[local]])
+        self.sums = np.concatenate([self.sums, daily["spent"].to_numpy(dtype=float)])
+        self.rows = len(df)
+        self._last = self._row_id(df, self.rows - 1)
+
+    def totals(self, first: int, last: int) -> np.ndarray:
+        """Расходы каждого ряда за дни [first, last]."""
+        lower = np.searchsorted(self.days, first, side="left")
+        upper = np.searchsorted(self.days, last, side="right")
+        return np.bincount(self.codes[lower:upper], weights=self.sums[lower:upper], minlength=len(self.series))
+
+    def ewma(self, day: int, half_life: float = HALF_LIFE_DAYS) -> np.ndarray:
+        """Экспоненциально сглаженные дневные расходы каждого ряда на день day (включительно).
+
+        Дни без расходов входят в среднее нулями. Пока история короче
+        нескольких полураспадов, вес делится на сумму весов прошедших дней,
+        общую для всех рядов, чтобы итог по картам и категориям оставался
+        суммой рядов.
+        """
+        decay = 0.5 ** (1.0 / half_life)
+        upper = np.searchsorted(self.days, day, side="right")
+        weights = (1 - decay) * decay ** (day - self.days[:upper]).astype(float)
+        smoothed = np.bincount(self.codes[:upper], weights=self.sums[:upper] * weights, minlength=len(self.series))
+        elapsed = day - (self.first_day if self.first_day is not None else day) + 1
+        result: np.ndarray = smoothed / (1 - decay ** max(elapsed, 1))
+        return result
+
+
+_daily_cache: List[DailySpending] = []
+_daily_lock = threading.Lock()
+
+
+def daily_spending_for(df: pd.DataFrame) -> DailySpending:
+    """Дневные расходы df; если df - ранее обработанные данные с дописанными операциями, учитываются только новые.
+
+    Последние DAILY_CACHE_SIZE состояний хранятся в памяти процесса.
+    """
+    with _daily_lock:
+        for state in _daily_cache:
+            if not state.continues(df):
+                continue
+            hit = state.rows == len(df)
+            current_metrics().cache("daily_spending", hit)
+            if not hit:
+                # Прежнее состояние остаётся верным для прежних данных, поэтому дополняется копия
+                previous, state = state, state.copy()
+                with current_metrics().stage("daily_spending"):
+                    state.append(df)
+                logger.info("Дневные расходы дополнены: %d новых строк", state.rows - previous.rows)
+            else:
+                _daily_cache.remove(state)
+            _daily_cache.insert(0, state)
+            del _daily_cache[DAILY_CACHE_SIZE:]
+            return state
+
+        current_metrics().cache("daily_spending", False)
+        state = DailySpending()
+        with current_metrics().stage("daily_spending"):
+            state.append(df)
+        _daily_cache.insert(0, state)
+        del _daily_cache[DAILY_CACHE_SIZE:]
+        return state
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from src.metrics import collect, emit
+
+logger = logging.getLogger(__name__)
+
+# Доля времени, которую может занимать прогрев: после задачи длительностью d поток ждёт d * (1 - b) / b
+CPU_BUDGET = 0.25
+# Начало утреннего пика запросов и за сколько секунд до него заново получать курсы и цены
+PEAK_TIME = "08:00"
+MARKET_LEAD = 30.0
+# Как часто проверять, не загружены ли новые данные, секунды
+CHECK_INTERVAL = 30.0
+
+# Периоды главной страницы; месяц - период по умолчанию, поэтому его запрос без параметра period
+PERIODS = ("M", "W", "Y", "ALL")
+
+Request = Tuple[str, Dict[str, str]]
+
+
+def market_requests(periods: Sequence[str] = PERIODS) -> List[Request]:
+    """Запросы главной страницы: её ответ содержит курсы и цены, поэтому перед пиком строится заново."""
+    return [("/main", {} if period == "M" else {"period": period}) for period in periods]
+
+
+def data_requests(day: date) -> List[Request]:
+    """Отчёты дня day, зависящие только от данных: траты по дням недели и категории кэшбэка месяца."""
+    return [
+        ("/reports/spending-by-weekday", {"date": day.strftime("%Y-%m-%d")}),
+        ("/services/cashback-categories", {"month": day.strftime("%Y-%m")}),
+    ]
+
+
+class PrewarmScheduler:
+    """Заранее готовит ответы, которые понадобятся в утренний пик.
+
+    После каждой загрузки данных (смены version()) строит главную страницу
+    за текущие периоды и отчёты дня ближайшего пика, а за lead секунд до
+    пика строит главную страницу ещё раз, заново получая курсы и цены.
+    Запрос выполняет warm(path, params); длительность каждого сохраняется
+    в timings, ошибки - в errors.
+
+    Прогрев занимает не больше cpu_budget времени: после запроса
+    длительностью d поток ждёт d * (1 - cpu_budget) / cpu_budget и не
+    занимает пул вычислений подолгу.
+    """
+
+    def __init__(
+        self,
+        warm: Callable[[str, Dict[str, str]], Any],
+        version: Callable[[], str],
+        cpu_budget: float = CPU_BUDGET,
+        peak: str = PEAK_TIME,
+        lead: float = MARKET_LEAD,
+        check_interval: float = CHECK_INTERVAL,
+    ) -> None:
+        if not 0 < cpu_budget <= 1:
+            raise ValueError(f"Доля времени прогрева должна быть в интервале (0, 1], получено {cpu_budget}")
+        self.warm = warm
+        self.version = version
+        self.cpu_budget = cpu_budget
+        self.peak = datetime.strptime(peak, "%H:%M").time()
+        self.lead = lead
+        self.check_interval = check_interval
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._warmed: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def next_peak(self, now: datetime) -> datetime:
+        """Ближайший пик, перед которым курсы ещё не обновлялись (позже now + lead)."""
+        peak = datetime.combine(now.date(), self.peak)
+        if now >= peak - timedelta(seconds=self.lead):
+            peak += timedelta(days=1)
+        return peak
+
+    def pause(self, seconds: float) -> float:
+        """Пауза после задачи длительностью seconds, удерживающая долю прогрева в cpu_budget."""
+        return seconds * (1 - self.cpu_budget) / self.cpu_budget
+
+    def run(self, requests: Sequence[Request]) -> Dict[str, float]:
+        """Выполняет запросы по очереди с паузами и возвращает их длительность в секундах."""
+        durations: Dict[str, float] = {}
+        with collect() as metrics:
+            for path, params in requests:
+                if self._stop.is_set():
+                    break
+                name = f"{path}?{urlencode(params)}" if params else path
+                started = time.perf_counter()
+                try:
+                    with metrics.stage(name):
+                        self.warm(path, params)
+                    self.errors.pop(name, None)
+                except Exception as e:
+                    logger.error("Ошибка прогрева %s: %s", name, e)
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+                durations[name] = time.perf_counter() - started
+                self._stop.wait(self.pause(durations[name]))
+            emit("prewarm", metrics)
+        self.timings.update(durations)
+        logger.info("Прогрев: %d запросов за %.3f с", len(durations), sum(durations.values()))
+        return durations
+
+    def after_ingest(self, now: datetime) -> Dict[str, float]:
+        """Прогрев после загрузки данных: главная страница и отчёты дня ближайшего пика."""
+        return self.run(market_requests() + data_requests(self.next_peak(now).date()))
+
+    def before_peak(self) -> Dict[str, float]:
+        """Прогрев перед пиком: главная страница со свежими курсами и ценами."""
+        return self.run(market_requests())
+
+    def step(self, now: datetime, prefetch_at: datetime) -> datetime:
+        """Проверяет данные и время пика; возвращает время следующего обновления курсов."""
+        version: Optional[str]
+        try:
+            version = self.version()
+        except Exception as e:
+            logger.error("Ошибка проверки данных для прогрева: %s", e)
+            version = self._warmed
+        if version != self._warmed:
+            self.after_ingest(now)
+            self._warmed = version
+        if now >= prefetch_at:
+            self.before_peak()
+            prefetch_at = self.next_peak(datetime.now()) - timedelta(seconds=self.lead)
+        return prefetch_at
+
+    def _loop(self) -> None:
+        prefetch_at = self.next_peak(datetime.now()) - timedelta(seconds=self.lead)
+        while not self._stop.is_set():
+            prefetch_at = self.step(datetime.now(), prefetch_at)
+            until_prefetch = (prefetch_at - datetime.now()).total_seconds()
+            self._stop.wait(max(0.0, min(self.check_interval, until_prefetch)))
+
+    def start(self) -> None:
+        """Запускает прогрев в фоновом потоке."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Прогрев запущен: пик в %s, доля времени %.0f%%", self.peak.strftime("%H:%M"), self.cpu_budget * 100
+        )
+
+    def stop(self) -> None:
+        """Останавливает фоновый поток, дожидаясь текущего запроса."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import uuid
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set
+
+from src.lazy import lazy_import
+from src.query import Moment
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+SEARCH_FIELDS = ("description", "category")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Приводит строку к виду для поиска: нижний регистр, 'ё' как 'е'."""
+    return text.casefold().replace("ё", "е")
+
+
+def _union(arrays: List[np.ndarray]) -> np.ndarray:
+    """Отсортированное объединение массивов номеров строк без повторов."""
+    if not arrays:
+        return np.empty(0, dtype=np.int64)
+    rows = np.sort(np.concatenate(arrays))
+    if len(rows) > 1:
+        rows = rows[np.concatenate(([True], rows[1:] != rows[:-1]))]
+    return rows
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _FieldIndex:
+    """Индекс одной текстовой колонки.
+
+    Токены и триграммы строятся по уникальным строкам колонки, а для каждой
+    строки хранится список номеров операций. Поэтому размер словарей зависит
+    от числа разных описаний, а не от числа операций.
+    """
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.texts: List[str] = []
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.vocabulary: List[str] = []
+        self.rows: List[List[np.ndarray]] = []
+
+    def _add_string(self, value: str) -> int:
+        string_id = len(self.texts)
+        text = normalize_text(value)
+        self.ids[value] = string_id
+        self.texts.append(text)
+        self.rows.append([])
+        for trigram in _trigrams(text):
+            self.trigrams.setdefault(trigram, set()).add(string_id)
+        for token in set(_TOKEN.findall(text)):
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                bisect.insort(self.vocabulary, token)
+            self.tokens[token].add(string_id)
+        return string_id
+
+    def add(self, values: pd.Series, row_offset: int) -> None:
+        """Добавляет значения колонки для операций с номерами row_offset, row_offset + 1, ..."""
+        codes, uniques = pd.factorize(values)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        bounds = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1))
+        for code, value in enumerate(uniques):
+            value = str(value)
+            string_id = self.ids.get(value)
+            if string_id is None:
+                string_id = self._add_string(value)
+            self.rows[string_id].append(order[bounds[code] : bounds[code + 1]] + row_offset)
+
+    def match(self, term: str, prefix: bool) -> Set[int]:
+        """Идентификаторы строк, содержащих term (или слово, начинающееся с term)."""
+        if prefix:
+            start = bisect.bisect_left(self.vocabulary, term)
+            matched: Set[int] = set()
+            for token in self.vocabulary[start:]:
+                if not token.startswith(term):
+                    break
+                matched |= self.tokens[token]
+            return matched
+
+        if len(term) < 3:
+            return {i for i, text in enumerate(self.texts) if term in text}
+        candidates: Optional[Set[int]] = None
+        for trigram in _trigrams(term):
+            ids = self.trigrams.get(trigram, set())
+            candidates = ids.copy() if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return {i for i in candidates or set() if term in self.texts[i]}
+
+    def strings(self) -> List[str]:
+        """Исходные строки колонки в порядке их идентификаторов."""
+        strings = [""] * len(self.ids)
+        for value, string_id in self.ids.items():
+            strings[string_id] = value
+        return strings
+
+    def rows_for(self, string_ids: Iterable[int]) -> np.ndarray:
+        chunks = [chunk for i in string_ids for chunk in self.rows[i]]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+
+class SearchIndex:
+    """Инвертированный индекс для полнотекстового поиска по описаниям и категориям операций.
+
+    Поддерживает поиск подстроки без учёта регистра (через триграммы),
+    поиск по началу слова (запрос 'маг*'), фильтры по датам и картам, а также
+    дополнение новыми операциями без перестроения.
+    """
+
+    def __init__(self, fields: Sequence[str] = SEARCH_FIELDS) -> None:
+        self.fields = {name: _FieldIndex() for name in fields}
+        self.size = 0
+        self.version: Optional[str] = None
+        self._dates: List[np.ndarray] = []
+        self._cards: List[np.ndarray] = []
+        self._card_ids: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, fields: Sequence[str] = SEARCH_FIELDS) -> "SearchIndex":
+        """Строит индекс по нормализованным транзакциям (см. src.storage.normalize_transactions)."""
+        index = cls([name for name in fields if name in df.columns])
+        index.append(df)
+        return index
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Добавляет операции df, которые получают номера строк после уже проиндексированных."""
+        for name, field in self.fields.items():
+            field.add(df[name], self.size)
+        self._dates.append(df["date"].to_numpy(dtype="datetime64[ns]"))
+        # Карты храним кодами словаря, чтобы фильтр был сравнением целых чисел
+        cards = df["card_number"] if "card_number" in df.columns else pd.Series([None] * len(df))
+        codes, uniques = pd.factorize(cards)
+        mapping = np.array([self._card_ids.setdefault(str(card), len(self._card_ids)) for card in uniques] + [-1])
+        self._cards.append(mapping[codes].astype(np.int32))
+        self.size += len(df)
+
+    def _column(self, parts: List[np.ndarray]) -> np.ndarray:
+        if len(parts) > 1:
+            parts[:] = [np.concatenate(parts)]
+        return parts[0] if parts else np.empty(0)
+
+    def search(
+        self,
+        query: str,
+        fields: Optional[Sequence[str]] = None,
+        start: Optional[Moment] = None,
+        end: Optional[Moment] = None,
+        cards: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        """Возвращает отсортированные номера строк, подходящих под запрос.
+
+        Все слова запроса должны встретиться в строке (в любом из полей);
+        слово, оканчивающееся на '*', ищется как начало слова.
+        """
+        terms = normalize_text(query).split()
+        names = list(fields) if fields else list(self.fields)
+        rows: Optional[np.ndarray] = None
+        for term in terms:
+            prefix = term.endswith("*")
+            term = term.rstrip("*")
+            if not term:
+                continue
+            term_rows = [self.fields[name].rows_for(self.fields[name].match(term, prefix)) for name in names]
+            found = _union(term_rows)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if len(rows) == 0:
+                break
+
+        if rows is None:
+            rows = np.arange(self.size)
+
+        if start is not None or end is not None:
+            dates = self._column(self._dates)[rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                mask &= dates >= np.datetime64(pd.Timestamp(start))
+            if end is not None:
+                mask &= dates <= np.datetime64(pd.Timestamp(end))
+            rows = rows[mask]
+        if cards:
+            wanted = [self._card_ids[card] for card in cards if card in self._card_ids]
+            rows = rows[np.isin(self._column(self._cards)[rows], wanted)]
+        return rows
+
+    def save(self, path: str) -> None:
+        """Сохраняет индекс в файл .npz.
+
+        Номера строк хранятся массивами numpy, строки колонок и карты - JSON-заголовком;
+        триграммы и токены не сохраняются, а восстанавливаются по строкам при загрузке.
+        Файл подменяется атомарно, поэтому параллельные читатели видят целый индекс.
+        """
+        header = {
+            "version": self.version,
+            "size": self.size,
+            "cards": list(self._card_ids),
+            "fields": {name: field.strings() for name, field in self.fields.items()},
+        }
+        arrays = {
+            "header": np.array(json.dumps(header, ensure_ascii=False)),
+            "dates": self._column(self._dates).astype("datetime64[ns]"),
+            "cards": self._column(self._cards).astype(np.int32),
+        }
+        for name, field in self.fields.items():
+            rows = [field.rows_for([string_id]) for string_id in range(len(field.texts))]
+            arrays[f"rows_{name}"] = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            arrays[f"bounds_{name}"] = np.cumsum([0] + [len(chunk) for chunk in rows], dtype=np.int64)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, allow_pickle=False, **arrays)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> "SearchIndex":
+        """Загружает индекс, сохранённый методом save."""
+        with np.load(path, allow_pickle=False) as saved:
+            if "header" not in saved.files:
+                raise ValueError(f"Файл {path} не содержит поискового индекса")
+            header = json.loads(str(saved["header"]))
+            index = SearchIndex(list(header["fields"]))
+            for name, strings in header["fields"].items():
+                field = index.fields[name]
+                rows, bounds = saved[f"rows_{name}"], saved[f"bounds_{name}"]
+                for string_id, value in enumerate(strings):
+                    field._add_string(value)
+                    field.rows[string_id].append(rows[bounds[string_id] : bounds[string_id + 1]])
+            index._dates = [saved["dates"]]
+            index._cards = [saved["cards"]]
+        index._card_ids = {card: card_id for card_id, card in enumerate(header["cards"])}
+        index.size = header["size"]
+        index.version = header["version"]
+        return index
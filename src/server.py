@@ -0,0 +1,620 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from config import FILE_XLSX, STORE_DIR
+from src.lazy import lazy_import
+from src.query import Query
+from src.scheduler import CPU_BUDGET, PEAK_TIME, PrewarmScheduler
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from src.storage import TransactionStore
+else:
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+HOST = "127.0.0.1"
+PORT = 8000
+
+# Сколько секунд держать неактивное keep-alive соединение
+KEEPALIVE_TIMEOUT = 15.0
+MAX_CONNECTIONS = 256
+# Сколько запросов одновременно выполняется в пуле и сколько может ждать очереди
+MAX_CONCURRENCY = 8
+MAX_PENDING = 64
+# Как часто проверять, не изменилась ли выгрузка, секунды
+FRESHNESS_INTERVAL = 1.0
+# Главная страница содержит курсы и цены акций, поэтому её ETag меняется раз в MARKET_TTL секунд
+MARKET_TTL = 60
+RESPONSE_CACHE_SIZE = 256
+
+EXECUTORS = ["process", "thread"]
+
+Params = Dict[str, str]
+
+
+class HTTPError(Exception):
+    """Ошибка запроса с HTTP-статусом ответа."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Repository:
+    """Транзакции процесса, постоянно открытые в memory-mapped хранилище.
+
+    version() проверяет выгрузку не чаще раза в FRESHNESS_INTERVAL секунд и
+    при её изменении перестраивает хранилище; data() возвращает транзакции в
+    рублях для заданной версии, переоткрывая хранилище, если его перестроил
+    другой процесс.
+    """
+
+    def __init__(self, source: str = FILE_XLSX, store_dir: str = STORE_DIR) -> None:
+        self.source = source
+        self.store_dir = store_dir
+        self._store: Optional[TransactionStore] = None
+        # Пересчитанные в рубли данные последней версии: один объект на версию, чтобы
+        # кэши по DataFrame (накопленные суммы src.rollups, отбор Query) переиспользовались запросами
+        self._data: Optional[Tuple[Tuple[str, int], pd.DataFrame]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def version(self) -> str:
+        """Версия данных; при необходимости перестраивает хранилище из выгрузки."""
+        from src.storage import TransactionStore
+
+        with self._lock:
+            now = time.monotonic()
+            store = self._store
+            if store is None or now - self._checked >= FRESHNESS_INTERVAL:
+                current = TransactionStore(self.store_dir)
+                if not current.is_fresh(self.source):
+                    current.ingest(self.source)
+                if store is None or current.version != store.version:
+                    self._store = store = current
+                self._checked = now
+            return store.version
+
+    def data(self, version: Optional[str] = None) -> pd.DataFrame:
+        """Транзакции с суммами в рублях (см. src.storage.load_transactions).
+
+        Для одной версии данных и истории курсов возвращается один и тот же DataFrame.
+        """
+        from src.fx import convert_to_rub, default_history
+        from src.storage import TransactionStore
+
+        with self._lock:
+            store = self._store
+            if store is None or (version is not None and store.version != version):
+                self._store = store = TransactionStore(self.store_dir)
+            key = (store.version, default_history.version)
+            if self._data is None or self._data[0] != key:
+                self._data = (key, convert_to_rub(store.frame(), version=store.version))
+            return self._data[1]
+
+
+def _required(params: Params, name: str) -> str:
+    value = params.get(name)
+    if not value:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Не указан параметр {name}")
+    return value
+
+
+def _month(params: Params) -> datetime:
+    try:
+        return datetime.strptime(_required(params, "month")[:7], "%Y-%m")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр month должен иметь формат YYYY-MM")
+
+
+def _without_nan(value: Any) -> Any:
+    """Заменяет NaN на None: в JSON нет значения NaN."""
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {key: _without_nan(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_without_nan(item) for item in value]
+    return value
+
+
+def _json_bytes(result: Any) -> bytes:
+    try:
+        text = json.dumps(result, ensure_ascii=False, default=str, allow_nan=False)
+    except ValueError:
+        text = json.dumps(_without_nan(result), ensure_ascii=False, default=str)
+    return text.encode("utf-8")
+
+
+def _records(report: pd.DataFrame) -> Any:
+    return json.loads(report.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def _main_page(data: pd.DataFrame, params: Params) -> Any:
+    from src.views import get_main_page_json
+
+    date_str = params.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return get_main_page_json(
+        date_str,
+        user_id=params.get("user_id"),
+        debug=params.get("debug") == "1",
+        data=data,
+        period=params.get("period", "M"),
+        # Ответ и так меняется раз в MARKET_TTL секунд, поэтому курсы не старше этого не запрашиваются снова
+        market_max_age=MARKET_TTL,
+    )
+
+
+def _spending_by_category(data: pd.DataFrame, params: Params) -> Any:
+    from src.reports import spending_by_category
+    from src.storage import EXPORT_NAMES
+
+    report = spending_by_category.__wrapped__(
+        data.rename(columns=EXPORT_NAMES), _required(params, "category"), date=params.get("date")
+    )
+    return _records(report)
+
+
+def _spending_by_weekday(data: pd.DataFrame, params: Params) -> Any:
+    from src.reports import spending_by_weekday
+    from src.storage import EXPORT_NAMES
+
+    return _records(spending_by_weekday.__wrapped__(data.rename(columns=EXPORT_NAMES), date=params.get("date")))
+
+
+def _cashback_categories(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import analyze_profitable_categories
+
+    month = _month(params)
+    # Функция меняет колонку date, поэтому ей передаётся неглубокая копия общих данных
+    return analyze_profitable_categories(data.copy(deep=False), month.year, month.month)
+
+
+def _invest_bank(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import investment_bank
+    from src.storage import EXPORT_NAMES
+
+    month = _month(params)
+    try:
+        limit = int(params.get("limit", "50"))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр limit должен быть целым числом")
+    # investment_bank сам отбирает операции месяца; заранее отбираем их, чтобы не строить список по всем данным
+    in_month = Query.month(month.year, month.month).apply(data)
+    transactions = [
+        {EXPORT_NAMES["date"]: date, EXPORT_NAMES["amount"]: amount}
+        for date, amount in zip(in_month["date"].dt.strftime("%Y-%m-%d"), in_month["amount"])
+    ]
+    month_str = month.strftime("%Y-%m")
+    return {"month": month_str, "limit": limit, "saved": investment_bank(month_str, transactions, limit)}
+
+
+def _period_summary(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import period_summary
+
+    date_str = params.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return period_summary(data, date_str, params.get("period", "M"))
+
+
+def _spending_distribution(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import spending_distribution
+
+    date_str = params.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return spending_distribution(data, date_str, params.get("period", "M"), params.get("side", "expenses"))
+
+
+def _recurring_payments(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import find_recurring_payments
+
+    try:
+        min_occurrences = int(params.get("min_occurrences", "3"))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр min_occurrences должен быть целым числом")
+    return find_recurring_payments(data, min_occurrences)
+
+
+def _forecast(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import forecast_spending
+
+    budgets: Dict[str, float] = {}
+    for item in filter(None, params.get("budget", "").split(",")):
+        name, _, limit = item.rpartition(":")
+        try:
+            budgets[name] = float(limit)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр budget должен иметь вид НАЗВАНИЕ:СУММА,...")
+    date_str = params.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return forecast_spending(data, date_str, budgets)
+
+
+def _cashback_simulation(data: pd.DataFrame, params: Params) -> Any:
+    from src.services import simulate_cashback
+
+    return simulate_cashback(data, start=params.get("start"), end=params.get("end"))
+
+
+def _transactions(data: pd.DataFrame, params: Params) -> Any:
+    from src.views import iter_transactions_json
+
+    def values(name: str) -> Optional[List[str]]:
+        return params[name].split(",") if params.get(name) else None
+
+    try:
+        limit = int(params.get("limit", "50"))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр limit должен быть целым числом")
+    try:
+        query = Query(
+            start=params.get("start"), end=params.get("end"), cards=values("card"), categories=values("category")
+        )
+        chunks = iter_transactions_json(data, query, params.get("cursor"), limit, params.get("order", "desc") != "asc")
+        # Тело ответа собирается из записей без промежуточного списка словарей
+        return "".join(chunks).encode("utf-8")
+    except ValueError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+
+# Путь -> (обработчик, зависит ли ответ от курсов и настроек пользователя)
+ROUTES: Dict[str, Tuple[Callable[[pd.DataFrame, Params], Any], bool]] = {
+    "/main": (_main_page, True),
+    "/reports/spending-by-category": (_spending_by_category, False),
+    "/reports/spending-by-weekday": (_spending_by_weekday, False),
+    "/services/cashback-categories": (_cashback_categories, False),
+    "/services/invest-bank": (_invest_bank, False),
+    "/services/period-summary": (_period_summary, False),
+    "/services/distribution": (_spending_distribution, False),
+    "/services/recurring": (_recurring_payments, False),
+    "/services/forecast": (_forecast, False),
+    "/services/cashback-simulation": (_cashback_simulation, False),
+    "/transactions": (_transactions, False),
+}
+
+# Пути, которые без параметра date строят ответ на текущий момент: их ETag включает текущий день
+DATED_ROUTES = {
+    "/reports/spending-by-category",
+    "/reports/spending-by-weekday",
+    "/services/period-summary",
+    "/services/distribution",
+    "/services/forecast",
+}
+
+_worker_repository: Optional[Repository] = None
+
+
+def _init_worker(source: str, store_dir: str, log_queue: Any = None, log_level: int = logging.INFO) -> None:
+    """Инициализация процесса пула: подключает журнал к родительскому процессу и открывает хранилище заранее."""
+    global _worker_repository
+    if log_queue is not None:
+        from src.logger import setup_worker_logging
+
+        setup_worker_logging(log_queue, log_level)
+    _worker_repository = Repository(source, store_dir)
+    _worker_repository.data()
+
+
+def _execute(path: str, params: Params, version: str, repository: Optional[Repository] = None) -> Tuple[int, bytes]:
+    """Выполняет обработчик пути в потоке или процессе пула и возвращает статус и тело ответа."""
+    handler, _ = ROUTES[path]
+    repository = repository or _worker_repository
+    if repository is None:
+        raise RuntimeError("Хранилище процесса пула не инициализировано")
+    status: int
+    try:
+        result = handler(repository.data(version), params)
+        status = HTTPStatus.BAD_REQUEST if isinstance(result, dict) and "error" in result else HTTPStatus.OK
+    except HTTPError as e:
+        status, result = e.status, {"error": str(e)}
+    except Exception as e:
+        logger.error("Ошибка обработки %s: %s: %s", path, type(e).__name__, e)
+        status, result = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+    return int(status), result if isinstance(result, bytes) else _json_bytes(result)
+
+
+class TransactionServer:
+    """HTTP/1.1 сервер на asyncio с JSON-эндпоинтами страниц, отчётов и сервисов.
+
+    Соединения переиспользуются (keep-alive). Ответ получает ETag по версии
+    данных и параметрам запроса: на If-None-Match с тем же ETag отвечаем 304,
+    а готовые ответы хранятся в небольшом LRU. Вычисления выполняются в пуле
+    процессов или потоков, не больше concurrency одновременно; при переполнении
+    очереди сервер отвечает 503.
+
+    При prewarm=True ответы главной страницы и отчётов дня заранее кладутся
+    в LRU после каждой загрузки данных и перед утренним пиком peak, занимая
+    не больше cpu_budget времени (см. src.scheduler.PrewarmScheduler).
+    """
+
+    def __init__(
+        self,
+        source: str = FILE_XLSX,
+        store_dir: str = STORE_DIR,
+        host: str = HOST,
+        port: int = PORT,
+        workers: Optional[int] = None,
+        concurrency: int = MAX_CONCURRENCY,
+        executor: str = "process",
+        max_connections: int = MAX_CONNECTIONS,
+        max_pending: int = MAX_PENDING,
+        prewarm: bool = False,
+        cpu_budget: float = CPU_BUDGET,
+        peak: str = PEAK_TIME,
+    ) -> None:
+        if executor not in EXECUTORS:
+            raise ValueError(f"Неизвестный тип пула: {executor}")
+        self.repository = Repository(source, store_dir)
+        self.host = host
+        self.port = port
+        self.workers = workers or min(concurrency, os.cpu_count() or 1)
+        self.concurrency = concurrency
+        self.executor_kind = executor
+        self.max_connections = max_connections
+        self.max_pending = max_pending
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self._connections = 0
+        self._responses: "OrderedDict[str, bytes]" = OrderedDict()
+        self._handlers: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+        self.scheduler = (
+            PrewarmScheduler(self._warm, self.repository.version, cpu_budget, peak) if prewarm else None
+        )
+
+    async def start(self) -> None:
+        """Готовит хранилище и пул и начинает принимать соединения."""
+        await asyncio.to_thread(self.repository.version)
+        if self.executor_kind == "process":
+            from src.logger import forward_worker_logs
+
+            # Процессы spawn не наследуют настройку журнала: их записи пишет родительский процесс
+            context = multiprocessing.get_context("spawn")
+            log_queue, self._log_listener = forward_worker_logs(context)
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    self.repository.source,
+                    self.repository.store_dir,
+                    log_queue,
+                    logging.getLogger().getEffectiveLevel(),
+                ),
+            )
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="server-worker")
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Сервер запущен на http://%s:%d (%s x %d)", self.host, self.port, self.executor_kind, self.workers)
+        if self.scheduler is not None:
+            self.scheduler.start()
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Закрывает соединения и останавливает прогрев и пул."""
+        if self.scheduler is not None:
+            await asyncio.to_thread(self.scheduler.stop)
+        if self._server is not None:
+            self._server.close()
+            # Ожидающие keep-alive соединения закрываем сами, иначе wait_closed их ждёт
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+
+    def _etag(self, path: str, params: Params, market: bool) -> Tuple[str, str]:
+        """Версия данных и ETag ответа; выполняется в потоке, так как может перестроить хранилище."""
+        from src.fx import default_history
+
+        version = self.repository.version()
+        parts = [path, json.dumps(sorted(params.items())), version, str(default_history.version)]
+        if market:
+            from src.settings import default_provider
+
+            user_id = params.get("user_id")
+            settings_path = default_provider.user_path(user_id) if user_id else None
+            settings_version = default_provider.version(settings_path) if settings_path else default_provider.version()
+            parts += [str(settings_version), str(int(time.time() // MARKET_TTL))]
+        elif path in DATED_ROUTES and not params.get("date"):
+            parts.append(datetime.now().strftime("%Y-%m-%d"))
+        return version, '"' + hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+    def _remember(self, etag: str, body: bytes) -> None:
+        self._responses[etag] = body
+        self._responses.move_to_end(etag)
+        while len(self._responses) > RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
+
+    def _warm(self, path: str, params: Params) -> None:
+        """Выполняет запрос в пуле и кладёт ответ в LRU; вызывается из потока прогрева."""
+        version, etag = self._etag(path, params, ROUTES[path][1])
+        executor, loop = self._executor, self._loop
+        if executor is None or loop is None:
+            raise RuntimeError("Сервер не запущен")
+        repository = self.repository if self.executor_kind == "thread" else None
+        status, body = executor.submit(_execute, path, params, version, repository).result()
+        if status != HTTPStatus.OK:
+            raise RuntimeError(f"Ответ {status}: {body.decode('utf-8', 'replace')}")
+        loop.call_soon_threadsafe(self._remember, etag, body)
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, bytes, Dict[str, str]]:
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Метод {method} не поддерживается")
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+
+        if url.path == "/health":
+            version = await asyncio.to_thread(self.repository.version)
+            health: Dict[str, Any] = {
+                "status": "ok",
+                "version": version,
+                "pending": self._pending,
+                "connections": self._connections,
+            }
+            scheduler = self.scheduler
+            if scheduler is not None:
+                health["prewarm_ms"] = {name: round(seconds * 1000, 3) for name, seconds in scheduler.timings.items()}
+                health["prewarm_errors"] = dict(scheduler.errors)
+            return HTTPStatus.OK, json.dumps(health).encode("utf-8"), {}
+
+        route = ROUTES.get(url.path)
+        if route is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Неизвестный путь {url.path}")
+
+        try:
+            version, etag = await asyncio.to_thread(self._etag, url.path, params, route[1])
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+            return HTTPStatus.NOT_MODIFIED, b"", {"ETag": etag}
+
+        cached = self._responses.get(etag)
+        if cached is not None:
+            self._responses.move_to_end(etag)
+            return HTTPStatus.OK, cached, {"ETag": etag}
+
+        if self._pending >= self.max_pending:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Сервер перегружен, повторите запрос позже")
+        self._pending += 1
+        try:
+            assert self._slots is not None
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                repository = self.repository if self.executor_kind == "thread" else None
+                status, body = await loop.run_in_executor(
+                    self._executor, _execute, url.path, params, version, repository
+                )
+        finally:
+            self._pending -= 1
+
+        if status != HTTPStatus.OK:
+            return status, body, {}
+        self._remember(etag, body)
+        return status, body, {"ETag": etag}
+
+    @staticmethod
+    def _response(status: int, body: bytes, keep_alive: bool, headers: Dict[str, str], head: bool = False) -> bytes:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        if status != HTTPStatus.NOT_MODIFIED:
+            lines += ["Content-Type: application/json; charset=utf-8", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            lines.append("Retry-After: 1")
+        if keep_alive:
+            lines += ["Connection: keep-alive", f"Keep-Alive: timeout={int(KEEPALIVE_TIMEOUT)}"]
+        else:
+            lines.append("Connection: close")
+        payload = b"" if head or status == HTTPStatus.NOT_MODIFIED else body
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._connections >= self.max_connections:
+            body = json.dumps({"error": "Слишком много соединений"}, ensure_ascii=False).encode("utf-8")
+            writer.write(self._response(HTTPStatus.SERVICE_UNAVAILABLE, body, False, {}))
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+            writer.close()
+            return
+
+        self._connections += 1
+        task = asyncio.current_task()
+        if task is not None:
+            self._handlers.add(task)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("content-length"):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                try:
+                    method, target, protocol = request_line.decode("latin-1").split()
+                except ValueError:
+                    writer.write(self._response(HTTPStatus.BAD_REQUEST, b"{}", False, {}))
+                    break
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if protocol == "HTTP/1.0" else connection != "close"
+
+                try:
+                    status, body, extra = await self._dispatch(method, target, headers)
+                except HTTPError as e:
+                    status, extra = e.status, {}
+                    body = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+                except Exception as e:
+                    # Например, хранилище недоступно при расчёте ETag: клиент получает 500, соединение живёт
+                    logger.error("Ошибка обработки %s: %s: %s", target, type(e).__name__, e)
+                    status, extra = HTTPStatus.INTERNAL_SERVER_ERROR, {}
+                    body = json.dumps({"error": f"{type(e).__name__}: {e}"}, ensure_ascii=False).encode("utf-8")
+                writer.write(self._response(status, body, keep_alive, extra, head=method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections -= 1
+            self._handlers.discard(task)  # type: ignore[arg-type]
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def serve(**kwargs: Any) -> None:
+    """Запускает сервер до прерывания (Ctrl+C); параметры - как у TransactionServer."""
+    server = TransactionServer(**kwargs)
+
+    async def run() -> None:
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run())
@@ -1,48 +1,498 @@
+from __future__ import annotations
+
+import json
 import logging
+import math
+import re
 from datetime import datetime
-from typing import Any, Dict, List
-import pandas as pd
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+from src.cashback import DEFAULT_PROGRAMS, CashbackProgram, CashbackSimulator
+from src.fx import DEFAULT_COLUMNS, convert_to_rub, to_rub
+from src.lazy import lazy_import
+from src.query import Query
+from src.rollups import FORECAST_KEYS, HALF_LIFE_DAYS, daily_spending_for, rollups_for
+from src.search import SearchIndex
+from src.stats import HISTOGRAM_EDGES, QUANTILES, describe, histogram_labels
+from src.storage import EXPORT_NAMES
+from src.utils import get_period_range, parse_dates
+from src.validation import near_duplicates
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
 
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Получатель перевода - физическое лицо: "Иван С."
+PERSON_PATTERN = re.compile(r"^[А-ЯЁ][а-яё]+ [А-ЯЁ]\.$")
+# Номер телефона в описании: "+7 921 111-22-33", "8 (995) 555-55-55"
+PHONE_PATTERN = re.compile(r"(?:\+7|\b8)[\s(-]*\d{3}[\s)-]*\d{2,3}[\s-]?\d{2}[\s-]?\d{2}\b")
+# Номера заказов, даты и знаки в описании не отличают один платёж подписки от другого
+DESCRIPTION_NOISE = re.compile(r"[\d\W_]+")
+
+# Периоды регулярных платежей: название -> (средняя длина в днях, допустимое отклонение интервала в днях,
+# шаг до следующего платежа)
+RECURRING_PERIODS = {
+    "неделя": (7.0, 1.0, {"weeks": 1}),
+    "месяц": (30.44, 3.5, {"months": 1}),
+    "квартал": (91.31, 7.0, {"months": 3}),
+    "год": (365.25, 10.0, {"years": 1}),
+}
 
 
 def analyze_profitable_categories(data: pd.DataFrame, year: int, month: int) -> Dict[str, float]:
     """Анализ выгодных категорий повышенного кешбэка за указанный месяц"""
     try:
-        data["date"] = pd.to_datetime(data["date"])
-        df_filtered = data[(data["date"].dt.year == year) & (data["date"].dt.month == month)]
+        data = convert_to_rub(data)
+        data["date"] = parse_dates(data["date"])
+        df_filtered = Query.month(year, month).apply(data)
 
-        category_sum = df_filtered.groupby("category")["amount"].sum()
+        category_sum = df_filtered.groupby("category", observed=True)["amount"].sum()
         cashback_by_category = (category_sum // 100).astype(int).to_dict()
 
-        logging.info(f"Выгодные категории за {year}-{month:02d} рассчитаны успешно")
+        logger.info("Выгодные категории за %d-%02d рассчитаны успешно", year, month)
         return cashback_by_category
 
     except Exception as e:
-        logging.error(f"Ошибка в analyze_profitable_categories: {e}")
+        logger.error("Ошибка в analyze_profitable_categories: %s", e)
+        return {"error": str(e)}
+
+
+def period_summary(data: pd.DataFrame, date_str: str, period: str = "M") -> Dict[str, Any]:
+    """Итоги за период W/M/Y/ALL до указанной даты: расходы, поступления и кэшбэк всего, по картам и категориям.
+
+    data - транзакции, отсортированные по дате (см. src.storage.load_transactions);
+    итоги считаются по накопленным суммам (см. src.rollups), которые строятся
+    один раз для каждого DataFrame.
+    """
+    try:
+        end = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+        start, end = get_period_range(end, period)
+        rollups = rollups_for(convert_to_rub(data))
+
+        def rounded(totals: Dict[str, float]) -> Dict[str, Any]:
+            return {
+                "expenses": round(-totals["expenses"], 2),
+                "income": round(totals["income"], 2),
+                "cashback": round(totals["cashback"], 2),
+                "operations": int(totals["count"]),
+            }
+
+        def by_key(key: str, name: str) -> List[Dict[str, Any]]:
+            totals = rollups.totals(key, start, end)
+            return [{name: str(value), **rounded(row)} for value, row in zip(totals.index, totals.to_dict("records"))]
+
+        result = {
+            "period": period,
+            "start": start.strftime("%Y-%m-%d %H:%M:%S") if start else None,
+            "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+            **rounded(rollups.summary(start, end)),
+            "cards": by_key("card_number", "card_number"),
+            "categories": by_key("category", "category"),
+        }
+        logger.info("Итоги за период %s до %s рассчитаны", period, date_str)
+        return result
+
+    except Exception as e:
+        logger.error("Ошибка в period_summary: %s", e)
+        return {"error": str(e)}
+
+
+def spending_distribution(
+    data: pd.DataFrame, date_str: str, period: str = "M", side: str = "expenses"
+) -> Dict[str, Any]:
+    """Распределение размеров операций за период W/M/Y/ALL до указанной даты: всего, по картам и категориям.
+
+    Для каждого набора - число операций, медиана, p90, p99 и гистограмма
+    (границы - src.stats.HISTOGRAM_EDGES). side - "expenses" (расходы по
+    модулю) или "income". Квантили приближённые, с точностью 1% (см. src.stats).
+    """
+    try:
+        end = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+        start, end = get_period_range(end, period)
+        rollups = rollups_for(convert_to_rub(data))
+
+        def by_key(key: str) -> List[Dict[str, Any]]:
+            sketches = rollups.distributions(key, start, end, side)
+            return [{key: str(value), **describe(sketch, QUANTILES)} for value, sketch in sketches.items()]
+
+        result = {
+            "period": period,
+            "start": start.strftime("%Y-%m-%d %H:%M:%S") if start else None,
+            "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+            "side": side,
+            "histogram_bins": list(histogram_labels(HISTOGRAM_EDGES)),
+            **describe(rollups.distribution(start, end, side), QUANTILES),
+            "cards": by_key("card_number"),
+            "categories": by_key("category"),
+        }
+        logger.info("Распределение операций за период %s до %s рассчитано", period, date_str)
+        return result
+
+    except Exception as e:
+        logger.error("Ошибка в spending_distribution: %s", e)
+        return {"error": str(e)}
+
+
+# Величины прогноза расходов до конца месяца
+FORECAST_MEASURES = ["spent", "daily_rate", "forecast", "run_rate_forecast"]
+
+
+def forecast_spending(
+    data: pd.DataFrame,
+    date_str: str,
+    budgets: Optional[Dict[str, float]] = None,
+    half_life: float = HALF_LIFE_DAYS,
+) -> Dict[str, Any]:
+    """Прогноз расходов до конца месяца по картам, категориям и их парам с проверкой бюджетов.
+
+    Для каждого ряда (карта, категория) берутся расходы с начала месяца по
+    день date_str включительно (spent) и дневной темп: экспоненциально
+    сглаженный с полураспадом half_life дней (daily_rate). Прогноз forecast -
+    spent плюс темп, умноженный на оставшиеся дни месяца, run_rate_forecast -
+    то же по среднему расходу с начала месяца. Все ряды считаются сразу по
+    дневным расходам (см. src.rollups.DailySpending), которые при дописывании
+    операций дополняются, а не строятся заново.
+
+    budgets - лимиты на месяц по категориям или картам ({"Супермаркеты": 20000,
+    "*7197": 50000}); превышенные и те, что будут превышены по прогнозу,
+    попадают в alerts.
+    """
+    try:
+        moment = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+        data = convert_to_rub(data)
+        if not data["date"].is_monotonic_increasing:
+            data = data.sort_values("date", kind="stable").reset_index(drop=True)
+        daily = daily_spending_for(data)
+
+        month = np.datetime64(moment.strftime("%Y-%m"), "M")
+        day = int(np.datetime64(moment.date(), "D").astype(np.int64))
+        first_day = int(month.astype("datetime64[D]").astype(np.int64))
+        days_left = int((month + 1).astype("datetime64[D]").astype(np.int64)) - 1 - day
+        days_elapsed = day - first_day + 1
+
+        series = pd.DataFrame(list(daily.series), columns=list(FORECAST_KEYS))
+        series["spent"] = daily.totals(first_day, day)
+        series["daily_rate"] = daily.ewma(day, half_life)
+        series["forecast"] = series["spent"] + series["daily_rate"] * days_left
+        series["run_rate_forecast"] = series["spent"] * (1 + days_left / days_elapsed)
+        # Ряды без расходов в месяце и с темпом меньше копейки в день в ответ не попадают
+        series = series[(series["spent"] > 0) | (series["daily_rate"] >= 0.005)]
+
+        def rounded(values: Dict[str, float]) -> Dict[str, float]:
+            return {name: round(float(values[name]), 2) for name in FORECAST_MEASURES}
+
+        def by_key(key: str) -> List[Dict[str, Any]]:
+            totals = series.groupby(key, observed=True, sort=True)[FORECAST_MEASURES].sum()
+            return [{key: str(value), **rounded(row)} for value, row in zip(totals.index, totals.to_dict("records"))]
+
+        cards, categories = by_key("card_number"), by_key("category")
+        limits: List[Dict[str, Any]] = []
+        known = {item["category"]: item for item in categories} | {item["card_number"]: item for item in cards}
+        for name, limit in (budgets or {}).items():
+            item = known.get(name, dict.fromkeys(FORECAST_MEASURES, 0.0))
+            if item["spent"] > limit:
+                status = "превышен"
+            elif item["forecast"] > limit:
+                status = "будет превышен"
+            else:
+                status = "в пределах"
+            limits.append({"name": name, "budget": limit, **rounded(item), "status": status})
+
+        ordered = series.sort_values("forecast", ascending=False, kind="stable")
+        result = {
+            "date": date_str,
+            "month": moment.strftime("%Y-%m"),
+            "days_elapsed": days_elapsed,
+            "days_left": days_left,
+            "half_life_days": half_life,
+            **rounded(series[FORECAST_MEASURES].sum().to_dict()),
+            "cards": cards,
+            "categories": categories,
+            "series": [
+                {
+                    "card_number": None if row["card_number"] is None else str(row["card_number"]),
+                    "category": None if row["category"] is None else str(row["category"]),
+                    **rounded(row),
+                }
+                for row in ordered.to_dict("records")
+            ],
+            "budgets": limits,
+            "alerts": [item for item in limits if item["status"] != "в пределах"],
+        }
+        logger.info("Прогноз расходов на %s рассчитан: %d рядов", result["month"], len(series))
+        return result
+
+    except Exception as e:
+        logger.error("Ошибка в forecast_spending: %s", e)
+        return {"error": str(e)}
+
+
+def simulate_cashback(
+    data: pd.DataFrame,
+    programs: Optional[Sequence[CashbackProgram]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Сравнивает программы кэшбэка на расходах каждой карты по месяцам и выбирает лучшую для карты.
+
+    programs - программы для сравнения (по умолчанию src.cashback.DEFAULT_PROGRAMS,
+    первая из них - текущие 1% на всё); start и end ограничивают период
+    операций. Все программы считаются одним проходом по массиву карты x
+    месяцы x категории (см. src.cashback.CashbackSimulator). Для лучшей
+    программы карты указаны кэшбэк и выбранные повышенные категории каждого месяца.
+    """
+    try:
+        programs = list(programs or DEFAULT_PROGRAMS)
+        data = Query(start=start, end=end).apply(convert_to_rub(data))
+        simulator = CashbackSimulator(data)
+        cards = simulator.best(programs)
+        totals = {
+            program.name: round(sum(card["cashback"][program.name] for card in cards), 2) for program in programs
+        }
+        logger.info("Программы кэшбэка сравнены: %d программ, %d карт", len(programs), len(cards))
+        return {"programs": [program.name for program in programs], "totals": totals, "cards": cards}
+
+    except Exception as e:
+        logger.error("Ошибка в simulate_cashback: %s", e)
         return {"error": str(e)}
 
 
+def _amounts_in_rub(frame: pd.DataFrame) -> List[float]:
+    """Суммы операций в рублях; без колонки валюты суммы считаются рублёвыми."""
+    if EXPORT_NAMES["currency"] not in frame.columns:
+        amounts = frame[EXPORT_NAMES["amount"]].to_numpy(dtype=float)
+    else:
+        amounts = to_rub(frame, columns={key: EXPORT_NAMES[key] for key in DEFAULT_COLUMNS})
+    rub: List[float] = amounts.tolist()
+    return rub
+
+
 def investment_bank(month: str, transactions: List[Dict[str, Any]], limit: int) -> float:
     """Рассчитывает сумму, которую можно накопить в 'Инвесткопилке'
-    за указанный месяц с заданным порогом округления."""
+    за указанный месяц с заданным порогом округления.
+
+    Валютные операции (ключ 'Валюта операции') пересчитываются в рубли по курсу на дату."""
     try:
         target_month = datetime.strptime(month, "%Y-%m")
 
         total_saved = 0.0
-        for t in transactions:
-            date = datetime.strptime(t["Дата операции"], "%Y-%m-%d")
-            if date.year == target_month.year and date.month == target_month.month:
-                amount = float(t["Сумма операции"])
-                rounded = ((amount // limit) + (1 if amount % limit != 0 else 0)) * limit
-                saved = round(rounded - amount, 2)
-                total_saved += saved
+        if transactions:
+            frame = pd.DataFrame(transactions)
+            frame[EXPORT_NAMES["date"]] = parse_dates(frame[EXPORT_NAMES["date"]])
+            in_month = Query.month(target_month.year, target_month.month).apply(frame, columns=EXPORT_NAMES)
+            for amount in _amounts_in_rub(in_month):
+                # Операции без известного курса пропускаем
+                if not math.isnan(amount):
+                    rounded = ((amount // limit) + (1 if amount % limit != 0 else 0)) * limit
+                    saved = round(rounded - amount, 2)
+                    total_saved += saved
 
         total_saved = round(total_saved, 2)
-        logging.info(f"Инвесткопилка за {month}: накоплено {total_saved} ₽ при шаге {limit}")
+        logger.info("Инвесткопилка за %s: накоплено %s ₽ при шаге %s", month, total_saved, limit)
         return total_saved
 
     except Exception as e:
-        logging.error(f"Ошибка в investment_bank: {e}")
+        logger.error("Ошибка в investment_bank: %s", e)
         return 0.0
+
+
+def _records_json(df: pd.DataFrame, columns: Sequence[str]) -> str:
+    """Преобразует операции в JSON-список с датами в формате выгрузки."""
+    available = [col for col in columns if col in df.columns]
+    records = df[available].astype(object).where(df[available].notna(), None).to_dict(orient="records")
+    for record in records:
+        if record.get("date") is not None:
+            record["date"] = record["date"].strftime("%d.%m.%Y %H:%M:%S")
+    return json.dumps(records, ensure_ascii=False)
+
+
+RESULT_COLUMNS = ["date", "card_number", "amount", "category", "description"]
+
+
+def search_transactions(
+    data: pd.DataFrame,
+    query: str,
+    index: Optional[SearchIndex] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cards: Optional[Sequence[str]] = None,
+    limit: int = 100,
+) -> str:
+    """Ищет операции по тексту в описании и категории; возвращает JSON-список.
+
+    Поиск без учёта регистра (в том числе кириллицы), 'маг*' - поиск по началу слова.
+    index - поисковый индекс data (например, TransactionStore.search_index());
+    без него индекс строится на лету.
+    """
+    try:
+        if index is None:
+            index = SearchIndex.build(data)
+        rows = index.search(query, start=start, end=end, cards=cards)
+        logger.info("Поиск %r: найдено %d операций", query, len(rows))
+        return _records_json(data.iloc[rows[:limit]], RESULT_COLUMNS)
+
+    except Exception as e:
+        logger.error("Ошибка в search_transactions: %s", e)
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+
+def _match_unique(values: pd.Series, pattern: re.Pattern) -> pd.Series:
+    """Проверяет pattern один раз для каждого уникального значения и возвращает маску по всем строкам."""
+    codes, uniques = pd.factorize(values)
+    matched = pd.Series(uniques, dtype=object).astype(str).str.contains(pattern, regex=True).to_numpy()
+    return pd.Series((codes >= 0) & matched.take(codes, mode="clip"), index=values.index)
+
+
+def find_person_transfers(data: pd.DataFrame) -> str:
+    """Возвращает JSON-список переводов физическим лицам (категория 'Переводы', описание 'Имя Ф.')."""
+    try:
+        transfers = data[data["category"] == "Переводы"]
+        result = transfers[_match_unique(transfers["description"], PERSON_PATTERN)]
+        logger.info("Найдено переводов физическим лицам: %d", len(result))
+        return _records_json(result, RESULT_COLUMNS)
+
+    except Exception as e:
+        logger.error("Ошибка в find_person_transfers: %s", e)
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+
+def find_near_duplicates(data: pd.DataFrame, minutes: float = 5) -> str:
+    """Возвращает JSON-список похожих операций: та же карта и сумма с разницей не больше minutes минут.
+
+    Точные повторы отклоняются при загрузке по отпечатку (см. src.validation);
+    похожие операции могут быть и настоящими, поэтому только показываются,
+    с номером группы в поле group.
+    """
+    try:
+        groups = near_duplicates(data, minutes)
+        in_group = groups >= 0
+        result = data[in_group].assign(group=groups[in_group])
+        result = result.sort_values(["group", "date"], kind="stable")
+        logger.info("Найдено похожих операций: %d в %d группах", len(result), result["group"].nunique())
+        return _records_json(result, ["group", *RESULT_COLUMNS, "fingerprint"])
+
+    except Exception as e:
+        logger.error("Ошибка в find_near_duplicates: %s", e)
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+
+def find_phone_payments(data: pd.DataFrame) -> str:
+    """Возвращает JSON-список операций, в описании которых есть номер телефона."""
+    try:
+        result = data[_match_unique(data["description"], PHONE_PATTERN)]
+        logger.info("Найдено операций с номером телефона: %d", len(result))
+        return _records_json(result, RESULT_COLUMNS)
+
+    except Exception as e:
+        logger.error("Ошибка в find_phone_payments: %s", e)
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+
+def _description_codes(descriptions: pd.Series) -> np.ndarray:
+    """Коды описаний без учёта регистра, цифр и знаков ("Яндекс Плюс №123" = "ЯНДЕКС ПЛЮС")."""
+    codes, uniques = pd.factorize(descriptions)
+    normalized = pd.Series(uniques, dtype=object).astype(str).str.lower()
+    normalized_codes = pd.factorize(normalized.str.replace(DESCRIPTION_NOISE, " ", regex=True).str.strip())[0]
+    # Код -1 (пустое описание) остаётся -1
+    description_codes: np.ndarray = np.append(normalized_codes, -1)[codes]
+    return description_codes
+
+
+def find_recurring_payments(data: pd.DataFrame, min_occurrences: int = 3, min_share: float = 0.75) -> Dict[str, Any]:
+    """Находит регулярные платежи (подписки) во всей истории операций.
+
+    Платежи группируются по описанию (без учёта регистра, цифр и знаков) и
+    сумме в валюте операции. Группа считается регулярной, если в ней не меньше
+    min_occurrences списаний, медианный интервал между ними соответствует
+    неделе, месяцу, кварталу или году (RECURRING_PERIODS) и не меньше доли
+    min_share интервалов отклоняются от периода в допустимых пределах
+    (пропущенный месяц не отменяет подписку). Группы и интервалы считаются
+    сортировкой всех расходов сразу, без перебора по получателям.
+    """
+    try:
+        data = convert_to_rub(data)
+        expenses = data[(data["amount"] < 0).to_numpy(dtype=bool, na_value=False) & data["date"].notna().to_numpy()]
+
+        # Сумма и валюта списания до пересчёта в рубли: у подписки в валюте рублёвая сумма меняется с курсом
+        amount_column = "original_amount" if "original_amount" in expenses.columns else "amount"
+        amounts = pd.factorize(expenses[amount_column].astype(float).round(2))[0].astype(np.int64)
+        if "original_currency" in expenses.columns:
+            currencies = pd.factorize(expenses["original_currency"])[0].astype(np.int64)
+            amounts = amounts * (currencies.max(initial=0) + 2) + currencies + 1
+        descriptions = _description_codes(expenses["description"]).astype(np.int64)
+        valid = descriptions >= 0
+        groups = pd.factorize(descriptions * (amounts.max(initial=0) + 1) + amounts)[0]
+        groups[~valid] = -1
+
+        dates = expenses["date"].to_numpy().astype("datetime64[s]").astype(np.int64)
+        order = np.lexsort((dates, groups))
+        order = order[groups[order] >= 0]
+        # Списания одной группы идут подряд по дате; оставляем группы с достаточным числом списаний
+        runs = np.cumsum(np.r_[True, groups[order][1:] != groups[order][:-1]]) - 1 if len(order) else order
+        order = order[np.bincount(runs)[runs] >= max(min_occurrences, 2)] if len(order) else order
+        dates = dates[order]
+        first = np.r_[True, groups[order][1:] != groups[order][:-1]] if len(order) else np.zeros(0, dtype=bool)
+        starts = np.flatnonzero(first)
+        counts = np.diff(np.r_[starts, len(order)])
+
+        # Интервалы между соседними списаниями группы в днях, отсортированные внутри группы
+        runs = np.cumsum(first) - 1
+        intervals = (np.diff(dates, prepend=0) / 86400.0)[~first]
+        interval_runs = runs[~first]
+        intervals = intervals[np.lexsort((intervals, interval_runs))]
+        interval_counts = counts - 1
+        interval_starts = np.cumsum(interval_counts) - interval_counts
+        medians = intervals[interval_starts + (interval_counts - 1) // 2] if len(starts) else intervals
+        # Период группы - тот, к которому близок медианный интервал; затем доля интервалов, близких к нему
+        nominal = np.array([days for days, _, _ in RECURRING_PERIODS.values()])
+        deviation = np.array([allowed for _, allowed, _ in RECURRING_PERIODS.values()])
+        matches = np.abs(medians[:, None] - nominal[None, :]) <= deviation[None, :]
+        periods = np.where(matches.any(axis=1), matches.argmax(axis=1), 0)
+        expected = np.repeat(nominal[periods], interval_counts)
+        close = np.abs(intervals - expected) <= np.repeat(deviation[periods], interval_counts)
+        regular_share = np.add.reduceat(close, interval_starts) / interval_counts if len(starts) else medians
+        detected = np.flatnonzero(matches.any(axis=1) & (regular_share >= min_share))
+
+        names = list(RECURRING_PERIODS)
+        last_date = data["date"].max()
+        recurring: List[Dict[str, Any]] = []
+        monthly_total = 0.0
+        for run in detected:
+            rows = expenses.iloc[order[starts[run] : starts[run] + counts[run]]]
+            last = rows.iloc[-1]
+            period = names[periods[run]]
+            days, allowed, step = RECURRING_PERIODS[period]
+            next_date = last["date"] + pd.DateOffset(**step)
+            # Подписка активна, если к последней операции выгрузки следующее списание ещё не пропущено
+            active = bool(next_date + pd.Timedelta(days=allowed) >= last_date)
+            amount = round(-float(last["amount"]), 2)
+            if active:
+                monthly_total += amount * RECURRING_PERIODS["месяц"][0] / days
+            category = last["category"] if "category" in rows.columns else None
+            recurring.append(
+                {
+                    "description": str(last["description"]),
+                    "category": None if pd.isna(category) else str(category),
+                    "amount": amount,
+                    "period": period,
+                    "interval_days": round(float(medians[run]), 1),
+                    "occurrences": int(counts[run]),
+                    "first_date": rows["date"].iloc[0].strftime("%Y-%m-%d"),
+                    "last_date": last["date"].strftime("%Y-%m-%d"),
+                    "next_date": next_date.strftime("%Y-%m-%d"),
+                    "active": active,
+                }
+            )
+
+        recurring.sort(key=lambda item: (not item["active"], -item["amount"]))
+        logger.info("Найдено регулярных платежей: %d", len(recurring))
+        return {"recurring": recurring, "monthly_total": round(monthly_total, 2)}
+
+    except Exception as e:
+        logger.error("Ошибка в find_recurring_payments: %s", e)
+        return {"error": str(e)}
@@ -0,0 +1,160 @@
+import copy
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import FILE_JSON, USER_SETTINGS_DIR
+from src.metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
+EMPTY_SETTINGS: Dict[str, Any] = {"user_currencies": [], "user_stocks": []}
+
+# Сколько профилей держать в памяти одновременно
+MAX_PROFILES = 256
+
+_USER_ID = re.compile(r"^[\w-]+$")
+
+# (mtime_ns, size) файла настроек или None, если файла нет
+StatKey = Optional[Tuple[int, int]]
+
+
+def _stat_key(path: str) -> StatKey:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Entry:
+    """Загруженные настройки одного файла."""
+
+    __slots__ = ("stat", "settings", "version")
+
+    def __init__(self, stat: StatKey, settings: Dict[str, Any], version: int) -> None:
+        self.stat = stat
+        self.settings = settings
+        self.version = version
+
+
+class SettingsProvider:
+    """Кэш пользовательских настроек с перечитыванием при изменении файла.
+
+    Файл разбирается заново только при изменении mtime или размера. Каждое
+    перечитывание увеличивает версию настроек, которую могут использовать
+    ключи кэшей ответов. При ошибке разбора сохраняются последние корректные
+    настройки. Загруженные профили хранятся в LRU размером max_profiles.
+    """
+
+    def __init__(self, max_profiles: int = MAX_PROFILES, settings_dir: str = USER_SETTINGS_DIR) -> None:
+        self.max_profiles = max_profiles
+        self.settings_dir = settings_dir
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._version = 0
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get(self, path: str = FILE_JSON) -> Dict[str, Any]:
+        """Возвращает копию настроек из файла path."""
+        return copy.deepcopy(self._entry(path).settings)
+
+    def version(self, path: str = FILE_JSON) -> int:
+        """Версия настроек файла path; меняется при каждом перечитывании."""
+        return self._entry(path).version
+
+    def user_path(self, user_id: str) -> str:
+        """Путь к файлу настроек пользователя; без отдельного файла - общий файл настроек."""
+        if not _USER_ID.match(user_id):
+            raise ValueError(f"Некорректный идентификатор пользователя: {user_id!r}")
+        path = os.path.join(self.settings_dir, f"{user_id}.json")
+        return path if os.path.exists(path) else FILE_JSON
+
+    def for_user(self, user_id: str) -> Dict[str, Any]:
+        """Настройки пользователя user_id."""
+        return self.get(self.user_path(user_id))
+
+    def _entry(self, path: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(path)
+            # Пока работает наблюдатель, изменения отслеживает он, и stat на каждый запрос не нужен
+            if entry is not None and (self.watching or entry.stat == _stat_key(path)):
+                self._entries.move_to_end(path)
+                current_metrics().cache("settings", True)
+                return entry
+
+            current_metrics().cache("settings", False)
+            entry = self._load(path, entry)
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_profiles:
+                self._entries.popitem(last=False)
+            return entry
+
+    def _load(self, path: str, previous: Optional[_Entry]) -> _Entry:
+        stat = _stat_key(path)
+        if stat is None:
+            logger.warning("Файл настроек %s не найден. Возвращаем пустые настройки.", path)
+            settings = EMPTY_SETTINGS
+        else:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    settings = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error("Ошибка при загрузке настроек из %s: %s", path, e)
+                settings = previous.settings if previous is not None else EMPTY_SETTINGS
+
+        if previous is not None and previous.settings == settings:
+            return _Entry(stat, previous.settings, previous.version)
+        self._version += 1
+        return _Entry(stat, settings, self._version)
+
+    def refresh(self) -> int:
+        """Перечитывает изменившиеся файлы из кэша и возвращает их количество."""
+        changed = 0
+        with self._lock:
+            for path, entry in list(self._entries.items()):
+                if entry.stat != _stat_key(path):
+                    self._entries[path] = self._load(path, entry)
+                    changed += 1
+        return changed
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None and self._watcher.is_alive()
+
+    def start_watching(self, interval: float = 1.0) -> None:
+        """Запускает фоновый поток, проверяющий файлы настроек раз в interval секунд."""
+        if self.watching:
+            return
+        self._stop.clear()
+
+        def watch() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Ошибка наблюдения за настройками: %s", e)
+
+        self._watcher = threading.Thread(target=watch, name="settings-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        """Останавливает фоновый поток наблюдения."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def clear(self) -> None:
+        """Сбрасывает все загруженные профили."""
+        with self._lock:
+            self._entries.clear()
+
+
+default_provider = SettingsProvider()
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, cast
+
+from config import FILE_XLSX
+from src.lazy import lazy_import
+from src.metrics import current_metrics
+from src.query import Query
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Колонки нормализованных транзакций, которые хранятся в таблице (см. src.storage.COLUMN_NAMES)
+COLUMNS = {
+    "date": "INTEGER NOT NULL",
+    "card_number": "TEXT",
+    "status": "TEXT",
+    # NULL - валютная операция без известного курса (см. src.fx.to_rub); агрегаты её пропускают, как pandas
+    "amount": "REAL",
+    "currency": "TEXT",
+    "payment_amount": "REAL",
+    "payment_currency": "TEXT",
+    "cashback": "REAL",
+    "category": "TEXT",
+    "mcc": "REAL",
+    "description": "TEXT",
+    "fingerprint": "INTEGER",
+}
+
+INDEXES = {
+    "idx_transactions_date": "date",
+    "idx_transactions_card_date": "card_number, date",
+    "idx_transactions_category_date": "category, date",
+}
+
+# Сколько строк вставлять за один executemany
+BATCH_SIZE = 50_000
+
+# С SQLite 3.43 TOTAL и AVG сами суммируют с компенсацией (Kahan-Babuska-Neumaier),
+# и агрегаты на Python нужны только для более старых версий библиотеки
+NATIVE_COMPENSATED_SUM = sqlite3.sqlite_version_info >= (3, 43, 0)
+SUM_FUNCTION = "TOTAL" if NATIVE_COMPENSATED_SUM else "kahan_sum"
+MEAN_FUNCTION = "AVG" if NATIVE_COMPENSATED_SUM else "kahan_mean"
+
+
+class _KahanSum:
+    """Агрегат SQLite с компенсированным суммированием в том же порядке, что и groupby().sum() в pandas.
+
+    Обычный SUM в SQLite складывает числа без компенсации, и последние
+    разряды суммы могут отличаться от результата pandas.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0.0
+        self.compensation = 0.0
+        self.count = 0
+
+    def step(self, value: Optional[float]) -> None:
+        if value is None:
+            return
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = t - self.total - y
+        if self.compensation != self.compensation:
+            self.compensation = 0.0
+        self.total = t
+        self.count += 1
+
+    def finalize(self) -> float:
+        return self.total
+
+
+class _KahanMean(_KahanSum):
+    """Среднее с компенсированным суммированием, как groupby().mean() в pandas."""
+
+    def finalize(self) -> Optional[float]:  # type: ignore[override]
+        return self.total / self.count if self.count else None
+
+
+class SQLiteStore:
+    """Хранилище нормализованных транзакций в SQLite с индексами по дате, карте и категории.
+
+    Подходит для данных больше оперативной памяти и для нескольких процессов:
+    выгрузка CSV загружается по частям, выборки по периоду, карте и категории
+    выполняются по индексам, а агрегаты считаются в SQL. Результаты методов
+    совпадают с функциями src.utils и src.reports на тех же данных. Даты
+    хранятся как целые наносекунды, суммы - в рублях (как после
+    src.storage.load_transactions); сумма операции без известного курса - NULL.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """Соединение только для чтения с зарегистрированными агрегатами."""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            if not NATIVE_COMPENSATED_SUM:
+                # В typeshed агрегат принимает и возвращает только int, хотя SQLite передаёт любые значения
+                conn.create_aggregate("kahan_sum", 1, cast(Callable[[], Any], _KahanSum))
+                conn.create_aggregate("kahan_mean", 1, cast(Callable[[], Any], _KahanMean))
+            yield conn
+        finally:
+            conn.close()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def quarantine_path(self) -> str:
+        """Файл строк, отклонённых при загрузке (см. src.validation), рядом с базой."""
+        return f"{os.path.splitext(self.path)[0]}.quarantine.csv"
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        with self.connect() as conn:
+            return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.meta.get("version") if self.exists() else None
+
+    def is_fresh(self, source: str) -> bool:
+        """Проверяет, что база построена из текущей версии файла выгрузки."""
+        if not self.exists() or not os.path.exists(source):
+            return False
+        from src.storage import _source_stat
+
+        return self.meta.get("source") == _source_stat(source)
+
+    def ingest(self, source: str = FILE_XLSX) -> int:
+        """Разбирает выгрузку, пересчитывает суммы в рубли и записывает в базу; возвращает число строк.
+
+        CSV разбирается и записывается частями (см. src.storage.read_source_chunks),
+        поэтому в памяти одновременно находится только одна часть выгрузки.
+        """
+        from src.fx import convert_to_rub
+        from src.storage import _source_stat, read_source_chunks, split_transactions
+        from src.validation import save_quarantine
+
+        metrics = current_metrics()
+        rows, date_dtype = 0, "datetime64[ns]"
+        rejected: List[pd.DataFrame] = []
+        # Отпечатки уже записанных операций: повторы отклоняются и между частями, как при полной загрузке
+        seen = np.empty(0, dtype=np.uint64)
+        chunks = read_source_chunks(source)
+        with self._build() as conn:
+            while True:
+                with metrics.stage("read_source"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                with metrics.stage("normalize"):
+                    valid, invalid = split_transactions(chunk, known=seen)
+                    seen = np.concatenate([seen, valid["fingerprint"].to_numpy()])
+                    valid = convert_to_rub(valid)
+                with metrics.stage("write_sqlite"):
+                    self._insert(conn, valid)
+                rows += len(valid)
+                if len(valid):
+                    date_dtype = str(valid["date"].dtype)
+                rejected.append(invalid)
+            with metrics.stage("write_sqlite"):
+                self._finish(conn, rows, _source_stat(source), sum(map(len, rejected)), date_dtype)
+        if rejected:
+            parts = [part for part in rejected if len(part)] or rejected[:1]
+            save_quarantine(pd.concat(parts, ignore_index=True), self.quarantine_path)
+        logger.info("База %s построена из %s: %d строк", self.path, source, rows)
+        return rows
+
+    def write(self, df: pd.DataFrame, source_info: Optional[Dict[str, Any]] = None, rejected: int = 0) -> None:
+        """Атомарно записывает транзакции (отсортированные по дате) в новую базу и строит индексы.
+
+        rejected - число строк выгрузки, отклонённых при проверке (сохраняется в метаданных).
+        """
+        with self._build() as conn:
+            self._insert(conn, df)
+            self._finish(conn, len(df), source_info, rejected, str(df["date"].dtype))
+
+    @contextlib.contextmanager
+    def _build(self) -> Iterator[sqlite3.Connection]:
+        """Новая база во временном файле рядом с базой; после блока with она атомарно заменяет базу.
+
+        Строки сначала пишутся во временную таблицу staging (см. _insert), а
+        _finish переносит их в transactions в порядке даты.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".sqlite-", dir=directory)
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+                conn.execute(f"CREATE TABLE transactions (id INTEGER PRIMARY KEY, {columns})")
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute(f"CREATE TEMP TABLE staging (seq INTEGER PRIMARY KEY, {columns})")
+                yield conn
+            finally:
+                conn.close()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+    def _insert(self, conn: sqlite3.Connection, df: pd.DataFrame) -> None:
+        """Дописывает часть транзакций в таблицу staging пакетами по BATCH_SIZE строк."""
+        placeholders = ", ".join("?" * len(COLUMNS))
+        insert = f"INSERT INTO staging ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        for start in range(0, len(df), BATCH_SIZE):
+            batch = df.iloc[start : start + BATCH_SIZE]
+            values: List[List[Any]] = []
+            for name in COLUMNS:
+                if name not in batch.columns:
+                    values.append([None] * len(batch))
+                elif name == "date":
+                    values.append(batch["date"].to_numpy(dtype="datetime64[ns]").astype(np.int64).tolist())
+                elif name == "fingerprint":
+                    # SQLite хранит целые со знаком: отпечаток uint64 записывается как int64 с теми же битами
+                    values.append(batch["fingerprint"].to_numpy(dtype=np.uint64).view(np.int64).tolist())
+                else:
+                    column = batch[name].astype(object)
+                    values.append(column.where(column.notna(), None).tolist())
+            conn.executemany(insert, zip(*values))
+
+    def _finish(
+        self,
+        conn: sqlite3.Connection,
+        rows: int,
+        source_info: Optional[Dict[str, Any]],
+        rejected: int,
+        date_dtype: str,
+    ) -> None:
+        """Переносит строки staging в transactions, строит индексы и записывает метаданные.
+
+        Части отсортированы по отдельности, поэтому строки упорядочиваются по
+        дате, а равные даты - по порядку записи: как при устойчивой сортировке
+        всей выгрузки. id - номер строки в этом порядке, начиная с 0.
+        """
+        columns = ", ".join(COLUMNS)
+        conn.execute(
+            f"INSERT INTO transactions (id, {columns}) "
+            f"SELECT ROW_NUMBER() OVER (ORDER BY date, seq) - 1, {columns} FROM staging ORDER BY date, seq"
+        )
+        conn.execute("DROP TABLE staging")
+        for index, columns_list in INDEXES.items():
+            conn.execute(f"CREATE INDEX {index} ON transactions ({columns_list})")
+        meta = {
+            "version": uuid.uuid4().hex,
+            "source": source_info,
+            "rows": rows,
+            "rejected": rejected,
+            "date_dtype": date_dtype,
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+        conn.commit()
+        conn.execute("ANALYZE")
+
+    def _dates(self, values: List[int]) -> pd.Series:
+        """Даты из наносекунд в том же типе, что и в исходных данных."""
+        return pd.Series(pd.to_datetime(np.array(values, dtype=np.int64), unit="ns")).astype(self.meta["date_dtype"])
+
+    def count(self, query: Optional[Query] = None) -> int:
+        """Число операций, подходящих под запрос (без запроса - все)."""
+        where, params = (query or Query()).sql()
+        with self.connect() as conn:
+            return int(conn.execute(f"SELECT COUNT(*) FROM transactions WHERE {where}", params).fetchone()[0])
+
+    def card_stats(self, query: Query) -> List[Dict[str, Any]]:
+        """То же, что src.utils.get_card_stats для операций, подходящих под запрос."""
+        from src.utils import card_stats_from_totals
+
+        # Подзапрос задаёт порядок суммирования, как в pandas: по карте, затем по исходному порядку строк
+        where, params = query.sql()
+        sql = f"""
+            SELECT card_number, {SUM_FUNCTION}(amount) FROM (
+                SELECT card_number, amount FROM transactions
+                WHERE {where} AND card_number IS NOT NULL
+                ORDER BY card_number, id
+            ) GROUP BY card_number ORDER BY card_number
+        """
+        with self.connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if not rows:
+            return []
+        cards, totals = zip(*rows)
+        grouped = pd.DataFrame({"card_number": list(cards), "amount": np.array(totals, dtype=np.float64)})
+        return card_stats_from_totals(grouped)
+
+    def top_transactions(self, query: Query, top_n: int = 5) -> List[Dict[str, Any]]:
+        """То же, что src.utils.get_top_transactions для операций, подходящих под запрос."""
+        from src.utils import TOP_COLUMNS, top_records
+
+        where, params = query.sql()
+        sql = f"""
+            SELECT {", ".join(TOP_COLUMNS)} FROM transactions WHERE {where} AND amount IS NOT NULL
+            ORDER BY amount DESC, id LIMIT ?
+        """
+        with self.connect() as conn:
+            rows = conn.execute(sql, [*params, top_n]).fetchall()
+        if not rows:
+            return []
+        top_df = pd.DataFrame(rows, columns=TOP_COLUMNS)
+        top_df["date"] = self._dates(top_df["date"].tolist())
+        return top_records(top_df)
+
+    def spending_by_category(self, category: str, date: Optional[str] = None) -> pd.DataFrame:
+        """То же, что src.reports.spending_by_category (без сохранения файла)."""
+        from src.storage import EXPORT_NAMES
+
+        end_date = pd.to_datetime(date) if date else pd.Timestamp.now()
+        where, params = Query.last_months(end_date, 3, categories=[category]).sql()
+        sql = f"""
+            SELECT id, date, amount, category, description FROM transactions
+            WHERE {where} AND amount > 0
+            ORDER BY id
+        """
+        with self.connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        names = ["date", "amount", "category", "description"]
+        index = pd.Index([row[0] for row in rows], dtype=np.int64)
+        report = pd.DataFrame([row[1:] for row in rows], columns=names, index=index)
+        report["date"] = self._dates(report["date"].tolist()).to_numpy()
+        report["amount"] = report["amount"].astype(np.float64)
+        return report.rename(columns=EXPORT_NAMES)
+
+    def spending_by_weekday(self, date: Optional[str] = None) -> pd.DataFrame:
+        """То же, что src.reports.spending_by_weekday (без сохранения файла)."""
+        end_date = pd.to_datetime(date) if date else pd.Timestamp.now()
+        where, params = Query.last_months(end_date, 3).sql()
+        sql = f"""
+            SELECT weekday, {MEAN_FUNCTION}(amount) FROM (
+                SELECT CAST(strftime('%w', date / 1000000000, 'unixepoch') AS INTEGER) AS weekday, amount
+                FROM transactions WHERE {where} ORDER BY id
+            ) GROUP BY weekday
+        """
+        with self.connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        # Названия дней берём из pandas, чтобы они совпадали с отчётом: 2024-01-07 - воскресенье (%w = 0)
+        reference = pd.Series(pd.date_range("2024-01-07", periods=7, freq="D"))
+        names = reference.dt.day_name(locale="ru_RU").tolist()
+        report = pd.DataFrame(
+            {"weekday": [names[day] for day, _ in rows], "Средние траты": [mean for _, mean in rows]}
+        )
+        return report.sort_values("weekday").reset_index(drop=True)
+
+
+def open_sqlite_store(path: str, source: str = FILE_XLSX) -> SQLiteStore:
+    """Открывает базу, перестраивая её, если файл выгрузки изменился."""
+    store = SQLiteStore(path)
+    fresh = store.is_fresh(source)
+    current_metrics().cache("sqlite", fresh)
+    if not fresh:
+        store.ingest(source)
+    return store
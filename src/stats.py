@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Tuple
+
+from src.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# Относительная точность квантилей: найденное значение отличается от точного не больше чем на 1%
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Суммы меньше копейки попадают в корзину копейки
+MIN_VALUE = 0.01
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Границы гистограммы размеров операций в рублях
+HISTOGRAM_EDGES = (0.0, 100.0, 500.0, 1000.0, 5000.0, 10000.0, 50000.0, math.inf)
+
+
+def bucket_index(values: np.ndarray) -> np.ndarray:
+    """Номер логарифмической корзины: корзина i содержит значения (GAMMA**(i-1), GAMMA**i]."""
+    index: np.ndarray = np.ceil(np.log(np.maximum(values, MIN_VALUE)) / _LOG_GAMMA).astype(np.int32)
+    return index
+
+
+def bucket_value(index: np.ndarray) -> np.ndarray:
+    """Представитель корзины, отличающийся от любого её значения не больше чем на RELATIVE_ACCURACY."""
+    value: np.ndarray = 2 * np.power(GAMMA, index) / (GAMMA + 1)
+    return value
+
+
+class Sketch:
+    """Распределение положительных величин в логарифмических корзинах (как DDSketch).
+
+    Хранит только число значений в каждой корзине, поэтому занимает
+    одинаково мало места для любого числа операций, а распределения
+    разных дней или категорий объединяются сложением счётчиков (merge, +).
+    Квантиль возвращается с относительной ошибкой не больше RELATIVE_ACCURACY.
+    """
+
+    def __init__(self, counts: Optional[np.ndarray] = None, offset: int = 0) -> None:
+        # counts[i] - число значений в корзине offset + i
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.offset = offset
+
+    @classmethod
+    def from_values(cls, values: Sequence[float]) -> "Sketch":
+        """Распределение значений (неположительные значения пропускаются)."""
+        array = np.asarray(values, dtype=float)
+        index = bucket_index(array[array > 0])
+        if not len(index):
+            return cls()
+        offset = int(index.min())
+        return cls(np.bincount(index - offset), offset)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def merge(self, other: "Sketch") -> "Sketch":
+        """Распределение значений обоих наборов."""
+        if not len(other.counts):
+            return self
+        if not len(self.counts):
+            return other
+        offset = min(self.offset, other.offset)
+        size = max(self.offset + len(self.counts), other.offset + len(other.counts)) - offset
+        counts = np.zeros(size, dtype=np.int64)
+        counts[self.offset - offset : self.offset - offset + len(self.counts)] += self.counts
+        counts[other.offset - offset : other.offset - offset + len(other.counts)] += other.counts
+        return Sketch(counts, offset)
+
+    __add__ = merge
+
+    def quantiles(self, qs: Sequence[float] = QUANTILES) -> Dict[float, Optional[float]]:
+        """Квантили распределения; для пустого распределения - None.
+
+        Квантиль q - значение с номером floor(q * (n - 1)) в отсортированном
+        наборе (как numpy.quantile(..., method="lower")) с точностью корзины.
+        """
+        total = self.count
+        if not total:
+            return {q: None for q in qs}
+        cumulative = np.cumsum(self.counts)
+        ranks = np.floor(np.asarray(qs, dtype=float) * (total - 1))
+        buckets = np.searchsorted(cumulative, ranks, side="right") + self.offset
+        return {q: float(value) for q, value in zip(qs, bucket_value(buckets))}
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[q]
+
+    def histogram(self, edges: Sequence[float] = HISTOGRAM_EDGES) -> np.ndarray:
+        """Число значений между соседними границами edges (по представителям корзин)."""
+        values = bucket_value(np.arange(self.offset, self.offset + len(self.counts)))
+        return np.histogram(values, bins=np.asarray(edges, dtype=float), weights=self.counts)[0].astype(np.int64)
+
+
+class DailySketches:
+    """Распределения по дням и значениям ключа для операций, отсортированных по дате.
+
+    Счётчики корзин хранятся разреженно - по одной записи на тройку
+    (день, значение ключа, корзина) - и упорядочены по дню, поэтому
+    распределение за полные дни периода получается сложением записей этих
+    дней, а неполные первый и последний день добираются из самих строк.
+    Сортировать суммы для каждого запроса не нужно.
+    """
+
+    def __init__(
+        self, dates: pd.Series, values: np.ndarray, codes: Optional[np.ndarray] = None, uniques: Sequence[Any] = ()
+    ) -> None:
+        # codes, uniques - значения ключа строк, как их возвращает pandas.factorize
+        self.rows = np.flatnonzero(values > 0)
+        self.uniques = uniques if codes is not None else ()
+        codes = codes[self.rows] if codes is not None else np.zeros(len(self.rows), dtype=np.int64)
+        # Строки без значения ключа (например, без карты) собираются в последней строке матрицы
+        self.codes = np.where(codes < 0, len(self.uniques), codes).astype(np.int64)
+        self.keys = len(self.uniques) + 1
+
+        buckets = bucket_index(values[self.rows])
+        self.offset = int(buckets.min()) if len(buckets) else 0
+        self.buckets = (buckets - self.offset).astype(np.int64)
+        self.size = int(self.buckets.max()) + 1 if len(buckets) else 1
+        self.flat = self.codes * self.size + self.buckets
+
+        days = dates.to_numpy()[self.rows].astype("datetime64[D]").astype(np.int64)
+        # Первая выбранная строка каждого дня и граница после последней
+        first = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.zeros(0, dtype=np.int64)
+        self.day_bounds = np.r_[first, len(days)]
+
+        cells = self.keys * self.size
+        day_numbers = np.repeat(np.arange(len(first)), np.diff(self.day_bounds))
+        entries, self.entry_counts = np.unique(day_numbers * cells + self.flat, return_counts=True)
+        self.entry_cells = entries % cells
+        self.entry_bounds = np.searchsorted(entries // cells, np.arange(len(first) + 1))
+
+    def _cells(self, lower: int, upper: int) -> np.ndarray:
+        """Счётчики корзин строк [lower, upper) исходных данных: матрица значений ключа x корзин."""
+        cells = self.keys * self.size
+        first, last = np.searchsorted(self.rows, [lower, upper])
+        start_day = np.searchsorted(self.day_bounds, first, side="left")
+        end_day = np.searchsorted(self.day_bounds, last, side="right") - 1
+
+        counts = np.zeros(cells, dtype=np.int64)
+        edges = [(first, last)]
+        if end_day > start_day:
+            entries = slice(self.entry_bounds[start_day], self.entry_bounds[end_day])
+            weights = self.entry_counts[entries]
+            counts += np.bincount(self.entry_cells[entries], weights=weights, minlength=cells).astype(np.int64)
+            edges = [(first, self.day_bounds[start_day]), (self.day_bounds[end_day], last)]
+        for begin, end in edges:
+            counts += np.bincount(self.flat[begin:end], minlength=cells)
+        return counts.reshape(self.keys, self.size)
+
+    def sketches(self, lower: int, upper: int) -> Dict[Any, Sketch]:
+        """Распределения строк [lower, upper) исходных данных по значениям ключа (пустые пропускаются)."""
+        counts = self._cells(lower, upper)
+        return {value: Sketch(row, self.offset) for value, row in zip(self.uniques, counts) if row.any()}
+
+    def total(self, lower: int, upper: int) -> Sketch:
+        """Распределение всех строк [lower, upper) исходных данных."""
+        return Sketch(self._cells(lower, upper).sum(axis=0), self.offset)
+
+
+def describe(
+    sketch: Sketch, qs: Sequence[float] = QUANTILES, edges: Sequence[float] = HISTOGRAM_EDGES
+) -> Dict[str, Any]:
+    """Число операций, квантили (p50, p90, ...) и гистограмма распределения, округлённые до копеек."""
+    quantiles = sketch.quantiles(qs)
+    result: Dict[str, Any] = {"operations": sketch.count}
+    for q, value in quantiles.items():
+        result[f"p{q * 100:g}"] = round(value, 2) if value is not None else None
+    result["histogram"] = sketch.histogram(edges).tolist()
+    return result
+
+
+def histogram_labels(edges: Sequence[float] = HISTOGRAM_EDGES) -> Tuple[str, ...]:
+    """Подписи интервалов гистограммы: "0-100", ..., "50000+"."""
+    return tuple(
+        f"{left:g}+" if math.isinf(right) else f"{left:g}-{right:g}" for left, right in zip(edges[:-1], edges[1:])
+    )
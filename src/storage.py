@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from config import FILE_XLSX, STORE_DIR
+from src.lazy import lazy_import
+from src.fx import convert_to_rub
+from src.metrics import current_metrics
+from src.query import Query
+from src.search import SearchIndex
+from src.utils import parse_dates
+from src.validation import check_rules, fingerprints, quarantine_frame, report_violations, save_quarantine
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Переименование колонок выгрузки банка в единообразные имена
+COLUMN_NAMES = {
+    "Дата операции": "date",
+    "дата": "date",
+    "Номер карты": "card_number",
+    "карта": "card_number",
+    "Статус": "status",
+    "Сумма операции": "amount",
+    "сумма": "amount",
+    "Валюта операции": "currency",
+    "Сумма платежа": "payment_amount",
+    "Валюта платежа": "payment_currency",
+    "Кэшбэк": "cashback",
+    "Категория": "category",
+    "категория": "category",
+    "MCC": "mcc",
+    "Описание": "description",
+    "описание": "description",
+}
+
+# Обратное переименование для функций, работающих с колонками выгрузки (src.reports)
+EXPORT_NAMES = {
+    "date": "Дата операции",
+    "card_number": "Номер карты",
+    "status": "Статус",
+    "amount": "Сумма операции",
+    "currency": "Валюта операции",
+    "payment_amount": "Сумма платежа",
+    "payment_currency": "Валюта платежа",
+    "cashback": "Кэшбэк",
+    "category": "Категория",
+    "mcc": "MCC",
+    "description": "Описание",
+}
+
+REQUIRED_COLUMNS = ["date", "card_number", "amount"]
+
+# Каталог хранилища: versions/<версия>/ с колонками и файл CURRENT с именем опубликованной версии
+CURRENT_FILE = "CURRENT"
+# Файл блокировки, под которой писатели по очереди публикуют версии и удаляют старые
+LOCK_FILE = ".lock"
+VERSIONS_DIR = "versions"
+# Сколько последних версий оставлять: процессы, прочитавшие CURRENT до публикации, дочитывают прежнюю
+KEEP_VERSIONS = 2
+META_FILE = "meta.json"
+SEARCH_FILE = "search.npz"
+QUARANTINE_FILE = "quarantine.csv"
+
+# Сколько строк CSV разбирать за раз при чтении с запросом
+CHUNK_SIZE = 200_000
+
+
+def read_source(path: str) -> pd.DataFrame:
+    """Читает выгрузку операций из Excel или CSV файла."""
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def read_source_chunks(path: str, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Читает выгрузку частями по chunk_size строк (по умолчанию CHUNK_SIZE).
+
+    CSV читается по частям, Excel по частям читать нельзя - он возвращается одной частью.
+    """
+    if not path.lower().endswith(".csv"):
+        yield read_source(path)
+        return
+    yield from pd.read_csv(path, chunksize=chunk_size or CHUNK_SIZE)
+
+
+def split_transactions(
+    df: pd.DataFrame, known: Optional[np.ndarray] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Приводит выгрузку к единым именам колонок и типам и делит её на корректные и отклонённые строки.
+
+    Корректные строки возвращаются отсортированными по дате, с постоянным
+    идентификатором операции в колонке fingerprint; отклонённые - в колонках
+    выгрузки с исходными значениями и причиной (см. src.validation).
+    Операции с отпечатками из known (уже сохранённые) отклоняются как повторы.
+    """
+    df = df.rename(columns={col: COLUMN_NAMES.get(col, col) for col in df.columns})
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Отсутствуют необходимые колонки: {', '.join(missing_columns)}")
+
+    parsed = df.copy(deep=False)
+    parsed["date"] = parse_dates(df["date"])
+    parsed["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    if "payment_amount" in df.columns:
+        parsed["payment_amount"] = pd.to_numeric(df["payment_amount"], errors="coerce")
+
+    parsed["fingerprint"] = fingerprints(parsed)
+
+    violations = check_rules(df, parsed, known)
+    report_violations(violations)
+    rejected = violations.any(axis=1).to_numpy()
+    if not rejected.any():
+        return parsed.sort_values("date", kind="stable").reset_index(drop=True), df.iloc[:0]
+    valid = parsed[~rejected].sort_values("date", kind="stable").reset_index(drop=True)
+    return valid, quarantine_frame(df, violations, EXPORT_NAMES).reset_index(drop=True)
+
+
+def normalize_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """Приводит выгрузку к единым именам колонок и типам, отсортированную по дате, без отклонённых строк."""
+    return split_transactions(df)[0]
+
+
+def _read_query(source: str, query: Query) -> pd.DataFrame:
+    """Читает CSV частями по CHUNK_SIZE строк и оставляет только строки, подходящие под запрос."""
+    parts = []
+    # Отпечатки уже прочитанных операций: повторы отклоняются и между частями, как при полной загрузке
+    seen = np.empty(0, dtype=np.uint64)
+    for chunk in pd.read_csv(source, chunksize=CHUNK_SIZE):
+        chunk = split_transactions(chunk, known=seen)[0]
+        seen = np.concatenate([seen, chunk["fingerprint"].to_numpy()])
+        parts.append(query.apply(convert_to_rub(chunk)))
+    if not parts:
+        return pd.DataFrame()
+    # Части отсортированы по отдельности; устойчивая сортировка сохраняет порядок выгрузки для равных дат
+    return pd.concat(parts, ignore_index=True).sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def load_transactions(
+    source: str = FILE_XLSX, store_dir: Optional[str] = None, query: Optional[Query] = None
+) -> pd.DataFrame:
+    """Возвращает нормализованные транзакции с суммами в рублях (см. src.fx.convert_to_rub).
+
+    Если указан каталог хранилища, данные берутся из memory-mapped колонок,
+    а выгрузка разбирается заново только при её изменении; пересчёт валют
+    кэшируется по версии хранилища. query (см. src.query) отбирает строки:
+    из хранилища - срезом по дате, из CSV - при чтении по частям, так что
+    в памяти остаются только подходящие операции.
+    """
+    metrics = current_metrics()
+    if store_dir:
+        store = TransactionStore(store_dir)
+        fresh = store.is_fresh(source)
+        metrics.cache("store", fresh)
+        if not fresh:
+            store.ingest(source)
+        with metrics.stage("open_store"):
+            df = store.frame()
+        with metrics.stage("fx"):
+            df = convert_to_rub(df, version=store.version)
+        if query is None:
+            return df
+        with metrics.stage("query"):
+            return query.apply(df)
+
+    if query is not None and source.lower().endswith(".csv"):
+        with metrics.stage("read_query"):
+            return _read_query(source, query)
+
+    with metrics.stage("read_source"):
+        df = read_source(source)
+    if df.empty:
+        return df
+    with metrics.stage("normalize"):
+        df = normalize_transactions(df)
+    with metrics.stage("fx"):
+        df = convert_to_rub(df)
+    if query is None:
+        return df
+    with metrics.stage("query"):
+        return query.apply(df)
+
+
+def _source_stat(source: str) -> Dict[str, Any]:
+    """Возвращает признаки версии файла выгрузки."""
+    stat = os.stat(source)
+    return {"path": os.path.abspath(source), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+@contextlib.contextmanager
+def _publish_lock(store_dir: str) -> Iterator[None]:
+    """Монопольная блокировка каталога хранилища между процессами и потоками."""
+    with open(os.path.join(store_dir, LOCK_FILE), "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TransactionStore:
+    """Колоночное хранилище нормализованных транзакций.
+
+    Числовые колонки и даты сохраняются как .npy массивы, строковые - как коды
+    словаря. Массивы открываются через mmap, поэтому все процессы, читающие
+    одно хранилище, используют общую копию данных в page cache.
+
+    Каждая запись создаёт новый каталог версии и публикует его атомарной
+    заменой файла CURRENT, поэтому читатели в других процессах всегда видят
+    целую версию, а одновременные загрузки не мешают друг другу: остаётся
+    опубликованная последней.
+    """
+
+    def __init__(self, store_dir: str = STORE_DIR) -> None:
+        self.store_dir = store_dir
+        self._data_dir: Optional[str] = None
+        self._meta: Optional[Dict[str, Any]] = None
+        self._frame: Optional[pd.DataFrame] = None
+        self._search: Optional[SearchIndex] = None
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.store_dir, CURRENT_FILE)
+
+    @property
+    def data_dir(self) -> str:
+        """Каталог опубликованной версии; определяется один раз, чтобы метаданные и колонки были из одной версии."""
+        if self._data_dir is None:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                self._data_dir = os.path.join(self.store_dir, VERSIONS_DIR, f.read().strip())
+        return self._data_dir
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.data_dir, META_FILE)
+
+    def exists(self) -> bool:
+        """Проверяет, что хранилище уже создано."""
+        return os.path.exists(self.current_path)
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """Метаданные хранилища: колонки, словари, источник и версия."""
+        if self._meta is None:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    @property
+    def version(self) -> str:
+        """Версия данных, меняется при каждой записи хранилища."""
+        return str(self.meta["version"])
+
+    def is_fresh(self, source: str) -> bool:
+        """Проверяет, что хранилище построено из текущей версии выгрузки."""
+        if not self.exists():
+            return False
+        try:
+            return bool(self.meta.get("source") == _source_stat(source))
+        except OSError:
+            return False
+
+    def ingest(self, source: str) -> pd.DataFrame:
+        """Разбирает выгрузку и перестраивает хранилище."""
+        metrics = current_metrics()
+        with metrics.stage("read_source"):
+            df = read_source(source)
+        rejected = df.iloc[:0]
+        if not df.empty:
+            with metrics.stage("normalize"):
+                df, rejected = split_transactions(df)
+        with metrics.stage("write_store"):
+            self.write(df, source_info=_source_stat(source), rejected=len(rejected))
+            save_quarantine(rejected, self.quarantine_path)
+        logger.info("Хранилище %s построено из %s: %d строк", self.store_dir, source, len(df))
+        return self.frame()
+
+    def append(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Дописывает новые операции из выгрузки в хранилище.
+
+        Если поисковый индекс уже построен, а новые операции не раньше
+        сохранённых, индекс дополняется; иначе он построится при первом поиске.
+        """
+        current = self.frame()
+        # Пересекающиеся выгрузки: операции, которые уже есть в хранилище, отклоняются как повторы
+        known = current["fingerprint"].to_numpy() if "fingerprint" in current.columns else None
+        new_rows, rejected = split_transactions(df, known)
+        # write() подменяет каталог целиком, поэтому прежние отклонённые строки переносятся явно
+        rejected = pd.concat([self.quarantine(), rejected], ignore_index=True)
+        index = self._search or self._saved_search_index()
+        in_order = current.empty or new_rows.empty or new_rows["date"].iloc[0] >= current["date"].iloc[-1]
+
+        combined = pd.concat([current, new_rows], ignore_index=True)
+        if not in_order:
+            combined = combined.sort_values("date", kind="stable").reset_index(drop=True)
+        self.write(combined, source_info=self.meta.get("source"), rejected=len(rejected))
+        save_quarantine(rejected, self.quarantine_path)
+
+        if in_order and index is not None:
+            index.append(new_rows)
+            index.version = self.version
+            index.save(os.path.join(self.data_dir, SEARCH_FILE))
+            self._search = index
+        return self.frame()
+
+    @property
+    def quarantine_path(self) -> str:
+        return os.path.join(self.data_dir, QUARANTINE_FILE)
+
+    def quarantine(self) -> pd.DataFrame:
+        """Строки выгрузки, отклонённые при загрузке, с причинами (см. src.validation)."""
+        if not os.path.exists(self.quarantine_path):
+            return pd.DataFrame()
+        return pd.read_csv(self.quarantine_path)
+
+    def _saved_search_index(self) -> Optional[SearchIndex]:
+        """Сохранённый поисковый индекс текущей версии или None, если его ещё не строили."""
+        path = os.path.join(self.data_dir, SEARCH_FILE)
+        if not os.path.exists(path):
+            return None
+        index = SearchIndex.load(path)
+        return index if index.version == self.version else None
+
+    def search_index(self) -> SearchIndex:
+        """Поисковый индекс по описаниям и категориям.
+
+        Строится при первом поиске и сохраняется рядом с колонками версии.
+        """
+        if self._search is None:
+            index = self._saved_search_index()
+            if index is None:
+                index = SearchIndex.build(self.frame())
+                index.version = self.version
+                index.save(os.path.join(self.data_dir, SEARCH_FILE))
+            self._search = index
+        return self._search
+
+    def write(self, df: pd.DataFrame, source_info: Optional[Dict[str, Any]] = None, rejected: int = 0) -> None:
+        """Записывает колонки DataFrame в новый каталог версии и атомарно публикует его.
+
+        rejected - число строк выгрузки, отклонённых при проверке (сохраняется в метаданных).
+        """
+        version = uuid.uuid4().hex
+        versions_dir = os.path.join(self.store_dir, VERSIONS_DIR)
+        os.makedirs(versions_dir, exist_ok=True)
+        tmp_dir = os.path.join(versions_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+
+        columns: List[Dict[str, Any]] = []
+        for i, name in enumerate(df.columns):
+            file_name = f"col_{i:03d}.npy"
+            column = df[name]
+            if column.dtype.kind in "biufmM":
+                np.save(os.path.join(tmp_dir, file_name), column.to_numpy())
+                columns.append({"name": name, "file": file_name, "kind": "array"})
+            else:
+                encoded = pd.Categorical(column)
+                np.save(os.path.join(tmp_dir, file_name), encoded.codes)
+                columns.append(
+                    {
+                        "name": name,
+                        "file": file_name,
+                        "kind": "dictionary",
+                        "categories": encoded.categories.tolist(),
+                    }
+                )
+
+        meta = {
+            "version": version,
+            "rows": len(df),
+            "columns": columns,
+            "source": source_info,
+            "rejected": rejected,
+        }
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+
+        # Под блокировкой другой писатель не удалит версию между переименованием и публикацией
+        with _publish_lock(self.store_dir):
+            os.rename(tmp_dir, os.path.join(versions_dir, version))
+            # os.replace атомарен: читатель видит либо прежнюю версию, либо новую целиком
+            pointer = os.path.join(self.store_dir, f".{CURRENT_FILE}.tmp-{version}")
+            with open(pointer, "w", encoding="utf-8") as f:
+                f.write(version)
+            os.replace(pointer, self.current_path)
+            self._prune(versions_dir)
+
+        self._data_dir = None
+        self._meta = None
+        self._frame = None
+        self._search = None
+
+    def _prune(self, versions_dir: str) -> None:
+        """Удаляет опубликованные версии, кроме KEEP_VERSIONS последних и текущей.
+
+        Вызывается под _publish_lock. Процессы, уже открывшие файлы удалённой версии через mmap, продолжают их читать.
+        """
+        with open(self.current_path, "r", encoding="utf-8") as f:
+            current = f.read().strip()
+        entries = [entry for entry in os.scandir(versions_dir) if entry.is_dir() and not entry.name.startswith(".")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[KEEP_VERSIONS:]:
+            if entry.name != current:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def frame(self) -> pd.DataFrame:
+        """Возвращает DataFrame поверх memory-mapped колонок без копирования."""
+        if self._frame is None:
+            data = {}
+            for column in self.meta["columns"]:
+                values = np.load(os.path.join(self.data_dir, column["file"]), mmap_mode="r")
+                if column["kind"] == "dictionary":
+                    categorical = pd.Categorical.from_codes(values, categories=column["categories"], validate=False)
+                    data[column["name"]] = pd.Series(categorical, copy=False)
+                else:
+                    # Обычный ndarray поверх memmap: подкласс np.memmap pandas сохраняет не для всех типов
+                    data[column["name"]] = pd.Series(values.view(np.ndarray), copy=False)
+            self._frame = pd.DataFrame(data, copy=False)
+        return self._frame
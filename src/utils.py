@@ -1,15 +1,35 @@
-import json
+from __future__ import annotations
+
+import functools
 import logging
+import math
 import os
-from datetime import datetime
-from typing import Dict, Any, List
-import pandas as pd
-import requests
-from dotenv import load_dotenv
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Any, Iterable, List, Optional, Tuple
+
+from config import FILE_JSON
+from src.circuit import get_breaker
+from src.fx import convert_to_rub
+from src.lazy import lazy_import
+from src.metrics import current_metrics
+from src.settings import default_provider
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    import requests
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+    requests = lazy_import("requests")
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-API_KEY = os.getenv("API_KEY")
+
+def get_api_key() -> Optional[str]:
+    """Возвращает ключ apilayer из окружения (читается при каждом вызове, см. config.init_app)."""
+    return os.getenv("API_KEY")
 
 
 def get_greeting(dt: datetime) -> str:
@@ -31,87 +51,346 @@ def get_month_range(date: datetime) -> tuple:
     return start_date, date
 
 
-def load_user_settings(path: str = "data/user_settings.json") -> Dict[str, Any]:
-    """Загружает пользовательские настройки валют и акций."""
-    try:
-        if not os.path.exists(path):
-            logging.warning(f"Файл настроек {path} не найден. Возвращаем пустые настройки.")
-            return {"user_currencies": [], "user_stocks": []}
-
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
-        logging.error(f"Ошибка при разборе JSON из {path}: {e}")
-        return {"user_currencies": [], "user_stocks": []}
-    except Exception as e:
-        logging.error(f"Ошибка при загрузке настроек из {path}: {e}")
-        return {"user_currencies": [], "user_stocks": []}
-
-
-def get_currency_rates(currencies: List[str]) -> Dict[str, Any]:
-    """Получает текущие курсы валют."""
+# Периоды страницы 'Главная': неделя, месяц, год и всё время
+PERIODS = ("W", "M", "Y", "ALL")
+
+
+def get_period_range(date: datetime, period: str = "M") -> Tuple[Optional[datetime], datetime]:
+    """Возвращает диапазон дат (начало периода, указанная дата).
+
+    W - с понедельника текущей недели, M - с 1-го числа месяца, Y - с 1 января,
+    ALL - без начала (None).
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Неизвестный период {period!r}, допустимые: {', '.join(PERIODS)}")
+    if period == "ALL":
+        return None, date
+    if period == "M":
+        return get_month_range(date)
+    midnight = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "W":
+        return midnight - timedelta(days=date.weekday()), date
+    return midnight.replace(month=1, day=1), date
+
+
+# Форматы дат выгрузки в порядке проверки: формат банка, затем ISO
+DATE_FORMATS = (
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+)
+
+# Ширина полей формата в символах
+_FIELD_WIDTHS = {"d": 2, "m": 2, "Y": 4, "H": 2, "M": 2, "S": 2}
+
+# Сколько значений колонки смотреть при определении формата
+FORMAT_SAMPLE = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def _datetime_dtype() -> np.dtype:
+    """Тип дат, который возвращает pd.to_datetime установленной версии pandas (ns в pandas 2, us в pandas 3)."""
+    dtype: np.dtype = pd.to_datetime(pd.Series(["01.01.2000 00:00:00"]), dayfirst=True).to_numpy().dtype
+    return dtype
+
+
+def _layout(fmt: str) -> Tuple[int, Dict[str, int], Dict[int, str]]:
+    """Длина строки формата фиксированной ширины, позиции полей и разделителей."""
+    fields: Dict[str, int] = {}
+    literals: Dict[int, str] = {}
+    position = 0
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == "%":
+            fields[fmt[i + 1]] = position
+            position += _FIELD_WIDTHS[fmt[i + 1]]
+            i += 2
+        else:
+            literals[position] = fmt[i]
+            position += 1
+            i += 1
+    return position, fields, literals
+
+
+def _parse_fixed(values: np.ndarray, fmt: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Векторно разбирает строки формата fmt без strptime.
+
+    Строки переводятся в матрицу кодов символов, поля собираются из цифр
+    арифметикой по столбцам. Возвращает даты (в типе _datetime_dtype) и маску строк,
+    которые точно соответствуют формату и задают существующую дату.
+    """
+    width, fields, literals = _layout(fmt)
+    chars = values.astype(f"U{width + 1}").view(np.uint32).reshape(len(values), width + 1)
+    ok = chars[:, width] == 0
+    for position, literal in literals.items():
+        ok &= chars[:, position] == ord(literal)
+
+    parts: Dict[str, np.ndarray] = {}
+    for code in "YmdHMS":
+        number = np.zeros(len(values), dtype=np.int64)
+        if code in fields:
+            for k in range(_FIELD_WIDTHS[code]):
+                digit = chars[:, fields[code] + k].astype(np.int64) - ord("0")
+                ok &= (digit >= 0) & (digit <= 9)
+                number = number * 10 + digit
+        parts[code] = number
+
+    ok &= (parts["m"] >= 1) & (parts["m"] <= 12) & (parts["d"] >= 1) & (parts["d"] <= 31)
+    ok &= (parts["H"] < 24) & (parts["M"] < 60) & (parts["S"] < 60)
+    months = np.where(ok, (parts["Y"] - 1970) * 12 + parts["m"] - 1, 0)
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + np.where(ok, parts["d"] - 1, 0)
+    # 31.04 переходит на следующий месяц - такая дата не существует
+    ok &= days.astype("datetime64[M]").astype(np.int64) == months
+
+    seconds = parts["H"] * 3600 + parts["M"] * 60 + parts["S"]
+    result = (days.astype("datetime64[s]") + seconds.astype("timedelta64[s]")).astype(_datetime_dtype())
+    result[~ok] = np.datetime64("NaT")
+    return result, ok
+
+
+def detect_date_format(values: Iterable[str]) -> Optional[str]:
+    """Формат из DATE_FORMATS, под который подходит больше всего значений; None, если ни один."""
+    sample = np.asarray(list(values), dtype=object)
+    if not len(sample):
+        return None
+    matched = {fmt: int(_parse_fixed(sample, fmt)[1].sum()) for fmt in DATE_FORMATS}
+    best = max(DATE_FORMATS, key=lambda fmt: matched[fmt])
+    return best if matched[best] else None
+
+
+def parse_dates(values: pd.Series, dayfirst: bool = True) -> pd.Series:
+    """Разбирает колонку дат выгрузки.
+
+    Формат определяется один раз по первым FORMAT_SAMPLE значениям, строки
+    этого формата разбираются векторно, а при большом числе повторов каждое
+    уникальное значение разбирается один раз. Остальные строки разбираются
+    pd.to_datetime по отдельности. Неразобранные даты получают NaT; их число
+    и примеры пишутся в журнал и в метрику dates_unparsed.
+    """
+    if values.dtype.kind == "M":
+        return values
+
+    raw = values.to_numpy(dtype=object)
+    head = raw[: FORMAT_SAMPLE * 2]
+    sample = head[pd.notna(head)][:FORMAT_SAMPLE]
+    if not all(isinstance(value, str) for value in sample):
+        result = pd.to_datetime(values, errors="coerce", dayfirst=dayfirst)
+        failed = np.flatnonzero((result.isna() & values.notna()).to_numpy())
+    else:
+        codes: Optional[np.ndarray] = None
+        if len(set(sample.tolist())) <= len(sample) // 2:
+            codes, uniques = pd.factorize(raw)
+            raw = np.asarray(uniques, dtype=object)
+
+        fmt = detect_date_format(sample)
+        if fmt is None:
+            parsed: np.ndarray = np.full(len(raw), np.datetime64("NaT"), dtype=_datetime_dtype())
+            ok = np.zeros(len(raw), dtype=bool)
+        else:
+            parsed, ok = _parse_fixed(raw, fmt)
+        # Пропуски и строки другого вида; пропусков обычно мало, поэтому notna считается только по ним
+        rest = np.flatnonzero(~ok)
+        rest = rest[pd.notna(raw[rest])]
+        if len(rest):
+            other = pd.to_datetime(pd.Series(raw[rest]), errors="coerce", dayfirst=dayfirst, format="mixed")
+            parsed[rest] = other.to_numpy(dtype=_datetime_dtype())
+            rest = rest[np.isnat(parsed[rest])]
+        failed = rest
+        if codes is not None:
+            parsed = np.where(codes >= 0, parsed.take(codes, mode="clip"), np.datetime64("NaT"))
+            failed = np.flatnonzero(np.isin(codes, rest)) if len(rest) else rest
+        result = pd.Series(parsed, index=values.index, name=values.name)
+
+    if len(failed):
+        current_metrics().incr("dates_unparsed", len(failed))
+        examples = values.iloc[failed[:3]]
+        logger.warning(
+            "Не удалось разобрать %d дат, например: %s",
+            len(failed),
+            ", ".join(f"строка {label}: {value!r}" for label, value in examples.items()),
+        )
+    return result
+
+
+def load_user_settings(path: str = FILE_JSON, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Загружает пользовательские настройки валют и акций.
+
+    Настройки кэшируются и перечитываются только при изменении файла (см. src.settings);
+    при указании user_id используется файл настроек этого пользователя.
+    """
+    if user_id is not None:
+        return default_provider.for_user(user_id)
+    return default_provider.get(path)
+
+
+def _demo_rates(currencies: List[str]) -> Dict[str, Any]:
+    """Тестовые курсы валют, используемые, когда API недоступен."""
+    current_metrics().incr("fallback_rates", len(currencies))
+    return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+
+
+def _demo_price(index: int) -> float:
+    """Тестовая цена акции, используемая, когда API недоступен."""
+    current_metrics().incr("fallback_prices")
+    return round(100 + index * 50, 2)
+
+
+# Последние полученные от API значения; отдаются вместо тестовых, пока API недоступен
+_last_rates: Dict[str, float] = {}
+_last_prices: Dict[str, float] = {}
+# Когда (time.monotonic) получено каждое из последних значений
+_rates_fetched: Dict[str, float] = {}
+_prices_fetched: Dict[str, float] = {}
+
+
+def _recent(values: Dict[str, float], fetched: Dict[str, float], keys: List[str], max_age: float) -> Optional[Dict]:
+    """Последние значения keys, если все они получены от API не раньше max_age секунд назад."""
+    if max_age <= 0:
+        return None
+    now = time.monotonic()
+    hit = all(now - fetched.get(key, -math.inf) <= max_age for key in keys)
+    current_metrics().cache("market", hit)
+    return {key: values[key] for key in keys} if hit else None
+
+
+def _fallback_rates(currencies: List[str]) -> Dict[str, Any]:
+    """Последние известные курсы, а для валют без них - тестовые."""
+    if all(curr in _last_rates for curr in currencies):
+        current_metrics().incr("cached_rates", len(currencies))
+        return {curr: _last_rates[curr] for curr in currencies}
+    demo = _demo_rates(currencies)
+    return {curr: _last_rates.get(curr, demo[curr]) for curr in currencies}
+
+
+def _fallback_price(symbol: str, index: int) -> float:
+    """Последняя известная цена акции или тестовая."""
+    if symbol in _last_prices:
+        current_metrics().incr("cached_prices")
+        return _last_prices[symbol]
+    return _demo_price(index)
+
+
+def clear_market_cache() -> None:
+    """Сбрасывает последние полученные курсы и цены."""
+    _last_rates.clear()
+    _last_prices.clear()
+    _rates_fetched.clear()
+    _prices_fetched.clear()
+
+
+def get_currency_rates(currencies: List[str], max_age: float = 0) -> Dict[str, Any]:
+    """Получает текущие курсы валют.
+
+    Пока предохранитель endpoint'а открыт (API несколько раз подряд не ответил),
+    запрос не отправляется и сразу возвращаются последние известные курсы.
+    При max_age > 0 курсы, полученные не раньше max_age секунд назад, не запрашиваются снова.
+    """
     try:
         if not currencies:
             return {}
+        recent = _recent(_last_rates, _rates_fetched, currencies, max_age)
+        if recent is not None:
+            return recent
 
-        if not API_KEY:
-            logging.error("API_KEY не установлен")
+        api_key = get_api_key()
+        if not api_key:
+            logger.error("API_KEY не установлен")
             # Возвращаем тестовые данные для демонстрации
-            return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+            return _demo_rates(currencies)
+
+        breaker = get_breaker("exchangerates")
+        if not breaker.allow():
+            return _fallback_rates(currencies)
 
         # Используем правильный API для курсов валют
         base_url = "https://api.apilayer.com/exchangerates_data/latest"
-        headers = {"apikey": API_KEY}
+        headers = {"apikey": api_key}
 
         params = {"base": "USD", "symbols": ",".join(currencies)}
-        response = requests.get(base_url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        try:
+            response = requests.get(base_url, params=params, headers=headers, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
 
         if "rates" not in data:
-            logging.error(f"Неожиданный формат ответа API: {data}")
-            return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+            # В журнал попадают только ключи ответа, а не весь payload
+            keys = sorted(data)[:10] if isinstance(data, dict) else type(data).__name__
+            logger.error("Неожиданный формат ответа API, ключи: %s", keys)
+            return _fallback_rates(currencies)
 
         rates = {curr: data["rates"].get(curr, None) for curr in currencies}
 
         # Если не получили данные, возвращаем тестовые
         if not any(rates.values()):
-            return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+            return _fallback_rates(currencies)
 
+        received = {curr: rate for curr, rate in rates.items() if rate is not None}
+        _last_rates.update(received)
+        _rates_fetched.update(dict.fromkeys(received, time.monotonic()))
         return rates
 
     except requests.exceptions.Timeout:
-        logging.error("Таймаут при получении курсов валют")
-        return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+        logger.error("Таймаут при получении курсов валют")
+        return _fallback_rates(currencies)
     except requests.exceptions.RequestException as e:
-        logging.error(f"Ошибка запроса при получении курсов валют: {e}")
-        return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+        logger.error("Ошибка запроса при получении курсов валют: %s", e)
+        return _fallback_rates(currencies)
     except Exception as e:
-        logging.error(f"Неожиданная ошибка при получении курсов валют: {e}")
-        return {curr: round(70 + i * 5, 2) for i, curr in enumerate(currencies)}
+        logger.error("Неожиданная ошибка при получении курсов валют: %s", e)
+        return _fallback_rates(currencies)
 
 
-def get_stock_prices(stocks: List[str]) -> Dict[str, Any]:
-    """Получает текущие цены акций."""
+def get_stock_prices(stocks: List[str], max_age: float = 0) -> Dict[str, Any]:
+    """Получает текущие цены акций.
+
+    Пока предохранитель endpoint'а открыт, для оставшихся акций сразу
+    возвращаются последние известные (или тестовые) цены. max_age - как
+    у get_currency_rates.
+    """
     prices = {}
 
     if not stocks:
         return prices
+    recent = _recent(_last_prices, _prices_fetched, stocks, max_age)
+    if recent is not None:
+        return recent
 
     try:
-        if not API_KEY:
-            logging.error("API_KEY не установлен")
+        api_key = get_api_key()
+        if not api_key:
+            logger.error("API_KEY не установлен")
             # Возвращаем тестовые данные для демонстрации
-            return {stock: round(100 + i * 50, 2) for i, stock in enumerate(stocks)}
+            return {stock: _demo_price(i) for i, stock in enumerate(stocks)}
 
         # Используем правильный API для акций
         base_url = "https://api.apilayer.com/alpha_vantage/quote"
-        headers = {"apikey": API_KEY}
+        headers = {"apikey": api_key}
+        breaker = get_breaker("alpha_vantage")
 
         for symbol in stocks:
+            if not breaker.allow():
+                prices[symbol] = _fallback_price(symbol, len(prices))
+                continue
             try:
                 params = {"symbol": symbol}
-                response = requests.get(base_url, params=params, headers=headers, timeout=10)
+                try:
+                    response = requests.get(base_url, params=params, headers=headers, timeout=10)
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                # Ошибки сервера и превышение лимита - признак недоступности API
+                if response.status_code >= 500 or response.status_code == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
 
                 if response.status_code == 200:
                     data = response.json()
@@ -119,21 +398,23 @@ def get_stock_prices(stocks: List[str]) -> Dict[str, Any]:
                     if "Global Quote" in data and "05. price" in data["Global Quote"]:
                         price = float(data["Global Quote"]["05. price"])
                         prices[symbol] = price
+                        _last_prices[symbol] = price
+                        _prices_fetched[symbol] = time.monotonic()
                     else:
                         # Если не нашли цену, используем тестовую
-                        prices[symbol] = round(100 + len(prices) * 50, 2)
+                        prices[symbol] = _fallback_price(symbol, len(prices))
                 else:
-                    prices[symbol] = round(100 + len(prices) * 50, 2)
+                    prices[symbol] = _fallback_price(symbol, len(prices))
 
             except Exception as e:
-                logging.error(f"Ошибка при получении данных акции {symbol}: {e}")
-                prices[symbol] = round(100 + len(prices) * 50, 2)
+                logger.error("Ошибка при получении данных акции %s: %s", symbol, e)
+                prices[symbol] = _fallback_price(symbol, len(prices))
 
         return prices
 
     except Exception as e:
-        logging.error(f"Общая ошибка при получении цен акций: {e}")
-        return {stock: round(100 + i * 50, 2) for i, stock in enumerate(stocks)}
+        logger.error("Общая ошибка при получении цен акций: %s", e)
+        return {stock: _demo_price(i) for i, stock in enumerate(stocks)}
 
 
 def get_card_stats(df: pd.DataFrame) -> List[Dict[str, Any]]:
@@ -141,9 +422,14 @@ def get_card_stats(df: pd.DataFrame) -> List[Dict[str, Any]]:
     if df.empty:
         return []
 
-    cards_info = []
-    grouped = df.groupby("card_number")["amount"].sum().reset_index()
+    df = convert_to_rub(df)
+    grouped = df.groupby("card_number", observed=True)["amount"].sum().reset_index()
+    return card_stats_from_totals(grouped)
 
+
+def card_stats_from_totals(grouped: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Статистика по картам из сумм по картам (колонки card_number и amount)."""
+    cards_info = []
     for _, row in grouped.iterrows():
         card_tail = str(row["card_number"])[-4:]
         total = round(row["amount"], 2)
@@ -153,16 +439,30 @@ def get_card_stats(df: pd.DataFrame) -> List[Dict[str, Any]]:
     return cards_info
 
 
+# Колонки топа транзакций в порядке вывода
+TOP_COLUMNS = ["date", "amount", "category", "description", "card_number"]
+
+
 def get_top_transactions(df: pd.DataFrame, top_n: int = 5) -> List[Dict[str, Any]]:
-    """Возвращает топ-N транзакций по сумме платежа с датами в строковом формате."""
+    """Возвращает топ-N транзакций по сумме платежа с датами в строковом формате.
+
+    Операции без суммы (валютные без известного курса) в топ не попадают.
+    """
     if df.empty:
         return []
 
     # Создаем копию только с нужными колонками для чистого вывода
-    columns_to_keep = ["date", "amount", "category", "description", "card_number"]
-    available_columns = [col for col in columns_to_keep if col in df.columns]
+    available_columns = [col for col in TOP_COLUMNS if col in df.columns]
 
+    # nlargest добирает до top_n строками с NaN, поэтому пустые суммы отбрасываются заранее
+    if df["amount"].isna().any():
+        df = df[df["amount"].notna()]
     top_df = df.nlargest(top_n, "amount")[available_columns]
+    return top_records(top_df)
+
+
+def top_records(top_df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Преобразует отобранные транзакции в записи с датами в строковом формате."""
     transactions = top_df.to_dict(orient="records")
 
     # Преобразуем Timestamp в строки для JSON сериализации
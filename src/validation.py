@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
+
+from src.lazy import lazy_import
+from src.metrics import current_metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Номер карты в выгрузке банка: "*1234"; операции без карты (наличные) допустимы
+CARD_PATTERN = re.compile(r"\*\d{4}")
+
+# Статусы выгрузки; операции FAILED не проведены банком и в итоги не входят
+KNOWN_STATUSES = ("OK", "FAILED")
+
+# Правило -> причина отклонения в файле карантина
+REASONS = {
+    "date": "некорректная дата",
+    "amount": "некорректная сумма",
+    "status": "неизвестный статус",
+    "failed": "операция не проведена",
+    "card": "некорректный номер карты",
+    "duplicate": "повтор операции",
+}
+
+REASON_COLUMN = "Причина"
+
+# Поля, по которым операция опознаётся в любой выгрузке: отпечаток служит её постоянным идентификатором
+FINGERPRINT_COLUMNS = ("date", "card_number", "amount", "currency", "description")
+
+
+def _fullmatch_unique(values: pd.Series, pattern: re.Pattern) -> np.ndarray:
+    """Проверяет pattern по уникальным значениям; пропуски считаются подходящими."""
+    codes, uniques = pd.factorize(values)
+    matched = pd.Series(uniques, dtype=object).astype(str).str.fullmatch(pattern).to_numpy(dtype=bool)
+    # Код -1 (пропуск) попадает на добавленный в конец True
+    mask: np.ndarray = np.append(matched, True)[codes]
+    return mask
+
+
+def fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Отпечатки операций (uint64) по дате, карте, сумме, валюте и описанию.
+
+    df - нормализованные данные (разобранные даты и суммы). Отпечаток не
+    зависит от точности дат, типа строковых колонок (str, object, category)
+    и порядка строк, поэтому одна и та же операция из разных выгрузок
+    получает один и тот же отпечаток.
+    """
+    parts: Dict[str, Any] = {}
+    for name in FINGERPRINT_COLUMNS:
+        if name not in df.columns:
+            continue
+        if name == "date":
+            parts[name] = df[name].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        elif name == "amount":
+            parts[name] = np.round(df[name].to_numpy(dtype=float, na_value=np.nan), 2)
+        else:
+            parts[name] = df[name]
+    hashes: np.ndarray = pd.util.hash_pandas_object(pd.DataFrame(parts, index=df.index), index=False).to_numpy()
+    return hashes
+
+
+def check_rules(raw: pd.DataFrame, parsed: pd.DataFrame, known: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Проверяет правила для всех строк и возвращает маски нарушений, по колонке на правило.
+
+    raw - выгрузка с нормализованными именами колонок до приведения типов,
+    parsed - те же строки с разобранными датами, суммами и отпечатками
+    (колонка fingerprint). Повтором считается корректная строка с отпечатком
+    более ранней корректной строки или одного из known (отпечатки уже
+    сохранённых операций).
+    Каждое правило - одна векторная операция над колонкой.
+    """
+    violations: Dict[str, np.ndarray] = {
+        "date": parsed["date"].isna().to_numpy(),
+        "amount": parsed["amount"].isna().to_numpy(),
+    }
+    if "status" in parsed.columns:
+        status = parsed["status"].astype(object)
+        violations["status"] = (status.notna() & ~status.isin(KNOWN_STATUSES)).to_numpy(dtype=bool)
+        violations["failed"] = (status == "FAILED").to_numpy(dtype=bool)
+    violations["card"] = ~_fullmatch_unique(parsed["card_number"], CARD_PATTERN)
+    # Повторы ищутся среди строк, прошедших остальные проверки: непроведённая
+    # операция не должна делать повтором следующую за ней успешную
+    passed = ~np.logical_or.reduce(list(violations.values()))
+    fingerprint = parsed["fingerprint"].to_numpy()[passed]
+    duplicated = pd.Series(fingerprint).duplicated(keep="first").to_numpy()
+    if known is not None and len(known):
+        duplicated = duplicated | np.isin(fingerprint, known)
+    violations["duplicate"] = np.zeros(len(raw), dtype=bool)
+    violations["duplicate"][passed] = duplicated
+    return pd.DataFrame(violations, index=raw.index)
+
+
+def near_duplicates(df: pd.DataFrame, minutes: float = 5) -> np.ndarray:
+    """Номера групп похожих операций: та же карта и сумма с разницей во времени не больше minutes.
+
+    Строки сортируются по карте, сумме и дате, после чего соседние строки
+    сравниваются за один проход: разница с предыдущей операцией той же карты
+    и суммы не больше minutes продолжает группу. Операции без похожих
+    получают -1, группы нумеруются с нуля.
+    """
+    if df.empty:
+        return np.zeros(0, dtype=np.int64)
+    cards = pd.factorize(df["card_number"])[0]
+    amounts = pd.factorize(np.round(df["amount"].to_numpy(dtype=float, na_value=np.nan), 2))[0]
+    dates = df["date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    order = np.lexsort((dates, amounts, cards))
+    cards, amounts, dates = cards[order], amounts[order], dates[order]
+
+    window = int(minutes * 60 * 1_000_000_000)
+    joined = (cards[1:] == cards[:-1]) & (amounts[1:] == amounts[:-1]) & (np.diff(dates) <= window)
+    runs = np.cumsum(np.r_[True, ~joined]) - 1
+    in_group = np.r_[joined, False] | np.r_[False, joined]
+    # Перенумеровываем группы из нескольких строк подряд, начиная с нуля
+    groups = np.full(len(df), -1, dtype=np.int64)
+    groups[order[in_group]] = pd.factorize(runs[in_group])[0]
+    return groups
+
+
+def report_violations(violations: pd.DataFrame) -> None:
+    """Пишет в журнал и метрики число отклонённых строк по правилам."""
+    metrics = current_metrics()
+    rejected = int(violations.any(axis=1).sum())
+    metrics.incr("rows_dropped", rejected)
+    if not rejected:
+        return
+    counts = violations.sum()
+    for rule, count in counts[counts > 0].items():
+        metrics.incr(f"rows_rejected.{rule}", int(count))
+    details = ", ".join(f"{REASONS[str(rule)]}: {int(count)}" for rule, count in counts[counts > 0].items())
+    logger.warning("Отклонено %d строк выгрузки (%s)", rejected, details)
+
+
+def quarantine_frame(
+    raw: pd.DataFrame, violations: pd.DataFrame, names: Optional[Mapping[str, str]] = None
+) -> pd.DataFrame:
+    """Отклонённые строки в исходном виде с колонкой причин.
+
+    names переименовывает колонки обратно в колонки выгрузки, чтобы
+    исправленный файл карантина можно было загрузить снова.
+    """
+    rejected = violations.any(axis=1).to_numpy()
+    flags = violations.to_numpy()[rejected]
+    rules = list(violations.columns)
+    frame = raw[rejected].rename(columns=dict(names or {}))
+    frame[REASON_COLUMN] = [", ".join(REASONS[rules[i]] for i in np.flatnonzero(row)) for row in flags]
+    return frame
+
+
+def save_quarantine(rejected: pd.DataFrame, path: str, append: bool = False) -> None:
+    """Сохраняет отклонённые строки в CSV; append дописывает их к уже отклонённым."""
+    if append and os.path.exists(path):
+        if rejected.empty:
+            return
+        rejected = pd.concat([pd.read_csv(path), rejected], ignore_index=True)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rejected.to_csv(path, index=False, encoding="utf-8-sig")
+    if len(rejected):
+        logger.info("Отклонённые строки (%d) сохранены в %s", len(rejected), path)
@@ -1,39 +1,108 @@
+from __future__ import annotations
+
+import base64
+import json
 import logging
 from datetime import datetime
-from typing import Dict, Any
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Tuple
 
+from src.lazy import lazy_import
 from src.utils import (
     get_greeting,
-    get_month_range,
+    get_period_range,
     load_user_settings,
     get_card_stats,
     get_top_transactions,
     get_currency_rates,
     get_stock_prices,
 )
+from src.logger import request_context
+from src.metrics import Metrics, collect, emit, has_sinks
+from src.query import Query
+from src.rollups import rollups_for
+from src.sqlite_store import open_sqlite_store
+from src.storage import load_transactions
+from src.validation import fingerprints
 from config import FILE_XLSX
 
-logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd  # noqa: F401
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+
+def get_main_page_json(
+    date_str: str,
+    store_dir: Optional[str] = None,
+    source: str = FILE_XLSX,
+    debug: bool = False,
+    user_id: Optional[str] = None,
+    data: Optional[pd.DataFrame] = None,
+    sqlite_path: Optional[str] = None,
+    period: str = "M",
+    market_max_age: float = 0,
+) -> Dict[str, Any]:
+    """Возвращает JSON-ответ для страницы 'Главная'.
 
+    source - файл выгрузки; при указании store_dir транзакции читаются
+    из memory-mapped хранилища (см. src.storage). При debug=True в ответ
+    добавляются метрики этапов (см. src.metrics). user_id выбирает
+    файл пользовательских настроек (см. src.settings). data - уже
+    загруженные транзакции (см. load_transactions), тогда source и store_dir не используются.
+    При указании sqlite_path статистика считается SQL-запросами к базе
+    SQLite (см. src.sqlite_store), построенной из source. period - период
+    статистики: W (неделя), M (месяц), Y (год) или ALL (всё время), см. get_period_range.
+    Курсы и цены, полученные не раньше market_max_age секунд назад, не запрашиваются
+    у API снова (см. get_currency_rates).
+    """
+    with request_context(), collect(enabled=debug or has_sinks()) as metrics:
+        response = _build_main_page(
+            date_str, store_dir, source, user_id, metrics, data, sqlite_path, period, market_max_age
+        )
+        emit("get_main_page_json", metrics)
+        if debug:
+            response["metrics"] = metrics.as_dict()
+    return response
 
-def get_main_page_json(date_str: str) -> Dict[str, Any]:
-    """Возвращает JSON-ответ для страницы 'Главная'."""
+
+def _build_main_page(
+    date_str: str,
+    store_dir: Optional[str],
+    source: str,
+    user_id: Optional[str],
+    metrics: Metrics,
+    data: Optional[pd.DataFrame] = None,
+    sqlite_path: Optional[str] = None,
+    period: str = "M",
+    market_max_age: float = 0,
+) -> Dict[str, Any]:
+    """Формирует ответ страницы 'Главная', замеряя время этапов."""
     try:
         # Парсим дату из строки
         dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-        start_date, end_date = get_month_range(dt)
+        start_date, end_date = get_period_range(dt, period)
+        in_period = Query(start=start_date, end=end_date)
 
-        # Загружаем данные из Excel файла
-        df = pd.read_excel(FILE_XLSX)
+        # Загружаем данные из Excel файла, из хранилища колонок или открываем базу SQLite
+        sqlite_store = open_sqlite_store(sqlite_path, source) if sqlite_path else None
+        if sqlite_store is None:
+            df = data if data is not None else load_transactions(source, store_dir=store_dir)
+            is_empty = df.empty
+        else:
+            is_empty = sqlite_store.count() == 0
 
         # Загружаем настройки пользователя
-        settings = load_user_settings()
+        with metrics.stage("settings"):
+            settings = load_user_settings(user_id=user_id)
         currencies = settings.get("user_currencies", [])
         stocks = settings.get("user_stocks", [])
 
-        if df.empty:
-            logging.warning("DataFrame транзакций пуст")
+        if is_empty:
+            logger.warning("DataFrame транзакций пуст")
             return {
                 "greeting": get_greeting(dt),
                 "cards": [],
@@ -42,56 +111,43 @@ def get_main_page_json(date_str: str) -> Dict[str, Any]:
                 "stock_prices": [],
             }
 
-        # Переименовываем колонки для единообразия
-        rename_map = {
-            "Дата операции": "date",
-            "дата": "date",
-            "Номер карты": "card_number",
-            "карта": "card_number",
-            "Сумма операции": "amount",
-            "сумма": "amount",
-            "Категория": "category",
-            "категория": "category",
-            "Описание": "description",
-            "описание": "description",
-        }
-        df = df.rename(columns={col: rename_map.get(col, col) for col in df.columns})
-
-        # Проверяем обязательные колонки
-        required_columns = ["date", "card_number", "amount"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            error_msg = f"Отсутствуют необходимые колонки: {', '.join(missing_columns)}"
-            logging.error(error_msg)
-            return {"error": error_msg}
-
-        # Преобразуем типы данных - улучшенная обработка дат
-        df["date"] = pd.to_datetime(df["date"], errors="coerce", dayfirst=True)
-        df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
-
-        # Удаляем строки с некорректными данными
-        initial_count = len(df)
-        df = df.dropna(subset=["date", "amount"])
-        dropped_count = initial_count - len(df)
-        if dropped_count > 0:
-            logging.warning(f"Удалено {dropped_count} строк с некорректными данными")
-
-        # Фильтруем по периоду (с 1-го числа месяца по указанную дату)
-        mask = (df["date"] >= start_date) & (df["date"] <= end_date)
-        df_filtered = df.loc[mask].copy()
-
-        if df_filtered.empty:
-            logging.info(f"Нет транзакций за период {start_date} - {end_date}")
+        # Фильтруем по периоду (по умолчанию с 1-го числа месяца по указанную дату)
+        with metrics.stage("filter"):
+            if sqlite_store is None:
+                df_filtered = in_period.apply(df)
+                rows_in_period = len(df_filtered)
+            else:
+                rows_in_period = sqlite_store.count(in_period)
+        metrics.incr("rows_in_period", rows_in_period)
+
+        if rows_in_period == 0:
+            logger.info("Нет транзакций за период %s - %s", start_date, end_date)
 
         # Получаем курсы валют и цены акций
-        currency_rates_dict = get_currency_rates(currencies)
-        stock_prices_dict = get_stock_prices(stocks)
+        with metrics.stage("currency_rates"):
+            currency_rates_dict = get_currency_rates(currencies, max_age=market_max_age)
+        with metrics.stage("stock_prices"):
+            stock_prices_dict = get_stock_prices(stocks, max_age=market_max_age)
+
+        with metrics.stage("card_stats"):
+            if sqlite_store is not None:
+                cards = sqlite_store.card_stats(in_period)
+            elif (data is not None or store_dir) and df["date"].is_monotonic_increasing:
+                # Долгоживущие данные: итоги по картам - разности накопленных сумм (см. src.rollups)
+                cards = rollups_for(df).card_stats(start_date, end_date)
+            else:
+                cards = get_card_stats(df_filtered)
+        with metrics.stage("top_transactions"):
+            if sqlite_store is None:
+                top_transactions = get_top_transactions(df_filtered, top_n=5)
+            else:
+                top_transactions = sqlite_store.top_transactions(in_period, top_n=5)
 
         # Формируем ответ в нужном формате
         response = {
             "greeting": get_greeting(dt),
-            "cards": get_card_stats(df_filtered),
-            "top_transactions": get_top_transactions(df_filtered, top_n=5),
+            "cards": cards,
+            "top_transactions": top_transactions,
             "currency_rates": [
                 {"currency": curr, "rate": rate} for curr, rate in currency_rates_dict.items() if rate is not None
             ],
@@ -100,18 +156,160 @@ def get_main_page_json(date_str: str) -> Dict[str, Any]:
             ],
         }
 
-        logging.info("JSON для главной страницы успешно сформирован")
+        logger.info("JSON для главной страницы успешно сформирован")
         return response
 
     except ValueError as e:
         error_msg = f"Ошибка формата данных: {e}"
-        logging.error(error_msg)
+        logger.error(error_msg)
         return {"error": error_msg}
     except FileNotFoundError as e:
         error_msg = f"Файл не найден: {e}"
-        logging.error(error_msg)
+        logger.error(error_msg)
         return {"error": error_msg}
     except Exception as e:
         error_msg = f"Неожиданная ошибка при формировании главной страницы: {type(e).__name__}: {e}"
-        logging.error(error_msg)
+        logger.error(error_msg)
         return {"error": error_msg}
+
+
+# Колонки записей истории операций
+LIST_COLUMNS = ["date", "card_number", "amount", "category", "description", "fingerprint"]
+MAX_PAGE_SIZE = 500
+# Сколько строк проверять за раз, когда страницу приходится добирать из строк, не подходящих под условия
+SCAN_BLOCK = 4096
+
+
+def _encode_cursor(date: pd.Timestamp, fingerprint: int) -> str:
+    raw = f"{pd.Timestamp(date).as_unit('ns').value}.{int(fingerprint)}"
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[pd.Timestamp, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        date, fingerprint = raw.split(".")
+        return pd.Timestamp(int(date)), int(fingerprint)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Некорректный курсор: {cursor}")
+
+
+def _row_fingerprints(df: pd.DataFrame, rows: slice) -> np.ndarray:
+    """Отпечатки строк среза; хранилища, построенные до появления отпечатков, считаются на лету."""
+    part = df.iloc[rows]
+    if "fingerprint" in part.columns:
+        stored: np.ndarray = part["fingerprint"].to_numpy(dtype=np.uint64)
+        return stored
+    return fingerprints(part)
+
+
+def _cursor_position(data: pd.DataFrame, moment: pd.Timestamp, fingerprint: int) -> Tuple[slice, Optional[int]]:
+    """Строки с датой moment и номер строки с отпечатком fingerprint среди них (None, если её нет).
+
+    Курсор однозначен, только если отпечаток не повторяется среди строк с той
+    же датой; иначе постраничная выдача могла бы зациклиться или пропустить
+    строки, поэтому такие данные отклоняются (загрузка удаляет повторы, см. src.validation).
+    """
+    run = Query(start=moment, end=moment).date_slice(data["date"], assume_sorted=True)
+    if run is None:
+        raise ValueError("Для постраничной выдачи операции должны быть отсортированы по дате")
+    hits = np.flatnonzero(_row_fingerprints(data, run) == np.uint64(fingerprint))
+    if len(hits) > 1:
+        raise ValueError(f"Повторяющиеся операции ({len(hits)} с одной датой и отпечатком) нельзя выдать постранично")
+    return run, run.start + int(hits[0]) if len(hits) else None
+
+
+def _page_rows(data: pd.DataFrame, query: Query, cursor: Optional[str], size: int, newest_first: bool) -> List[int]:
+    """Номера строк страницы (не больше size) после курсора в порядке выдачи."""
+    dates = data["date"]
+    window = query.date_slice(dates)
+    if window is None:
+        raise ValueError("Для постраничной выдачи операции должны быть отсортированы по дате")
+    lower, upper = window.start, window.stop
+
+    if cursor:
+        # Последняя выданная операция: строки с той же датой различаются отпечатком
+        run, position = _cursor_position(data, *_decode_cursor(cursor))
+        if newest_first:
+            upper = min(upper, position if position is not None else run.start)
+        else:
+            lower = max(lower, position + 1 if position is not None else run.stop)
+
+    conditions = Query(
+        cards=query.cards,
+        categories=query.categories,
+        min_amount=query.min_amount,
+        max_amount=query.max_amount,
+        statuses=query.statuses,
+        mcc=query.mcc,
+    )
+    filtered = conditions != Query()
+    rows: List[int] = []
+    # Строки проверяются блоками от курсора, поэтому дальняя страница стоит столько же, сколько первая
+    block = max(size * 4, SCAN_BLOCK) if filtered else size
+    while len(rows) < size and lower < upper:
+        if newest_first:
+            begin, end = max(lower, upper - block), upper
+            upper = begin
+        else:
+            begin, end = lower, min(upper, lower + block)
+            lower = end
+        found = np.arange(begin, end)
+        if filtered:
+            found = found[conditions.mask(data.iloc[begin:end])]
+        rows.extend((found[::-1] if newest_first else found)[: size - len(rows)].tolist())
+    return rows
+
+
+def iter_transactions_json(
+    data: pd.DataFrame,
+    query: Optional[Query] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    newest_first: bool = True,
+) -> Iterator[str]:
+    """Страница истории операций в виде частей JSON-объекта {"items": [...], "next_cursor": ...}.
+
+    data - операции, отсортированные по дате (см. load_transactions), query
+    отбирает карты, категории и период (см. src.query.Query). Пагинация по
+    курсору: next_cursor указывает на последнюю выданную операцию (дата и
+    отпечаток), и следующая страница начинается сразу после неё двоичным
+    поиском, без пропуска предыдущих страниц. Записи выдаются по одной, без
+    сборки всего ответа в памяти; None в next_cursor - страниц больше нет.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"Размер страницы должен быть от 1 до {MAX_PAGE_SIZE}")
+    # Одна лишняя строка показывает, есть ли следующая страница
+    rows = _page_rows(data, query or Query(), cursor, limit + 1, newest_first)
+    page = data.iloc[rows[:limit]]
+    columns = [column for column in LIST_COLUMNS if column in page.columns]
+
+    yield '{"items": ['
+    for number, values in enumerate(zip(*(page[column].tolist() for column in columns))):
+        record = {
+            column: None if value is None or value != value else value for column, value in zip(columns, values)
+        }
+        date = record.get("date")
+        if date is not None:
+            record["date"] = date.strftime("%Y-%m-%d %H:%M:%S")
+        yield ("," if number else "") + json.dumps(record, ensure_ascii=False)
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        moment, fingerprint = data["date"].iloc[last], _row_fingerprints(data, slice(last, last + 1))[0]
+        # Проверка до выдачи курсора: по неоднозначному курсору следующую страницу не найти
+        _cursor_position(data, moment, fingerprint)
+        next_cursor = _encode_cursor(moment, fingerprint)
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+def list_transactions(
+    data: pd.DataFrame,
+    query: Optional[Query] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    newest_first: bool = True,
+) -> str:
+    """Страница истории операций одной JSON-строкой (см. iter_transactions_json)."""
+    return "".join(iter_transactions_json(data, query, cursor, limit, newest_first))
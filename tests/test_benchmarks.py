@@ -0,0 +1,75 @@
+import pandas as pd
+
+from benchmarks.generator import EXPORT_COLUMNS, generate_export, generate_normalized
+from benchmarks.memory import check_budgets, main as memory_main, measure_call, parse_budget
+from benchmarks.run import compare, run_benchmarks
+from src.storage import normalize_transactions
+
+
+def test_generate_export_is_deterministic():
+    """Одинаковый seed даёт одинаковую выгрузку, другой seed - другую"""
+    first = generate_export(500, seed=1)
+    pd.testing.assert_frame_equal(first, generate_export(500, seed=1))
+    assert not first.equals(generate_export(500, seed=2))
+
+
+def test_generate_export_schema():
+    """Синтетическая выгрузка повторяет схему data/operations.xlsx"""
+    df = generate_export(1000)
+
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert set(df["Статус"]) <= {"OK", "FAILED"}
+    assert df["Номер карты"].dropna().str.fullmatch(r"\*\d{4}").all()
+    assert pd.to_datetime(df["Дата операции"], format="%d.%m.%Y %H:%M:%S").is_monotonic_decreasing
+
+
+def test_generate_normalized_matches_export():
+    """Нормализованный набор совпадает с нормализацией выгрузки"""
+    expected = normalize_transactions(generate_export(300, seed=7))
+    actual = generate_normalized(300, seed=7)
+
+    assert actual["amount"].tolist() == expected["amount"].tolist()
+    assert actual["date"].tolist() == expected["date"].tolist()
+    assert actual["category"].astype(str).tolist() == expected["category"].tolist()
+    assert actual["fingerprint"].tolist() == expected["fingerprint"].tolist()
+
+
+def test_run_benchmarks_reports_json_records():
+    """Каждый сценарий даёт запись с временем или текстом ошибки"""
+    report = run_benchmarks([200], scenarios=["get_card_stats", "get_main_page_json"], repeat=1)
+
+    assert {"python", "pandas", "seed"} <= set(report["meta"])
+    assert [r["scenario"] for r in report["results"]] == ["get_card_stats", "get_main_page_json"]
+    assert all("median" in r for r in report["results"])
+
+
+def test_compare_ratio():
+    """Сравнение прогонов считает отношение медиан"""
+    baseline = {"results": [{"scenario": "a", "rows": 10, "median": 2.0}]}
+    current = {"results": [{"scenario": "a", "rows": 10, "median": 3.0}, {"scenario": "b", "rows": 10, "median": 1.0}]}
+
+    assert compare(baseline, current) == [{"scenario": "a", "rows": 10, "baseline": 2.0, "current": 3.0, "ratio": 1.5}]
+
+
+def test_measure_call_reports_peak_allocation():
+    """Пик выделений tracemalloc учитывает временные массивы вызова"""
+    result = measure_call(lambda: bytearray(20 * 1024 * 1024))
+    assert result["traced_peak_mb"] >= 20
+    assert set(result) == {"traced_peak_mb", "rss_peak_mb", "rss_mb"}
+
+
+def test_memory_budgets(tmp_path):
+    """Бюджет для размера важнее общего; превышение бюджета даёт код 1"""
+    report = {
+        "results": [{"scenario": "a", "rows": 10, "traced_peak_mb": 3.0}, {"scenario": "a", "rows": 20, "error": "x"}]
+    }
+    budgets = [parse_budget("a=5"), parse_budget("a@10=2")]
+    assert check_budgets(report, budgets) == [
+        {"scenario": "a", "rows": 10, "metric": "traced_peak_mb", "value_mb": 3.0, "limit_mb": 2.0}
+    ]
+    assert check_budgets(report, [parse_budget("a=5")]) == []
+
+    output = tmp_path / "memory.json"
+    argv = ["--sizes", "200", "--scenarios", "get_card_stats", "--output", str(output)]
+    assert memory_main(argv + ["--budget", "get_card_stats=0"]) == 1
+    assert memory_main(argv + ["--budget", "get_card_stats=1000"]) == 0
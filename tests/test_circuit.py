@@ -0,0 +1,80 @@
+import pytest
+
+from src.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_threshold=2, base_backoff=1.0, max_backoff=4.0, clock=clock)
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+def test_opens_after_threshold(breaker):
+    """После порога ошибок вызовы отклоняются без обращения к сервису"""
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    assert breaker.state == OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, 1)
+    assert calls == []
+
+
+def test_success_resets_failures(breaker):
+    """Успешный вызов обнуляет счётчик ошибок"""
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.call(lambda: 42) == 42
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_single_probe(breaker, clock):
+    """По истечении паузы пропускается ровно одна проба"""
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 1.0
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_backoff(breaker, clock):
+    """Неудачная проба снова открывает цепь с удвоенной паузой, не больше максимума"""
+    breaker.record_failure()
+    breaker.record_failure()
+
+    expected = [2.0, 4.0, 4.0]
+    for backoff in expected:
+        clock.now += breaker.backoff
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.backoff == backoff
+
+    clock.now += 3.9
+    assert not breaker.allow()
@@ -0,0 +1,122 @@
+import json
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.cli import build_parser, format_result, run_cli
+
+
+@pytest.fixture(autouse=True)
+def no_init_app():
+    """Не настраиваем журнал и окружение во время тестов"""
+    with patch("src.cli.init_app"):
+        yield
+
+
+@pytest.fixture
+def source_csv(tmp_path):
+    """CSV-выгрузка с операциями за май 2024"""
+    path = tmp_path / "operations.csv"
+    pd.DataFrame(
+        {
+            "Дата операции": ["01.05.2024 10:00:00", "10.05.2024 12:00:00", "20.05.2024 18:00:00"],
+            "Номер карты": ["*1234", "*1234", "*5678"],
+            "Сумма операции": [1500.0, 712.0, 2300.0],
+            "Категория": ["Продукты", "Транспорт", "Продукты"],
+            "Описание": ["Магнит", "Метро", "Пятёрочка"],
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+def test_help_exits_without_error(capsys):
+    """--help выводит список команд"""
+    with pytest.raises(SystemExit) as exc:
+        build_parser().parse_args(["--help"])
+    assert exc.value.code == 0
+    assert "main-page" in capsys.readouterr().out
+
+
+def test_main_page_json(source_csv, capsys):
+    """Команда main-page печатает JSON главной страницы"""
+    with patch("src.views.get_currency_rates", return_value={}), patch("src.views.get_stock_prices", return_value={}):
+        code = run_cli(["main-page", "--file", source_csv, "--date", "2024-05-25 12:00:00"])
+
+    result = json.loads(capsys.readouterr().out)
+    assert code == 0
+    assert {card["last_digits"] for card in result["cards"]} == {"1234", "5678"}
+
+
+def test_spending_by_category_csv(source_csv, capsys, tmp_path, monkeypatch):
+    """Отчёт выводится в CSV и не сохраняется в data/ без --save"""
+    monkeypatch.chdir(tmp_path)
+    code = run_cli(["spending-by-category", "--file", source_csv, "--category", "Продукты", "--date", "2024-05-31",
+                    "--format", "csv"])
+
+    out = capsys.readouterr().out
+    assert code == 0
+    assert out.splitlines()[0] == "Дата операции,Сумма операции,Категория,Описание"
+    assert len(out.strip().splitlines()) == 3
+    assert not (tmp_path / "data").exists()
+
+
+def test_cashback_and_invest_bank(source_csv, capsys):
+    """Сервисные команды используют месяц из --date"""
+    run_cli(["cashback-categories", "--file", source_csv, "--date", "2024-05"])
+    assert json.loads(capsys.readouterr().out) == {"Продукты": 38, "Транспорт": 7}
+
+    run_cli(["invest-bank", "--file", source_csv, "--date", "2024-05", "--limit", "50"])
+    assert json.loads(capsys.readouterr().out) == 38.0
+
+
+def test_ingest_then_read_from_store(source_csv, tmp_path, capsys):
+    """ingest строит хранилище, которое затем используют другие команды"""
+    store_dir = str(tmp_path / "store")
+    run_cli(["ingest", "--file", source_csv, "--store", store_dir])
+    assert json.loads(capsys.readouterr().out)["rows"] == 3
+
+    run_cli(["cashback-categories", "--file", source_csv, "--store", store_dir, "--date", "2024-05"])
+    assert json.loads(capsys.readouterr().out)["Продукты"] == 38
+
+
+def test_search_builds_store_index_on_first_use(source_csv, tmp_path, capsys):
+    """ingest не строит поисковый индекс; команда search строит и сохраняет его"""
+    store_dir = tmp_path / "store"
+    run_cli(["ingest", "--file", source_csv, "--store", str(store_dir)])
+    capsys.readouterr()
+    assert not list(store_dir.glob("versions/*/search.npz"))
+
+    run_cli(["search", "пятер*", "--file", source_csv, "--store", str(store_dir)])
+    result = json.loads(capsys.readouterr().out)
+    assert [record["description"] for record in result] == ["Пятёрочка"]
+    assert len(list(store_dir.glob("versions/*/search.npz"))) == 1
+
+
+def test_repeat_and_profile(source_csv, tmp_path, capsys):
+    """--repeat выводит сводку времени, --profile сохраняет статистику cProfile"""
+    profile_path = tmp_path / "stats.prof"
+    run_cli(["cashback-categories", "--file", source_csv, "--date", "2024-05", "--repeat", "3", "--profile",
+             "--profile-output", str(profile_path)])
+
+    err = capsys.readouterr().err
+    summary = json.loads(err.splitlines()[0])
+    assert summary["repeat"] == 3
+    assert summary["min"] <= summary["mean"] <= summary["max"]
+    # Загрузка данных входит в каждый повтор и выводится отдельно
+    assert 0 < summary["load"]["min"] <= summary["min"]
+    assert "cumulative" in err
+    assert profile_path.exists()
+
+
+@pytest.mark.parametrize(
+    "result, fmt, expected",
+    [
+        ({"A": 1}, "csv", "key,value\nA,1\n"),
+        ([{"a": 1, "b": 2}], "csv", "a,b\n1,2\n"),
+        (12.5, "table", "12.5"),
+    ],
+)
+def test_format_result(result, fmt, expected):
+    """Преобразование результатов в выбранный формат"""
+    assert format_result(result, fmt) == expected
@@ -0,0 +1,138 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import fx
+from src.fx import RateHistory, convert_to_rub, to_rub
+from src.utils import get_card_stats
+
+
+@pytest.fixture
+def history(tmp_path):
+    """История курсов евро и доллара"""
+    path = tmp_path / "fx_rates.csv"
+    pd.DataFrame(
+        {
+            "date": ["2024-01-01", "2024-01-10", "2024-01-01"],
+            "currency": ["EUR", "EUR", "USD"],
+            "rate": [100.0, 110.0, 90.0],
+        }
+    ).to_csv(path, index=False)
+    return RateHistory(str(path))
+
+
+@pytest.fixture
+def transactions():
+    """Операции в разных валютах; вторая оплачена в рублях"""
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                ["2024-01-05 12:00", "2024-01-06 12:00", "2024-01-10 09:00", "2024-01-02 10:00", "2023-12-31 10:00"]
+            ),
+            "card_number": ["*1111", "*1111", "*2222", "*2222", "*2222"],
+            "amount": [-10.0, -2.0, -1.0, -500.0, -1.0],
+            "currency": ["EUR", "EUR", "EUR", "RUB", "USD"],
+            "payment_amount": [-10.0, -205.0, -1.0, -500.0, -1.0],
+            "payment_currency": ["EUR", "RUB", "EUR", "RUB", "USD"],
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_conversions():
+    fx.clear_cache()
+    yield
+    fx.clear_cache()
+
+
+def test_to_rub_as_of_rates(history, transactions):
+    """Курс берётся на дату операции; рублёвый платёж используется как есть"""
+    result = to_rub(transactions, history)
+    np.testing.assert_allclose(result[:4], [-1000.0, -205.0, -110.0, -500.0])
+    # Курса доллара до 2024-01-01 в истории нет
+    assert np.isnan(result[4])
+
+
+def test_convert_to_rub_is_idempotent(history, transactions):
+    """Повторный пересчёт не меняет суммы, исходные значения сохраняются"""
+    converted = convert_to_rub(transactions, history)
+    assert (converted["currency"] == "RUB").all()
+    assert converted["original_currency"].tolist() == transactions["currency"].tolist()
+    assert convert_to_rub(converted, history) is converted
+
+
+def test_convert_to_rub_cached_per_version(history, transactions):
+    """Пересчёт кэшируется по версии данных и сбрасывается при изменении истории"""
+    with patch("src.fx.to_rub", wraps=to_rub) as mock_to_rub:
+        convert_to_rub(transactions, history, version="v1")
+        convert_to_rub(transactions, history, version="v1")
+        assert mock_to_rub.call_count == 1
+
+        history.add(pd.DataFrame({"date": ["2024-01-05"], "currency": ["EUR"], "rate": [105.0]}))
+        converted = convert_to_rub(transactions, history, version="v1")
+        assert mock_to_rub.call_count == 2
+    assert converted["amount"].iloc[0] == -1050.0
+
+
+def test_history_reloads_changed_file(history):
+    """Изменённый файл истории перечитывается и получает новую версию"""
+    version = history.version
+    pd.DataFrame({"date": ["2024-02-01"], "currency": ["CNY"], "rate": [12.5]}).to_csv(history.path, index=False)
+    assert history.version != version
+    assert history.frame["currency"].tolist() == ["CNY"]
+
+
+def test_history_fetch(tmp_path):
+    """Курсы из apilayer переводятся в рубли за единицу валюты и сохраняются"""
+    history = RateHistory(str(tmp_path / "rates.csv"))
+    response = MagicMock()
+    response.json.return_value = {"rates": {"2024-01-01": {"EUR": 0.01}, "2024-01-02": {"EUR": 0.008}}}
+    with patch("src.fx.requests.get", return_value=response) as mock_get:
+        added = history.fetch(["EUR", "RUB"], date(2024, 1, 1), date(2024, 1, 2), api_key="key")
+
+    assert added == 2
+    assert mock_get.call_args.kwargs["params"]["symbols"] == "EUR"
+    history.save()
+    assert RateHistory(history.path).frame["rate"].tolist() == [100.0, 125.0]
+
+
+def test_card_stats_sum_in_rub(history, transactions):
+    """Статистика по картам складывает суммы в рублях"""
+    with patch("src.fx.default_history", history):
+        stats = get_card_stats(transactions.iloc[:4])
+    assert stats[0]["total_spent"] == -1205.0
+    assert stats[1]["total_spent"] == -610.0
+
+
+def test_without_history_foreign_operations_excluded(tmp_path, transactions, caplog):
+    """Без истории курсов валютные операции не в рублях исключаются из итогов с предупреждением"""
+    history = RateHistory(str(tmp_path / "missing.csv"))
+    with caplog.at_level("WARNING", logger="src.fx"):
+        result = to_rub(transactions, history)
+    np.testing.assert_allclose(result[[1, 3]], [-205.0, -500.0])
+    assert np.isnan(result[[0, 2, 4]]).all()
+    assert "3 валютных операций: они исключены" in caplog.text
+
+    with patch("src.fx.default_history", history):
+        stats = get_card_stats(transactions)
+    assert [card["total_spent"] for card in stats] == [-205.0, -500.0]
+
+
+def test_lookup_skips_missing_dates(history, transactions):
+    """Операции без даты получают NaN, остальные курсы находятся как обычно"""
+    transactions.loc[0, "date"] = pd.NaT
+    result = to_rub(transactions, history)
+    assert np.isnan(result[0])
+    np.testing.assert_allclose(result[1:4], [-205.0, -110.0, -500.0])
+
+
+def test_convert_to_rub_keeps_columns_without_copy(history, transactions):
+    """Пересчёт заменяет только суммы и валюту, остальные колонки не копируются"""
+    dates = transactions["date"].to_numpy()
+    result = convert_to_rub(transactions, history)
+    assert list(result.columns) == list(transactions.columns) + ["original_amount", "original_currency"]
+    assert np.shares_memory(result["date"].to_numpy(), dates)
+    assert (result["currency"] == "RUB").all()
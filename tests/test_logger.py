@@ -0,0 +1,125 @@
+import json
+import logging
+import multiprocessing
+import queue
+
+import pytest
+
+from src.logger import (
+    NonBlockingQueueHandler,
+    dropped_records,
+    forward_worker_logs,
+    get_request_id,
+    request_context,
+    setup_logging,
+    setup_worker_logging,
+    shutdown_logging,
+)
+from src.metrics import Metrics, emit, has_sinks
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Журнал во временном файле; после теста конфигурация снимается"""
+    path = tmp_path / "app.log"
+    yield path
+    shutdown_logging()
+
+
+def _read(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_json_lines_with_request_id(log_file):
+    """Записи пишутся JSON-строками с идентификатором запроса"""
+    setup_logging(str(log_file))
+    logger = logging.getLogger("test.json")
+
+    with request_context("req-1"):
+        logger.info("Накоплено %s ₽ за %s", 125.5, "2024-05")
+    logger.warning("вне запроса")
+    shutdown_logging()
+
+    records = _read(log_file)
+    assert records[0]["message"] == "Накоплено 125.5 ₽ за 2024-05"
+    assert records[0]["request_id"] == "req-1"
+    assert records[0]["level"] == "INFO"
+    assert records[1]["request_id"] is None
+
+
+def test_metrics_written_when_enabled(log_file):
+    """С log_metrics=True метрики операций попадают в журнал, после остановки приёмник отключается"""
+    setup_logging(str(log_file), log_metrics=True)
+    metrics = Metrics()
+    metrics.incr("dropped_rows", 2)
+    emit("main_page", metrics)
+    shutdown_logging()
+
+    entry = json.loads(_read(log_file)[0]["message"])
+    assert entry["metrics"] == "main_page"
+    assert entry["counters"] == {"dropped_rows": 2}
+    assert not has_sinks()
+
+
+def test_request_context_reuses_outer_id():
+    """Вложенный контекст без явного id наследует внешний"""
+    with request_context() as outer:
+        with request_context() as inner:
+            assert inner == outer == get_request_id()
+    assert get_request_id() is None
+
+
+def test_message_formatted_off_request_path():
+    """Обработчик очереди не форматирует сообщение при постановке в очередь"""
+    log_queue = queue.Queue()
+    handler = NonBlockingQueueHandler(log_queue)
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "value=%s", ("a",), None)
+
+    handler.emit(record)
+
+    queued = log_queue.get_nowait()
+    assert queued.msg == "value=%s"
+    assert queued.args == ("a",)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """Переполненная очередь отбрасывает записи и считает их"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    for i in range(3):
+        handler.emit(logging.LogRecord("x", logging.INFO, __file__, 1, "m%d", (i,), None))
+    assert handler.dropped == 2
+
+
+def test_rotation_by_size(log_file):
+    """При превышении размера файл ротируется"""
+    setup_logging(str(log_file), max_bytes=500, backup_count=2)
+    logger = logging.getLogger("test.rotation")
+    for i in range(50):
+        logger.info("строка номер %d", i)
+    shutdown_logging()
+
+    assert log_file.exists()
+    assert (log_file.parent / "app.log.1").exists()
+    assert dropped_records() == 0
+
+
+def _log_from_worker(log_queue):
+    setup_worker_logging(log_queue)
+    with request_context("worker-req"):
+        logging.getLogger("test.worker").info("из процесса пула %d", 1)
+        logging.getLogger("test.worker").debug("не попадёт в журнал")
+
+
+def test_worker_records_reach_parent_log(log_file):
+    """Записи процессов пула (spawn) пишет в файл родительский процесс"""
+    setup_logging(str(log_file))
+    context = multiprocessing.get_context("spawn")
+    log_queue, listener = forward_worker_logs(context)
+    worker = context.Process(target=_log_from_worker, args=(log_queue,))
+    worker.start()
+    worker.join(30)
+    listener.stop()
+    shutdown_logging()
+
+    entries = [entry for entry in _read(log_file) if entry["logger"] == "test.worker"]
+    assert [(entry["message"], entry["request_id"]) for entry in entries] == [("из процесса пула 1", "worker-req")]
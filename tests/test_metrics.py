@@ -0,0 +1,70 @@
+import pytest
+
+from src.metrics import NULL_METRICS, Metrics, add_sink, collect, current_metrics, emit, remove_sink
+
+
+def test_current_metrics_disabled_by_default():
+    """Вне collect() используется пустая реализация"""
+    metrics = current_metrics()
+    assert metrics is NULL_METRICS
+    with metrics.stage("x"):
+        metrics.incr("y")
+        metrics.cache("z", True)
+    assert metrics.as_dict()["counters"] == {}
+
+
+def test_collect_records_stages_counters_and_caches():
+    """Этапы суммируются, счётчики и попадания в кэш учитываются"""
+    with collect() as metrics:
+        with current_metrics().stage("load"):
+            pass
+        with current_metrics().stage("load"):
+            pass
+        current_metrics().incr("rows_dropped", 3)
+        current_metrics().cache("store", True)
+        current_metrics().cache("store", False)
+
+    data = metrics.as_dict()
+    assert set(data["stages_ms"]) == {"load"}
+    assert data["counters"] == {"rows_dropped": 3}
+    assert data["cache_hit_rate"] == {"store": 0.5}
+    assert current_metrics() is NULL_METRICS
+
+
+def test_collect_disabled():
+    """collect(enabled=False) не включает сбор"""
+    with collect(enabled=False) as metrics:
+        assert metrics is NULL_METRICS
+
+
+def test_emit_calls_sinks_and_survives_errors():
+    """Метрики передаются во все приёмники; ошибка одного не мешает остальным"""
+    received = []
+
+    def failing_sink(name, data):
+        raise RuntimeError("boom")
+
+    def sink(name, data):
+        received.append((name, data["counters"]))
+
+    add_sink(failing_sink)
+    add_sink(sink)
+    try:
+        metrics = Metrics()
+        metrics.incr("n")
+        emit("op", metrics)
+        emit("op", NULL_METRICS)
+    finally:
+        remove_sink(failing_sink)
+        remove_sink(sink)
+
+    assert received == [("op", {"n": 1})]
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_stage_propagates_exceptions(enabled):
+    """Исключения внутри этапа не подавляются"""
+    with collect(enabled) as metrics:
+        with pytest.raises(ValueError):
+            with metrics.stage("boom"):
+                raise ValueError
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generator import generate_export
+from src import storage
+from src.query import Query
+from src.sqlite_store import SQLiteStore
+from src.storage import EXPORT_NAMES, load_transactions
+
+
+@pytest.fixture
+def transactions():
+    """Операции, отсортированные по дате"""
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                [
+                    "2024-01-31 23:59:59",
+                    "2024-02-01 00:00:00",
+                    "2024-02-10 12:00:00",
+                    "2024-02-29 23:59:59",
+                    "2024-03-01 00:00:00",
+                ]
+            ),
+            "card_number": ["*1111", "*2222", "*1111", "*1111", "*2222"],
+            "amount": [-100.0, -50.0, 300.0, -20.0, -10.0],
+            "category": ["Супермаркеты", "Фастфуд", "Пополнения", "Супермаркеты", "Фастфуд"],
+            "status": ["OK", "OK", "OK", "FAILED", "OK"],
+        }
+    )
+
+
+def test_month_bounds(transactions):
+    """Месяц включает первую и последнюю секунду, но не соседние месяцы"""
+    assert Query.month(2024, 2).rows(transactions).tolist() == [1, 2, 3]
+    # Даты с точностью до секунд сравниваются без потери точности
+    seconds = transactions.assign(date=transactions["date"].astype("datetime64[s]"))
+    assert Query.month(2024, 2).rows(seconds).tolist() == [1, 2, 3]
+
+
+def test_sorted_slice_matches_full_mask(transactions):
+    """Срез по отсортированным датам даёт то же, что маска по перемешанным данным"""
+    query = Query.month(2024, 2, cards=["*1111"], max_amount=0, statuses=["OK", "FAILED"])
+    assert query.rows(transactions).tolist() == [3]
+
+    shuffled = transactions.iloc[[4, 2, 0, 3, 1]]
+    assert shuffled.iloc[query.rows(shuffled)].index.tolist() == [3]
+    assert query.mask(shuffled).tolist() == [False, False, False, True, False]
+
+
+def test_slice_without_copy(transactions):
+    """Период без других условий возвращается срезом исходных данных"""
+    result = Query(start="2024-02-01", end="2024-02-29 23:59:59").apply(transactions)
+    assert np.shares_memory(result["amount"].to_numpy(), transactions["amount"].to_numpy())
+
+
+def test_combine_queries(transactions):
+    """Оператор & сужает период и пересекает наборы значений"""
+    query = Query.last_months("2024-03-01", 1, categories=["Фастфуд", "Пополнения"]) & Query(
+        start="2024-02-05", categories=["Пополнения", "Супермаркеты"]
+    )
+    assert query.start == pd.Timestamp("2024-02-05")
+    assert query.categories == ("Пополнения",)
+    assert query.apply(transactions)["amount"].tolist() == [300.0]
+    assert query == Query(start="2024-02-05", end="2024-03-01", categories=["Пополнения"])
+
+
+def test_export_column_names(transactions):
+    """Условия работают и с колонками выгрузки"""
+    exported = transactions.rename(columns=EXPORT_NAMES)
+    query = Query(categories=["Фастфуд"], min_amount=-20)
+    assert query.apply(exported, columns=EXPORT_NAMES)[EXPORT_NAMES["amount"]].tolist() == [-10.0]
+
+
+def test_pushdown_matches_full_load(tmp_path, monkeypatch):
+    """Отбор при чтении CSV по частям и запрос к SQLite совпадают с отбором после полной загрузки"""
+    source = tmp_path / "operations.csv"
+    generate_export(3000).to_csv(source, index=False)
+    query = Query(start="2019-03-01", end="2020-02-15", categories=["Супермаркеты", "Фастфуд"], min_amount=-500)
+
+    expected = query.apply(load_transactions(str(source))).reset_index(drop=True)
+    monkeypatch.setattr(storage, "CHUNK_SIZE", 700)
+    pd.testing.assert_frame_equal(load_transactions(str(source), query=query), expected)
+
+    sqlite_store = SQLiteStore(str(tmp_path / "db.sqlite"))
+    sqlite_store.ingest(str(source))
+    assert sqlite_store.count(query) == len(expected)
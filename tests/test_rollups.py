@@ -0,0 +1,102 @@
+import gc
+
+import numpy as np
+
+import pandas as pd
+import pytest
+
+from benchmarks.generator import generate_normalized
+from src import rollups as rollups_module
+from src.fx import convert_to_rub
+from src.query import Query
+from src.rollups import DailySpending, Rollups, daily_spending_for, rollups_for
+from src.services import period_summary
+from src.utils import get_card_stats
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    """Синтетические операции в рублях, отсортированные по дате"""
+    return convert_to_rub(generate_normalized(5000).sort_values("date", kind="stable").reset_index(drop=True))
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [("2019-06-01", "2019-06-20 12:00:00"), ("2020-03-02", "2020-03-08 23:59:59"), (None, None), (None, "2018-05-01")],
+)
+def test_totals_match_groupby(transactions, start, end):
+    """Итоги по накопленным суммам совпадают с фильтром и groupby"""
+    rollups = Rollups(transactions)
+    in_period = Query(start=start, end=end).apply(transactions)
+
+    totals = rollups.totals("category", start, end)
+    expected = in_period.groupby("category", observed=True)["amount"].agg(["sum", "count"])
+    pd.testing.assert_series_equal(totals["amount"], expected["sum"], check_names=False)
+    assert totals["count"].tolist() == expected["count"].tolist()
+    assert rollups.summary(start, end)["income"] == pytest.approx(in_period["amount"].clip(lower=0).sum())
+    assert rollups.card_stats(start, end) == get_card_stats(in_period)
+
+
+def test_requires_sorted_dates(transactions):
+    """Неотсортированные операции не принимаются"""
+    with pytest.raises(ValueError):
+        Rollups(transactions.iloc[::-1])
+
+
+def test_rollups_cached_per_frame(transactions):
+    """Накопленные суммы строятся один раз на DataFrame и забываются вместе с ним"""
+    frame = transactions.copy()
+    assert rollups_for(frame) is rollups_for(frame)
+    assert rollups_for(frame.copy()) is not rollups_for(frame)
+
+    del frame
+    gc.collect()
+    assert all(ref() is not None for ref, _ in rollups_module._cache.values())
+
+
+def test_period_summary(transactions):
+    """Итоги за неделю по картам и категориям"""
+    result = period_summary(transactions, "2020-03-08 23:59:59", "W")
+    in_week = Query(start="2020-03-02", end="2020-03-08 23:59:59").apply(transactions)
+
+    assert result["start"] == "2020-03-02 00:00:00"
+    assert result["operations"] == len(in_week)
+    assert result["expenses"] == round(-in_week.loc[in_week["amount"] < 0, "amount"].sum(), 2)
+    assert sum(card["operations"] for card in result["cards"]) == in_week["card_number"].notna().sum()
+    assert "error" in period_summary(transactions, "2020-03-08 23:59:59", "Q")
+
+
+def _by_series(daily, values):
+    return {key: value for key, value in zip(daily.series, values) if value}
+
+
+def test_daily_spending_appends_new_rows(transactions, monkeypatch):
+    """Дописанные операции учитываются без пересчёта прежних; итоги совпадают с построенными заново"""
+    appended = []
+    original = DailySpending.append
+
+    def append(self, df):
+        appended.append(len(df) - self.rows)
+        original(self, df)
+
+    monkeypatch.setattr(DailySpending, "append", append)
+
+    half = transactions.iloc[: len(transactions) // 2].copy()
+    first = daily_spending_for(half)
+    extended = daily_spending_for(transactions.copy())
+    assert daily_spending_for(transactions.copy()) is extended
+    assert appended == [len(half), len(transactions) - len(half)]
+    assert first.rows == len(half)
+
+    scratch = DailySpending()
+    original(scratch, transactions)
+    day = int(np.datetime64("2020-06-15", "D").astype(np.int64))
+    for values in (lambda daily: daily.totals(day - 30, day), lambda daily: daily.ewma(day)):
+        expected = _by_series(scratch, values(scratch))
+        assert _by_series(extended, values(extended)) == pytest.approx(expected)
+
+    in_month = Query(start="2020-05-16", end="2020-06-15 23:59:59").apply(transactions)
+    expenses = -in_month["amount"].clip(upper=0)
+    grouped = expenses.groupby([in_month["card_number"], in_month["category"]], observed=True).sum()
+    totals = _by_series(extended, extended.totals(day - 30, day))
+    assert {key: totals.get(key, 0.0) for key in grouped.index} == pytest.approx(grouped.to_dict())
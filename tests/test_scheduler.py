@@ -0,0 +1,104 @@
+import http.client
+import json
+import time
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from benchmarks.load import LocalServer
+from src.scheduler import PrewarmScheduler, data_requests, market_requests
+
+
+class FakeWarm:
+    """Запоминает запросы прогрева; пути из failing завершаются ошибкой"""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = failing
+
+    def __call__(self, path, params):
+        self.calls.append((path, params))
+        if path in self.failing:
+            raise RuntimeError("нет данных")
+
+
+def test_run_measures_and_records_errors():
+    """Каждый запрос замеряется, ошибка одного не мешает остальным"""
+    warm = FakeWarm(failing={"/reports/spending-by-weekday"})
+    scheduler = PrewarmScheduler(warm, lambda: "v1", cpu_budget=1.0)
+
+    durations = scheduler.run(market_requests() + data_requests(date(2024, 5, 31)))
+    assert list(durations) == [
+        "/main",
+        "/main?period=W",
+        "/main?period=Y",
+        "/main?period=ALL",
+        "/reports/spending-by-weekday?date=2024-05-31",
+        "/services/cashback-categories?month=2024-05",
+    ]
+    assert scheduler.timings == durations
+    assert list(scheduler.errors) == ["/reports/spending-by-weekday?date=2024-05-31"]
+    assert len(warm.calls) == 6
+
+
+def test_budget_and_peak():
+    """Пауза удерживает долю прогрева, курсы обновляются за lead секунд до ближайшего пика"""
+    scheduler = PrewarmScheduler(FakeWarm(), lambda: "v1", cpu_budget=0.25, peak="08:00", lead=30)
+    assert scheduler.pause(0.3) == pytest.approx(0.9)
+    assert scheduler.next_peak(datetime(2024, 5, 31, 2, 0)) == datetime(2024, 5, 31, 8, 0)
+    assert scheduler.next_peak(datetime(2024, 5, 31, 7, 59, 40)) == datetime(2024, 6, 1, 8, 0)
+
+    with pytest.raises(ValueError):
+        PrewarmScheduler(FakeWarm(), lambda: "v1", cpu_budget=0)
+
+
+def test_step_after_ingest_and_before_peak():
+    """Новая версия данных прогревает всё один раз, время пика - только главную страницу"""
+    versions = iter(["v1", "v1", "v2"])
+    warm = FakeWarm()
+    scheduler = PrewarmScheduler(warm, lambda: next(versions), cpu_budget=1.0)
+    evening = datetime(2024, 5, 31, 21, 0)
+    prefetch_at = datetime(2024, 6, 1, 7, 59, 30)
+
+    assert scheduler.step(evening, prefetch_at) == prefetch_at
+    assert warm.calls[-2:] == data_requests(date(2024, 6, 1))
+    assert len(warm.calls) == 6
+
+    scheduler.step(datetime(2024, 6, 1, 7, 59, 30), prefetch_at)
+    assert warm.calls[6:] == market_requests()
+
+    scheduler.step(datetime(2024, 6, 1, 9, 0), prefetch_at.replace(day=2))
+    assert len(warm.calls) == 16
+
+
+def test_server_prewarm_fills_response_cache(tmp_path):
+    """Сервер с прогревом заранее кладёт ответы в LRU и показывает их длительность в /health"""
+    source = tmp_path / "operations.csv"
+    pd.DataFrame(
+        {
+            "Дата операции": ["01.05.2024 10:00:00", "10.05.2024 12:00:00"],
+            "Номер карты": ["*1234", "*5678"],
+            "Сумма операции": [-1512.0, -712.0],
+            "Категория": ["Продукты", "Транспорт"],
+            "Описание": ["Магнит", "Метро"],
+        }
+    ).to_csv(source, index=False)
+    options = dict(source=str(source), store_dir=str(tmp_path / "store"), executor="thread", workers=1)
+    with LocalServer(prewarm=True, cpu_budget=1.0, **options) as local:
+        server = local.server
+        deadline = time.monotonic() + 30
+        while len(server.scheduler.timings) < 6 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert "/main?period=Y" in server.scheduler.timings
+
+        # Ответ отчёта не зависит от курсов, поэтому его ETag не меняется со временем
+        path, params = data_requests(server.scheduler.next_peak(datetime.now()).date())[1]
+        _, etag = server._etag(path, params, False)
+        assert etag in server._responses
+
+        conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+        conn.close()
+        assert set(health["prewarm_ms"]) == set(server.scheduler.timings)
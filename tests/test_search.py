@@ -0,0 +1,102 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.search import SearchIndex
+from src.services import search_transactions
+from src.storage import TransactionStore
+
+
+@pytest.fixture
+def transactions():
+    """Нормализованные транзакции для поиска"""
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2024-01-01 10:00", "2024-01-05 12:00", "2024-02-01 09:00", "2024-02-10 18:00"]),
+            "card_number": ["*1234", "*5678", "*1234", None],
+            "amount": [-100.0, -250.5, -40.0, -500.0],
+            "category": ["Супермаркеты", "Транспорт", "Супермаркеты", "Переводы"],
+            "description": ["МАГНИТ", "Метро Санкт-Петербург", "Пятёрочка", "Иван И."],
+        }
+    )
+
+
+def test_search_case_insensitive_substring(transactions):
+    """Поиск подстроки не зависит от регистра кириллицы"""
+    index = SearchIndex.build(transactions)
+    assert index.search("магнит").tolist() == [0]
+    assert index.search("санкт").tolist() == [1]
+    assert index.search("СУПЕР").tolist() == [0, 2]
+
+
+def test_search_yo_and_prefix(transactions):
+    """'ё' совпадает с 'е', а 'слово*' ищет по началу слова"""
+    index = SearchIndex.build(transactions)
+    assert index.search("пятерочка").tolist() == [2]
+    assert index.search("пет*").tolist() == [1]
+    assert index.search("тер*").tolist() == []
+    assert index.search("тер").tolist() == [1, 2]
+
+
+def test_search_all_terms_and_filters(transactions):
+    """Все слова запроса обязательны; фильтры по датам и картам сужают результат"""
+    index = SearchIndex.build(transactions)
+    assert index.search("супер магнит").tolist() == [0]
+    assert index.search("супер", start="2024-01-15").tolist() == [2]
+    assert index.search("", cards=["*1234"]).tolist() == [0, 2]
+    assert index.search("", cards=["*0000"]).tolist() == []
+
+
+def test_search_append(transactions):
+    """Дополненный индекс совпадает с построенным заново"""
+    index = SearchIndex.build(transactions.iloc[:2])
+    index.append(transactions.iloc[2:])
+    full = SearchIndex.build(transactions)
+
+    for query in ["магнит", "супер*", "и", "перевод"]:
+        assert index.search(query).tolist() == full.search(query).tolist()
+    assert index.search("", cards=["*1234"]).tolist() == [0, 2]
+
+
+def test_search_index_save_load(tmp_path, transactions):
+    """Индекс сохраняется в .npz без pickle и после загрузки ищет так же"""
+    index = SearchIndex.build(transactions.iloc[:2])
+    index.append(transactions.iloc[2:])
+    index.version = "v1"
+    path = str(tmp_path / "search.npz")
+    index.save(path)
+
+    loaded = SearchIndex.load(path)
+    assert loaded.version == "v1"
+    assert loaded.size == index.size
+    for query in ["магнит", "супер*", "и", "перевод"]:
+        assert loaded.search(query).tolist() == index.search(query).tolist()
+    assert loaded.search("", cards=["*1234"], start="2024-01-02").tolist() == [2]
+
+
+def test_store_keeps_search_index(tmp_path, transactions):
+    """Хранилище сохраняет индекс и дополняет его новыми операциями"""
+    store_dir = str(tmp_path / "store")
+    store = TransactionStore(store_dir)
+    store.write(transactions.iloc[:3])
+    assert store.search_index().search("магнит").tolist() == [0]
+
+    store.append(transactions.iloc[3:].copy())
+    reopened = TransactionStore(store_dir)
+    assert reopened.search_index().version == reopened.version
+    assert reopened.search_index().search("иван").tolist() == [3]
+
+
+def test_search_transactions_json(transactions):
+    """Сервис поиска возвращает JSON-список операций"""
+    result = json.loads(search_transactions(transactions, "супер", limit=1))
+    assert result == [
+        {
+            "date": "01.01.2024 10:00:00",
+            "card_number": "*1234",
+            "amount": -100.0,
+            "category": "Супермаркеты",
+            "description": "МАГНИТ",
+        }
+    ]
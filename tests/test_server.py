@@ -0,0 +1,194 @@
+import asyncio
+import http.client
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from benchmarks.load import LocalServer, run_load
+from src.rollups import rollups_for
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """Сервер с пулом потоков на небольшой выгрузке за май 2024"""
+    work_dir = tmp_path_factory.mktemp("server")
+    source = work_dir / "operations.csv"
+    pd.DataFrame(
+        {
+            "Дата операции": ["01.05.2024 10:00:00", "10.05.2024 12:00:00", "20.05.2024 18:00:00"],
+            "Номер карты": ["*1234", "*1234", "*5678"],
+            "Сумма операции": [1512.0, 712.0, 2300.0],
+            "Категория": ["Продукты", "Транспорт", "Продукты"],
+            "Описание": ["Магнит", "Метро", "Пятёрочка"],
+        }
+    ).to_csv(source, index=False)
+    with LocalServer(source=str(source), store_dir=str(work_dir / "store"), executor="thread", workers=2) as local:
+        yield local.server
+
+
+def _get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_endpoints_share_keep_alive_connection(server):
+    """Несколько запросов проходят по одному соединению"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, body = _get(conn, "/services/cashback-categories?month=2024-05")
+    assert response.status == 200
+    assert response.getheader("Connection") == "keep-alive"
+    assert json.loads(body) == {"Продукты": 38, "Транспорт": 7}
+
+    sock = conn.sock
+    response, body = _get(conn, "/services/invest-bank?month=2024-05&limit=50")
+    assert conn.sock is sock
+    assert json.loads(body) == {"month": "2024-05", "limit": 50, "saved": 76.0}
+    conn.close()
+
+
+def test_etag_not_modified(server):
+    """Повторный запрос с полученным ETag получает 304 без тела"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    path = "/reports/spending-by-category?category=%D0%9F%D1%80%D0%BE%D0%B4%D1%83%D0%BA%D1%82%D1%8B&date=2024-05-31"
+    response, body = _get(conn, path)
+    etag = response.getheader("ETag")
+    assert response.status == 200
+    assert [row["Описание"] for row in json.loads(body)] == ["Магнит", "Пятёрочка"]
+
+    response, body = _get(conn, path, {"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+    conn.close()
+
+
+def test_etag_without_date_changes_daily(server):
+    """Без параметра date отчёт строится на сегодня, поэтому ETag меняется со сменой дня"""
+    params = {"category": "Продукты"}
+    days = iter([datetime(2024, 5, 31, 23, 59), datetime(2024, 6, 1, 0, 1), datetime(2024, 6, 1, 12, 0)])
+    with patch("src.server.datetime") as fake:
+        fake.now.side_effect = lambda: next(days)
+        etags = [server._etag("/reports/spending-by-category", params, False)[1] for _ in range(3)]
+    assert etags[0] != etags[1] == etags[2]
+    with_date = {**params, "date": "2024-05-31"}
+    assert server._etag("/reports/spending-by-category", with_date, False) == server._etag(
+        "/reports/spending-by-category", with_date, False
+    )
+
+
+def test_main_page(server):
+    """Главная страница собирается из данных, уже открытых сервером"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    with patch("src.views.get_currency_rates", return_value={}), patch("src.views.get_stock_prices", return_value={}):
+        response, body = _get(conn, "/main?date=2024-05-31%2012:00:00")
+    result = json.loads(body)
+    assert response.status == 200
+    assert {card["last_digits"] for card in result["cards"]} == {"1234", "5678"}
+    conn.close()
+
+
+def test_period_summary(server):
+    """Итоги за год по данным сервера"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, body = _get(conn, "/services/period-summary?date=2024-05-31%2012:00:00&period=Y")
+    result = json.loads(body)
+    assert response.status == 200
+    assert (result["income"], result["operations"]) == (4524.0, 3)
+    assert [card["income"] for card in result["cards"]] == [2224.0, 2300.0]
+
+    response, _ = _get(conn, "/services/period-summary?period=Q")
+    assert response.status == 400
+    conn.close()
+
+
+def test_distribution(server):
+    """Распределение поступлений за год по данным сервера"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, body = _get(conn, "/services/distribution?date=2024-05-31%2012:00:00&period=Y&side=income")
+    result = json.loads(body)
+    assert response.status == 200
+    assert result["operations"] == 3
+    assert [card["operations"] for card in result["cards"]] == [2, 1]
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "path, status",
+    [
+        ("/unknown", 404),
+        ("/services/invest-bank", 400),
+        ("/services/cashback-categories?month=may", 400),
+        ("/health", 200),
+    ],
+)
+def test_status_codes(server, path, status):
+    """Ошибки запроса возвращаются с HTTP-статусом и JSON-описанием"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, body = _get(conn, path)
+    assert response.status == status
+    assert isinstance(json.loads(body), dict)
+    conn.close()
+
+
+def test_repository_keeps_one_frame_per_version(server):
+    """Для одной версии данных сервер отдаёт один DataFrame, поэтому накопленные суммы строятся один раз"""
+    data = server.repository.data()
+    assert server.repository.data(server.repository.version()) is data
+    assert rollups_for(data) is rollups_for(server.repository.data())
+
+
+def test_distribution_sketches_live_with_data_version(server):
+    """Дневные распределения, построенные запросом, переиспользуются следующими запросами той же версии"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, _ = _get(conn, "/services/distribution?date=2024-05-31%2012:00:00&period=M&side=income")
+    assert response.status == 200
+    conn.close()
+
+    sketches = rollups_for(server.repository.data())._sketches
+    assert (None, "income") in sketches
+    daily = sketches[(None, "income")]
+    rollups_for(server.repository.data()).distribution(side="income")
+    assert sketches[(None, "income")] is daily
+
+
+def test_unexpected_error_returns_500(server):
+    """Непредвиденная ошибка (например, хранилище недоступно) даёт 500, соединение остаётся открытым"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    with patch.object(server.repository, "version", side_effect=FileNotFoundError("CURRENT")):
+        response, body = _get(conn, "/services/cashback-categories?month=2024-04")
+    assert response.status == 500
+    assert "FileNotFoundError" in json.loads(body)["error"]
+
+    response, _ = _get(conn, "/services/cashback-categories?month=2024-04")
+    assert response.status == 200
+    conn.close()
+
+
+def test_load_generator(server):
+    """Генератор нагрузки отправляет запросы по keep-alive соединениям и собирает сводку"""
+    paths = ["/services/cashback-categories?month=2024-05", "/health"]
+    report = asyncio.run(run_load(server.host, server.port, paths, connections=3, requests=30, conditional=True))
+    assert report["requests"] == 30
+    assert set(report["statuses"]) <= {"200", "304"}
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["max"]
+
+
+def test_transactions_pages(server):
+    """История операций по курсору: страницы не пересекаются и вместе дают все операции карты"""
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    response, body = _get(conn, "/transactions?card=*1234&limit=1")
+    first = json.loads(body)
+    assert response.status == 200
+    assert len(first["items"]) == 1
+
+    response, body = _get(conn, f"/transactions?card=*1234&limit=1&cursor={first['next_cursor']}")
+    second = json.loads(body)
+    assert second["items"][0]["date"] < first["items"][0]["date"]
+    assert {item["card_number"] for item in first["items"] + second["items"]} == {"*1234"}
+
+    response, _ = _get(conn, "/transactions?cursor=broken")
+    assert response.status == 400
+    conn.close()
@@ -1,6 +1,17 @@
+import json
+
 import pytest
 import pandas as pd
-from src.services import analyze_profitable_categories, investment_bank
+from src.cashback import CashbackProgram
+from src.services import (
+    analyze_profitable_categories,
+    find_person_transfers,
+    find_phone_payments,
+    find_recurring_payments,
+    forecast_spending,
+    investment_bank,
+    simulate_cashback,
+)
 
 
 @pytest.fixture
@@ -80,3 +91,133 @@ def test_investment_bank_invalid_date_format():
     """Если неверный формат месяца, функция не падает."""
     result = investment_bank("2025/05", [], 50)
     assert result == 0.0
+
+
+@pytest.fixture
+def transfers_df():
+    """Нормализованные операции с переводами и оплатой связи."""
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2024-01-01 10:00", "2024-01-02 11:00", "2024-01-03 12:00", "2024-01-04 13:00"]),
+            "card_number": ["*1234", "*1234", None, "*5678"],
+            "amount": [-500.0, -1000.0, -300.0, -200.0],
+            "category": ["Переводы", "Переводы", "Мобильная связь", "Переводы"],
+            "description": ["Иван С.", "Перевод между счетами", "МТС +7 921 111-22-33", "Иван С."],
+        }
+    )
+
+
+def test_find_person_transfers(transfers_df):
+    """Находим переводы физическим лицам по описанию 'Имя Ф.'."""
+    result = json.loads(find_person_transfers(transfers_df))
+    assert [r["date"] for r in result] == ["01.01.2024 10:00:00", "04.01.2024 13:00:00"]
+    assert {r["description"] for r in result} == {"Иван С."}
+
+
+def test_find_phone_payments(transfers_df):
+    """Находим операции с номером телефона в описании."""
+    result = json.loads(find_phone_payments(transfers_df))
+    assert len(result) == 1
+    assert result[0]["description"] == "МТС +7 921 111-22-33"
+    assert result[0]["card_number"] is None
+
+
+def test_find_phone_payments_missing_column():
+    """Без колонки описания возвращаем ошибку в JSON."""
+    result = json.loads(find_phone_payments(pd.DataFrame({"amount": [1]})))
+    assert "error" in result
+
+
+@pytest.fixture
+def history_df():
+    """Ежемесячная подписка с номером в описании, годовая оплата домена и нерегулярные покупки"""
+    rows = [
+        (pd.Timestamp("2021-01-15 03:00:00") + pd.DateOffset(months=i), -299.0, f"Яндекс Плюс №{i}", "Цифровые товары")
+        for i in range(12)
+        if i != 5
+    ]
+    rows += [(pd.Timestamp("2019-05-01") + pd.DateOffset(years=i), -1990.0, "DOMAIN.RU", "Сервис") for i in range(3)]
+    rows += [(pd.Timestamp("2021-01-01") + pd.Timedelta(days=i * i), -150.0, "Кофейня", "Фастфуд") for i in range(10)]
+    df = pd.DataFrame(rows, columns=["date", "amount", "description", "category"])
+    return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def test_find_recurring_payments(history_df):
+    """Подписки находятся по интервалам; пропущенный месяц не мешает, нерегулярные покупки не попадают"""
+    result = find_recurring_payments(history_df)
+
+    yearly, monthly = result["recurring"]
+    assert (monthly["period"], monthly["amount"], monthly["occurrences"]) == ("месяц", 299.0, 11)
+    assert (monthly["next_date"], monthly["active"]) == ("2022-01-15", True)
+    assert (yearly["description"], yearly["period"], yearly["next_date"]) == ("DOMAIN.RU", "год", "2022-05-01")
+    assert result["monthly_total"] == pytest.approx(299.0 + 1990.0 / 12, abs=0.5)
+
+    # Пропущенные списания делают подписки неактивными
+    later = pd.concat([history_df, pd.DataFrame({"date": [pd.Timestamp("2022-06-01")], "amount": [-10.0]})])
+    result = find_recurring_payments(later)
+    assert [item["active"] for item in result["recurring"]] == [False, False]
+    assert result["monthly_total"] == 0
+
+
+def test_forecast_spending_and_budgets():
+    """Прогноз до конца месяца по темпу трат и проверка бюджетов категорий и карт"""
+    dates = pd.date_range("2024-06-01 12:00:00", periods=10, freq="D")
+    df = pd.DataFrame(
+        {
+            "date": list(dates) + [pd.Timestamp("2024-06-01 09:00:00"), pd.Timestamp("2024-06-03 10:00:00")],
+            "card_number": ["*1111"] * 10 + ["*2222", "*1111"],
+            "category": ["Продукты"] * 10 + ["Транспорт", "Пополнения"],
+            "amount": [-100.0] * 10 + [-600.0, 5000.0],
+        }
+    ).sort_values("date", kind="stable", ignore_index=True)
+    budgets = {"Транспорт": 500, "Продукты": 2500, "*1111": 5000}
+    result = forecast_spending(df, "2024-06-10 20:00:00", budgets)
+
+    assert (result["days_elapsed"], result["days_left"]) == (10, 20)
+    groceries = next(item for item in result["categories"] if item["category"] == "Продукты")
+    # Одинаковые траты каждый день: сглаженный темп равен дневной сумме
+    assert groceries == {
+        "category": "Продукты",
+        "spent": 1000.0,
+        "daily_rate": 100.0,
+        "forecast": 3000.0,
+        "run_rate_forecast": 3000.0,
+    }
+    assert [card["card_number"] for card in result["cards"]] == ["*1111", "*2222"]
+    assert result["spent"] == 1600.0
+    assert [(item["name"], item["status"]) for item in result["budgets"]] == [
+        ("Транспорт", "превышен"),
+        ("Продукты", "будет превышен"),
+        ("*1111", "в пределах"),
+    ]
+    assert [item["name"] for item in result["alerts"]] == ["Транспорт", "Продукты"]
+    assert "error" in forecast_spending(df, "2024-06-10")
+
+
+def test_simulate_cashback():
+    """Программы сравниваются по картам и месяцам: ставки MCC, категория на выбор и месячный лимит"""
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2024-01-05", "2024-01-10", "2024-01-15", "2024-01-20", "2024-02-03"]),
+            "card_number": ["*1111", "*1111", "*1111", "*2222", "*1111"],
+            "category": ["Супермаркеты", "Фастфуд", "Топливо", "Супермаркеты", "Топливо"],
+            "mcc": [5411.0, 5814.0, 5541.0, 5411.0, 5541.0],
+            "amount": [-10000.0, -2000.0, -3000.0, -1000.0, -20000.0],
+        }
+    )
+    programs = [
+        CashbackProgram("1%"),
+        CashbackProgram("5% на выбор", increased_rate=0.05, choose=1, monthly_cap=600),
+        CashbackProgram("10% на топливо", base_rate=0.0, mcc_rates={5541: 0.1}),
+    ]
+    result = simulate_cashback(df, programs)
+
+    assert result["totals"] == {"1%": 360.0, "5% на выбор": 1200.0, "10% на топливо": 2300.0}
+    first, second = result["cards"]
+    assert first["cashback"] == {"1%": 350.0, "5% на выбор": 1150.0, "10% на топливо": 2300.0}
+    assert first["best"] == "10% на топливо"
+    assert (second["best"], second["months"]) == (
+        "5% на выбор",
+        [{"month": "2024-01", "cashback": 50.0, "increased": ["Супермаркеты"]}],
+    )
+    assert "error" in simulate_cashback(df.drop(columns="amount"))
@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+import pytest
+
+from src.metrics import collect
+from src.settings import EMPTY_SETTINGS, SettingsProvider
+
+
+def _write(path, data, mtime_ns=None):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    path = tmp_path / "user_settings.json"
+    _write(path, {"user_currencies": ["USD"], "user_stocks": ["AAPL"]}, mtime_ns=1_000_000_000)
+    return path
+
+
+def test_cached_until_file_changes(settings_file):
+    """Файл разбирается один раз, пока не изменились mtime или размер"""
+    provider = SettingsProvider()
+
+    with collect() as metrics:
+        first = provider.get(str(settings_file))
+        provider.get(str(settings_file))
+    version = provider.version(str(settings_file))
+
+    assert first == {"user_currencies": ["USD"], "user_stocks": ["AAPL"]}
+    assert metrics.as_dict()["cache_hit_rate"]["settings"] == 0.5
+
+    _write(settings_file, {"user_currencies": ["EUR", "GBP"], "user_stocks": []}, mtime_ns=2_000_000_000)
+
+    assert provider.get(str(settings_file))["user_currencies"] == ["EUR", "GBP"]
+    assert provider.version(str(settings_file)) > version
+
+
+def test_returns_copy(settings_file):
+    """Изменение результата не портит кэш"""
+    provider = SettingsProvider()
+    provider.get(str(settings_file))["user_currencies"].append("XXX")
+    assert provider.get(str(settings_file))["user_currencies"] == ["USD"]
+
+
+def test_invalid_json_keeps_last_good_settings(settings_file):
+    """При ошибке разбора сохраняются последние корректные настройки и версия"""
+    provider = SettingsProvider()
+    good = provider.get(str(settings_file))
+    version = provider.version(str(settings_file))
+
+    settings_file.write_text("not a json{", encoding="utf-8")
+    os.utime(settings_file, ns=(3_000_000_000, 3_000_000_000))
+
+    assert provider.get(str(settings_file)) == good
+    assert provider.version(str(settings_file)) == version
+
+
+def test_missing_file_returns_empty(tmp_path):
+    """Отсутствующий файл даёт пустые настройки"""
+    assert SettingsProvider().get(str(tmp_path / "nope.json")) == EMPTY_SETTINGS
+
+
+def test_per_user_profiles_and_lru(tmp_path, settings_file):
+    """Профили пользователей хранятся в LRU ограниченного размера"""
+    users = tmp_path / "users"
+    users.mkdir()
+    for user in ["anna", "boris", "vera"]:
+        _write(users / f"{user}.json", {"user_currencies": [user.upper()], "user_stocks": []})
+
+    provider = SettingsProvider(max_profiles=2, settings_dir=str(users))
+    assert provider.for_user("anna")["user_currencies"] == ["ANNA"]
+    provider.for_user("boris")
+    provider.for_user("vera")
+
+    assert list(provider._entries) == [str(users / "boris.json"), str(users / "vera.json")]
+    with pytest.raises(ValueError):
+        provider.for_user("../secret")
+
+
+def test_watcher_reloads_in_background(settings_file):
+    """Фоновый поток замечает изменение файла без вызова get"""
+    provider = SettingsProvider()
+    provider.get(str(settings_file))
+    version = provider.version(str(settings_file))
+    provider.start_watching(interval=0.01)
+    try:
+        _write(settings_file, {"user_currencies": ["CNY"], "user_stocks": []}, mtime_ns=4_000_000_000)
+        deadline = time.monotonic() + 2
+        while provider.version(str(settings_file)) == version and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        provider.stop_watching()
+
+    assert provider.get(str(settings_file))["user_currencies"] == ["CNY"]
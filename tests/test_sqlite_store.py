@@ -0,0 +1,124 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from pandas.core.indexes.accessors import DatetimeProperties
+
+from benchmarks.generator import generate_export
+from src.fx import RateHistory
+from src.query import Query
+from src.reports import spending_by_category, spending_by_weekday
+from src.sqlite_store import SQLiteStore, open_sqlite_store
+from src.storage import EXPORT_NAMES, load_transactions
+from src.utils import get_card_stats, get_top_transactions
+
+START = pd.Timestamp("2020-06-01")
+END = pd.Timestamp("2020-06-25 13:00:00")
+PERIOD = Query(start=START, end=END)
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """Синтетическая выгрузка на несколько тысяч операций"""
+    path = tmp_path_factory.mktemp("sqlite") / "operations.csv"
+    generate_export(5000).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def store(source, tmp_path_factory):
+    return open_sqlite_store(str(tmp_path_factory.mktemp("db") / "transactions.sqlite"), source)
+
+
+@pytest.fixture(scope="module")
+def transactions(source):
+    return load_transactions(source)
+
+
+def test_count_and_freshness(store, source, transactions):
+    """База знает число строк и версию исходного файла"""
+    assert store.count() == len(transactions)
+    in_period = transactions[(transactions["date"] >= START) & (transactions["date"] <= END)]
+    assert store.count(PERIOD) == len(in_period)
+    assert store.is_fresh(source)
+    assert not SQLiteStore(store.path + ".missing").is_fresh(source)
+
+
+def test_card_stats_and_top_match_pandas(store, transactions):
+    """Агрегаты SQL совпадают с расчётом в pandas до последнего знака"""
+    in_period = transactions[(transactions["date"] >= START) & (transactions["date"] <= END)]
+    assert store.card_stats(PERIOD) == get_card_stats(in_period)
+    assert store.top_transactions(PERIOD) == get_top_transactions(in_period)
+
+
+def test_reports_match_pandas(store, transactions):
+    """Отчёты из базы совпадают с отчётами по DataFrame"""
+    exported = transactions.rename(columns=EXPORT_NAMES)
+    pd.testing.assert_frame_equal(
+        store.spending_by_category("Пополнения", "2020-06-30"),
+        spending_by_category.__wrapped__(exported, "Пополнения", "2020-06-30"),
+    )
+
+    # Локаль ru_RU есть не везде - названия дней сравниваем в локали по умолчанию
+    day_name = DatetimeProperties.day_name
+    with patch.object(DatetimeProperties, "day_name", lambda self, locale=None: day_name(self)):
+        pd.testing.assert_frame_equal(
+            store.spending_by_weekday("2020-06-30"),
+            spending_by_weekday.__wrapped__(exported, "2020-06-30"),
+        )
+
+
+def test_open_rebuilds_stale_store(source, tmp_path):
+    """Изменение выгрузки приводит к перестроению базы"""
+    changed = tmp_path / "operations.csv"
+    generate_export(100).to_csv(changed, index=False)
+    store = open_sqlite_store(str(tmp_path / "db.sqlite"), str(changed))
+    version = store.version
+
+    assert open_sqlite_store(store.path, str(changed)).version == version
+    generate_export(200).to_csv(changed, index=False)
+    rebuilt = open_sqlite_store(store.path, str(changed))
+    assert rebuilt.version != version
+    assert rebuilt.count() == len(load_transactions(str(changed)))
+
+
+def test_ingest_in_chunks_matches_pandas(source, transactions, tmp_path):
+    """База, загруженная по частям, хранит операции в порядке и с id полной загрузки"""
+    with patch("src.storage.CHUNK_SIZE", 700):
+        store = open_sqlite_store(str(tmp_path / "chunks.sqlite"), source)
+    exported = transactions.rename(columns=EXPORT_NAMES)
+
+    assert store.count() == len(transactions)
+    assert store.card_stats(PERIOD) == get_card_stats(PERIOD.apply(transactions))
+    pd.testing.assert_frame_equal(
+        store.spending_by_category("Пополнения", "2020-06-30"),
+        spending_by_category.__wrapped__(exported, "Пополнения", "2020-06-30"),
+    )
+
+
+def test_foreign_operations_without_rate(tmp_path):
+    """Валютные операции без курса записываются с пустой суммой и пропускаются агрегатами, как в pandas"""
+    source = tmp_path / "operations.csv"
+    pd.DataFrame(
+        {
+            "Дата операции": ["01.05.2024 10:00:00", "02.05.2024 11:00:00", "03.05.2024 12:00:00"],
+            "Номер карты": ["*1234", "*1234", "*5678"],
+            "Сумма операции": [-500.0, -13.67, -42.0],
+            "Валюта операции": ["RUB", "CNY", "CNY"],
+            "Сумма платежа": [-500.0, -13.67, -42.0],
+            "Валюта платежа": ["RUB", "CNY", "CNY"],
+            "Категория": ["Супермаркеты", "Супермаркеты", "Фастфуд"],
+            "Описание": ["Магнит", "Taobao", "KFC"],
+        }
+    ).to_csv(source, index=False)
+    period = Query(start="2024-05-01", end="2024-05-31")
+
+    with patch("src.fx.default_history", RateHistory(str(tmp_path / "fx_rates.csv"))):
+        store = open_sqlite_store(str(tmp_path / "db.sqlite"), str(source))
+        transactions = load_transactions(str(source))
+
+    assert store.count() == 3
+    assert store.card_stats(period) == get_card_stats(transactions)
+    assert store.top_transactions(period) == get_top_transactions(transactions)
+    assert len(store.top_transactions(period)) == 1
+    assert [card["total_spent"] for card in store.card_stats(period)] == [-500.0, 0.0]
@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from config import ROOT_DIR
+
+# Бюджет на импорт точки входа; с запасом относительно десятков миллисекунд на CI
+IMPORT_TIME_BUDGET = 0.2
+
+HEAVY_MODULES = ["pandas", "numpy", "requests", "dotenv"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from src.lazy import is_loaded
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if is_loaded(m)]}}))
+"""
+
+
+def _probe(module: str) -> dict:
+    """Импортирует модуль в чистом интерпретаторе и возвращает время и загруженные зависимости"""
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["main", "src.views", "src.reports", "src.services", "src.utils", "src.storage"])
+def test_import_does_not_load_heavy_dependencies(module):
+    """Импорт модулей не загружает pandas, numpy, requests и dotenv"""
+    result = _probe(module)
+    assert result["loaded"] == []
+
+
+def test_main_import_time_budget():
+    """Импорт main укладывается в бюджет времени"""
+    result = _probe("main")
+    assert result["elapsed"] < IMPORT_TIME_BUDGET
+
+
+def test_lazy_module_loads_on_first_use():
+    """Ленивый модуль загружается при обращении к атрибуту"""
+    code = (
+        "from src.lazy import lazy_import, is_loaded\n"
+        "m = lazy_import('json.tool')\n"
+        "before = is_loaded('json.tool')\n"
+        "m.main\n"
+        "print(before, is_loaded('json.tool'))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.split() == ["False", "True"]
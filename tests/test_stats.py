@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from benchmarks.generator import generate_normalized
+from src.fx import convert_to_rub
+from src.query import Query
+from src.rollups import Rollups
+from src.services import spending_distribution
+from src.stats import RELATIVE_ACCURACY, Sketch
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    """Синтетические операции в рублях, отсортированные по дате"""
+    return convert_to_rub(generate_normalized(5000).sort_values("date", kind="stable").reset_index(drop=True))
+
+
+def _assert_close(sketch, values, qs=(0.5, 0.9, 0.99)):
+    exact = np.quantile(values, qs, method="lower")
+    assert list(sketch.quantiles(qs).values()) == pytest.approx(exact, rel=RELATIVE_ACCURACY)
+
+
+def test_sketch_quantiles_and_merge():
+    """Квантили точны до 1%, объединение равно распределению всех значений"""
+    rng = np.random.default_rng(3)
+    first, second = rng.lognormal(6, 1.5, 3000), rng.lognormal(8, 0.5, 1000)
+
+    _assert_close(Sketch.from_values(first), first)
+    merged = Sketch.from_values(first) + Sketch.from_values(second)
+    assert merged.count == 4000
+    _assert_close(merged, np.concatenate([first, second]))
+    np.testing.assert_array_equal(merged.counts, Sketch.from_values(np.concatenate([first, second])).counts)
+
+    assert Sketch.from_values([0.0, -5.0]).quantile(0.5) is None
+    assert Sketch.from_values([50, 150, 700]).histogram([0, 100, 500, np.inf]).tolist() == [1, 1, 1]
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [("2019-06-01 10:30:00", "2019-08-20 12:00:00"), ("2020-03-02", "2020-03-02 18:00:00"), (None, None)],
+)
+def test_period_distributions_match_exact(transactions, start, end):
+    """Распределения за произвольный период совпадают с квантилями по самим операциям"""
+    rollups = Rollups(transactions)
+    in_period = Query(start=start, end=end, max_amount=-0.001).apply(transactions)
+
+    sketches = rollups.distributions("category", start, end)
+    expected = in_period.groupby("category", observed=True)["amount"]
+    assert {key: sketch.count for key, sketch in sketches.items()} == expected.count().to_dict()
+    for category, amounts in expected:
+        _assert_close(sketches[category], -amounts.to_numpy())
+
+    total = rollups.distribution(start, end)
+    assert total.count == len(in_period)
+    _assert_close(total, -in_period["amount"].to_numpy())
+
+
+def test_spending_distribution(transactions):
+    """Сводка по картам и категориям за год; операции без карты входят только в общий итог"""
+    result = spending_distribution(transactions, "2019-12-31 23:59:59", "Y", side="income")
+
+    in_year = Query(start="2019-01-01", end="2019-12-31 23:59:59", min_amount=0.001).apply(transactions)
+    assert result["operations"] == len(in_year)
+    assert sum(card["operations"] for card in result["cards"]) == in_year["card_number"].notna().sum()
+    assert sum(result["histogram"]) == len(in_year)
+    assert result["p50"] == pytest.approx(np.quantile(in_year["amount"], 0.5, method="lower"), rel=0.01)
+
+    assert "error" in spending_distribution(transactions, "2019-12-31 23:59:59", "Y", side="refunds")
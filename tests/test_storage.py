@@ -0,0 +1,141 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.query import Query
+from src.services import analyze_profitable_categories
+from src.storage import TransactionStore, load_transactions, normalize_transactions
+from src.utils import get_card_stats
+
+
+def _is_memory_mapped(values: np.ndarray) -> bool:
+    """Проверяет, что массив является видом на np.memmap."""
+    base = values
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return True
+        base = getattr(base, "base", None)
+    return False
+
+
+@pytest.fixture
+def export_df():
+    """Фрагмент выгрузки банка с колонками на кириллице"""
+    return pd.DataFrame(
+        {
+            "Дата операции": ["02.01.2024 10:00:00", "01.01.2024 09:00:00", "плохая дата", "03.01.2024 12:30:00"],
+            "Номер карты": ["*1234", "*5678", "*1234", None],
+            "Сумма операции": [100.0, 250.5, 10.0, 40.0],
+            "Категория": ["Супермаркеты", "Транспорт", "Супермаркеты", "Переводы"],
+            "Описание": ["Магнит", "Метро", "Магнит", "Иван И."],
+        }
+    )
+
+
+@pytest.fixture
+def source_csv(tmp_path, export_df):
+    path = tmp_path / "operations.csv"
+    export_df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_normalize_renames_sorts_and_drops(export_df):
+    """Нормализация переименовывает колонки, отбрасывает плохие даты и сортирует по дате"""
+    df = normalize_transactions(export_df)
+
+    assert list(df.columns) == ["date", "card_number", "amount", "category", "description", "fingerprint"]
+    assert len(df) == 3
+    assert df["date"].is_monotonic_increasing
+    assert df["amount"].tolist() == [250.5, 100.0, 40.0]
+
+
+def test_normalize_missing_columns():
+    """Без обязательных колонок нормализация сообщает об ошибке"""
+    with pytest.raises(ValueError, match="card_number"):
+        normalize_transactions(pd.DataFrame({"date": ["2024-01-01"], "amount": [1]}))
+
+
+def test_store_roundtrip_is_memory_mapped(tmp_path, source_csv):
+    """Хранилище возвращает те же данные поверх memory-mapped массивов"""
+    store = TransactionStore(str(tmp_path / "store"))
+    expected = normalize_transactions(pd.read_csv(source_csv))
+
+    df = store.ingest(source_csv)
+
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_categorical=False)
+    assert _is_memory_mapped(df["amount"].to_numpy())
+    assert _is_memory_mapped(df["date"].to_numpy())
+    assert _is_memory_mapped(df["category"].array.codes)
+    assert df["card_number"].isna().sum() == 1
+
+
+def test_store_reopened_in_other_process_view(tmp_path, source_csv):
+    """Новый экземпляр хранилища читает данные без разбора выгрузки"""
+    store_dir = str(tmp_path / "store")
+    TransactionStore(store_dir).ingest(source_csv)
+
+    reopened = TransactionStore(store_dir)
+    assert reopened.is_fresh(source_csv)
+    assert reopened.frame()["category"].tolist() == ["Транспорт", "Супермаркеты", "Переводы"]
+
+
+def test_load_transactions_rebuilds_stale_store(tmp_path, source_csv, export_df):
+    """При изменении выгрузки хранилище перестраивается и получает новую версию"""
+    store_dir = str(tmp_path / "store")
+    load_transactions(source_csv, store_dir=store_dir)
+    version = TransactionStore(store_dir).version
+
+    export_df.iloc[:2].to_csv(source_csv, index=False)
+    os.utime(source_csv, ns=(1, 1))
+    df = load_transactions(source_csv, store_dir=store_dir)
+
+    assert len(df) == 2
+    assert TransactionStore(store_dir).version != version
+
+
+def test_load_transactions_without_store(source_csv):
+    """Без каталога хранилища выгрузка просто нормализуется"""
+    df = load_transactions(source_csv)
+    assert len(df) == 3
+    assert "amount" in df.columns
+
+
+def test_store_groupby_skips_unobserved_categories(tmp_path, source_csv):
+    """Карты и категории вне периода не попадают в итоги с нулями, как и без хранилища"""
+    stored = TransactionStore(str(tmp_path / "store")).ingest(source_csv)
+    plain = load_transactions(source_csv)
+    query = Query(start="2024-01-02")
+
+    assert get_card_stats(query.apply(stored)) == get_card_stats(query.apply(plain))
+    assert [card["last_digits"] for card in get_card_stats(query.apply(stored))] == ["1234"]
+    assert analyze_profitable_categories(stored, 2024, 1) == analyze_profitable_categories(plain, 2024, 1)
+
+
+def test_store_publishes_whole_versions(tmp_path, source_csv):
+    """Запись публикует новую версию целиком; прежний читатель дочитывает свою, старые версии удаляются"""
+    store_dir = str(tmp_path / "store")
+    first = TransactionStore(store_dir)
+    frame = first.ingest(source_csv)
+
+    errors = []
+
+    def rewrite():
+        try:
+            TransactionStore(store_dir).write(frame.iloc[:2])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rewrite) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert first.frame()["category"].tolist() == ["Транспорт", "Супермаркеты", "Переводы"]
+    reopened = TransactionStore(store_dir)
+    assert len(reopened.frame()) == 2
+    assert len(os.listdir(os.path.join(store_dir, "versions"))) <= 3
@@ -6,15 +6,31 @@ from datetime import datetime
 from unittest.mock import patch, MagicMock
 import requests
 
+from src.circuit import get_breaker, reset_breakers
 from src.utils import (
+    clear_market_cache,
     get_greeting,
     get_month_range,
+    get_period_range,
     load_user_settings,
     get_currency_rates,
     get_stock_prices,
     get_card_stats,
     get_top_transactions,
+    detect_date_format,
+    parse_dates,
 )
+from src.metrics import collect
+
+
+@pytest.fixture(autouse=True)
+def reset_market_state():
+    """Каждый тест начинает с закрытыми предохранителями и пустым кэшем курсов"""
+    reset_breakers()
+    clear_market_cache()
+    yield
+    reset_breakers()
+    clear_market_cache()
 
 
 class TestGetGreeting:
@@ -75,6 +91,70 @@ class TestGetMonthRange:
         assert end.microsecond == 123456
 
 
+class TestGetPeriodRange:
+    """Тесты для функции get_period_range"""
+
+    @pytest.mark.parametrize(
+        "period, expected_start",
+        [
+            ("W", datetime(2024, 5, 13)),
+            ("M", datetime(2024, 5, 1)),
+            ("Y", datetime(2024, 1, 1)),
+            ("ALL", None),
+        ],
+    )
+    def test_period_start(self, period, expected_start):
+        """Начало периода: понедельник, 1-е число, 1 января или без начала"""
+        dt = datetime(2024, 5, 16, 14, 30, 45)
+        assert get_period_range(dt, period) == (expected_start, dt)
+
+    def test_unknown_period(self):
+        """Неизвестный период - ошибка формата"""
+        with pytest.raises(ValueError):
+            get_period_range(datetime(2024, 5, 16), "Q")
+
+
+class TestParseDates:
+    """Тесты для функции parse_dates"""
+
+    @pytest.mark.parametrize(
+        "values, expected",
+        [
+            (["30.12.2021 23:56:21", "01.01.2022 00:00:00"], "%d.%m.%Y %H:%M:%S"),
+            (["30.12.2021", "01.02.2022"], "%d.%m.%Y"),
+            (["2021-12-30", "2022-02-01", "bad"], "%Y-%m-%d"),
+            (["вчера", "сегодня"], None),
+        ],
+    )
+    def test_detect_format(self, values, expected):
+        """Формат определяется по большинству значений"""
+        assert detect_date_format(values) == expected
+
+    def test_matches_pandas(self):
+        """Результат совпадает с pd.to_datetime с dayfirst"""
+        values = pd.Series(["30.12.2021 23:56:21", "01.02.2022 08:05:00", "29.02.2024 12:00:00"] * 5)
+        expected = pd.to_datetime(values, dayfirst=True)
+        pd.testing.assert_series_equal(parse_dates(values), expected)
+
+    def test_reports_unparsed_rows(self, caplog):
+        """Несуществующие даты и мусор получают NaT и попадают в журнал и метрики"""
+        values = pd.Series(["2024-01-02", "31.04.2024", None, "invalid", "2024-01-03", "05.01.2024 10:00"])
+        with collect() as metrics:
+            result = parse_dates(values)
+
+        assert result.isna().tolist() == [False, True, True, True, False, False]
+        assert result[5] == pd.Timestamp("2024-01-05 10:00")
+        assert metrics.as_dict()["counters"]["dates_unparsed"] == 2
+        assert "'invalid'" in caplog.text
+
+    def test_repeated_values_parsed_once(self):
+        """Повторяющиеся даты разбираются по уникальным значениям с сохранением порядка"""
+        values = pd.Series(["01.03.2024", "02.03.2024", None, "bad"] * 100)
+        result = parse_dates(values)
+        assert result.iloc[:4].tolist()[:2] == [pd.Timestamp("2024-03-01"), pd.Timestamp("2024-03-02")]
+        assert result.isna().sum() == 200
+
+
 class TestLoadUserSettings:
     """Тесты для функции load_user_settings"""
 
@@ -186,6 +266,39 @@ class TestGetCurrencyRates:
         result = get_currency_rates(["EUR"])
         assert isinstance(result["EUR"], (int, float))
 
+    @patch("src.utils.requests.get")
+    @patch.dict(os.environ, {"API_KEY": "test_api_key"})
+    def test_get_currency_rates_circuit_open(self, mock_get):
+        """После нескольких ошибок API не вызывается, возвращаются последние курсы"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"rates": {"EUR": 0.85}}
+        mock_get.return_value = mock_response
+        get_currency_rates(["EUR"])
+
+        mock_get.side_effect = requests.exceptions.Timeout()
+        threshold = get_breaker("exchangerates").failure_threshold
+        for _ in range(threshold):
+            get_currency_rates(["EUR"])
+        assert mock_get.call_count == threshold + 1
+
+        assert get_currency_rates(["EUR"]) == {"EUR": 0.85}
+        assert mock_get.call_count == threshold + 1
+
+    @patch("src.utils.requests.get")
+    @patch.dict(os.environ, {"API_KEY": "test_api_key"})
+    def test_get_currency_rates_max_age(self, mock_get):
+        """Недавно полученные курсы не запрашиваются снова, новые валюты - запрашиваются"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"rates": {"EUR": 0.85, "GBP": 0.75}}
+        mock_get.return_value = mock_response
+        get_currency_rates(["EUR"])
+
+        assert get_currency_rates(["EUR"], max_age=60) == {"EUR": 0.85}
+        assert mock_get.call_count == 1
+        get_currency_rates(["EUR", "GBP"], max_age=60)
+        get_currency_rates(["EUR"])
+        assert mock_get.call_count == 3
+
 
 class TestGetStockPrices:
     """Тесты для функции get_stock_prices"""
@@ -210,6 +323,18 @@ class TestGetStockPrices:
         assert set(result.keys()) == set(stocks)
         assert all(isinstance(value, (int, float)) for value in result.values())
 
+    @patch("src.utils.requests.get")
+    @patch.dict(os.environ, {"API_KEY": "test_api_key"})
+    def test_get_stock_prices_circuit_open(self, mock_get):
+        """При недоступном API запросы по остальным акциям не отправляются"""
+        mock_get.return_value = MagicMock(status_code=503)
+        stocks = ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN"]
+
+        result = get_stock_prices(stocks)
+
+        assert set(result) == set(stocks)
+        assert mock_get.call_count == get_breaker("alpha_vantage").failure_threshold
+
 
 class TestGetCardStats:
     """Тесты для функции get_card_stats"""
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from src import storage
+from src.metrics import collect
+from src.query import Query
+from src.storage import TransactionStore, load_transactions, split_transactions
+from src.validation import REASON_COLUMN, fingerprints, near_duplicates
+
+
+@pytest.fixture
+def export_df():
+    """Выгрузка с ошибками разных видов"""
+    return pd.DataFrame(
+        {
+            "Дата операции": [
+                "31.12.2021 16:44:00",
+                "плохая дата",
+                "30.12.2021 10:00:00",
+                "29.12.2021 09:00:00",
+                "31.12.2021 16:44:00",
+                "28.12.2021 12:00:00",
+            ],
+            "Номер карты": ["*7197", "*7197", "*5091", "7197", "*7197", None],
+            "Статус": ["OK", "OK", "FAILED", "OK", "OK", "OK"],
+            "Сумма операции": [-160.89, -64.0, -500.0, -10.0, -160.89, "abc"],
+            "Категория": ["Супермаркеты", "Фастфуд", "Различные товары", "Каршеринг", "Супермаркеты", "Переводы"],
+            "Описание": ["Магнит", "Mouse Tail", "Ozon.ru", "Ситидрайв", "Магнит", "Иван Н."],
+        }
+    )
+
+
+def test_split_rows_with_reasons(export_df):
+    """Корректные строки нормализуются, остальные отклоняются с причинами в колонках выгрузки"""
+    with collect() as metrics:
+        valid, rejected = split_transactions(export_df)
+
+    assert valid["description"].tolist() == ["Магнит"]
+    assert list(rejected.columns) == list(export_df.columns) + [REASON_COLUMN]
+    assert rejected["Описание"].tolist() == ["Mouse Tail", "Ozon.ru", "Ситидрайв", "Магнит", "Иван Н."]
+    assert rejected["Дата операции"].iloc[0] == "плохая дата"
+    assert rejected[REASON_COLUMN].tolist() == [
+        "некорректная дата",
+        "операция не проведена",
+        "некорректный номер карты",
+        "повтор операции",
+        "некорректная сумма",
+    ]
+    assert metrics.counters["rows_dropped"] == 5
+    assert metrics.counters["rows_rejected.failed"] == 1
+
+
+def test_store_keeps_quarantine(export_df, tmp_path):
+    """Хранилище сохраняет отклонённые строки и дополняет их при дописывании"""
+    source = tmp_path / "operations.csv"
+    export_df.iloc[:3].to_csv(source, index=False)
+    store = TransactionStore(str(tmp_path / "store"))
+
+    assert len(store.ingest(str(source))) == 1
+    assert store.meta["rejected"] == 2
+    assert store.quarantine()["Описание"].tolist() == ["Mouse Tail", "Ozon.ru"]
+
+    # Операция "Магнит" уже есть в хранилище: пересекающаяся выгрузка её не дублирует
+    store.append(export_df.iloc[3:].copy())
+    assert len(store.frame()) == 1
+    assert store.meta["rejected"] == 5
+    assert store.quarantine()["Описание"].tolist() == ["Mouse Tail", "Ozon.ru", "Ситидрайв", "Магнит", "Иван Н."]
+
+
+def test_chunked_read_finds_repeats_across_chunks(export_df, tmp_path, monkeypatch):
+    """Повтор из другой части CSV отклоняется так же, как при полной загрузке"""
+    source = tmp_path / "operations.csv"
+    export_df.to_csv(source, index=False)
+    monkeypatch.setattr(storage, "CHUNK_SIZE", 2)
+
+    query = Query(start="2021-12-01")
+    pd.testing.assert_frame_equal(load_transactions(str(source), query=query), load_transactions(str(source)))
+
+
+def test_fingerprints_identify_operations(export_df):
+    """Отпечаток не зависит от порядка строк и типов колонок; повторы с другими полями выгрузки отклоняются"""
+    valid = split_transactions(export_df)[0]
+    reordered = split_transactions(export_df.iloc[::-1])[0]
+    assert valid["fingerprint"].tolist() == reordered["fingerprint"].tolist()
+    categorical = valid.assign(description=valid["description"].astype("category"))
+    assert fingerprints(categorical).tolist() == valid["fingerprint"].tolist()
+
+    # Та же операция с другим кэшбэком - повтор
+    repeated = pd.concat([export_df.iloc[:1], export_df.iloc[:1].assign(Кэшбэк=5)], ignore_index=True)
+    assert len(split_transactions(repeated)[0]) == 1
+
+
+def test_near_duplicates():
+    """Похожие операции: та же карта и сумма в пределах окна"""
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                ["2024-01-01 10:00", "2024-01-01 10:03", "2024-01-01 10:20", "2024-01-01 10:01", "2024-01-01 10:02"]
+            ),
+            "card_number": ["*1111", "*1111", "*1111", "*2222", "*1111"],
+            "amount": [-100.0, -100.0, -100.0, -100.0, -55.0],
+        }
+    )
+    assert near_duplicates(df, minutes=5).tolist() == [0, 0, -1, -1, -1]
+    assert near_duplicates(df, minutes=30).tolist() == [0, 0, 0, -1, -1]
@@ -1,8 +1,11 @@
+import json
+
 import pytest
 import pandas as pd
 from unittest.mock import patch
 
-from src.views import get_main_page_json
+from src.query import Query
+from src.views import get_main_page_json, list_transactions
 
 
 class TestGetMainPageJson:
@@ -287,8 +290,8 @@ class TestGetMainPageJson:
 
             result = get_main_page_json("2024-01-15 12:00:00")
 
-            mock_currency.assert_called_once_with(currencies)
-            mock_stocks.assert_called_once_with(stocks)
+            mock_currency.assert_called_once_with(currencies, max_age=0)
+            mock_stocks.assert_called_once_with(stocks, max_age=0)
 
     @patch("src.views.pd.read_excel")
     def test_greeting_time_variations(self, mock_read_excel,
@@ -381,3 +384,84 @@ class TestGetMainPageJson:
         card = result["cards"][0]
         assert card["total_spent"] == 1999999.99
         assert card["cashback"] == 20000.0
+
+    @patch("src.views.pd.read_excel")
+    def test_debug_metrics(self, mock_read_excel, sample_transactions_df, mock_utils):
+        """В режиме debug ответ содержит метрики этапов"""
+        mock_read_excel.return_value = sample_transactions_df
+
+        result = get_main_page_json("2024-01-15 12:00:00", debug=True)
+
+        stages = result["metrics"]["stages_ms"]
+        assert {"read_source", "normalize", "filter", "card_stats", "top_transactions"} <= set(stages)
+        assert result["metrics"]["counters"]["rows_in_period"] == 10
+
+    @patch("src.views.pd.read_excel")
+    def test_no_metrics_without_debug(self, mock_read_excel, sample_transactions_df, mock_utils):
+        """Без debug метрики в ответ не попадают"""
+        mock_read_excel.return_value = sample_transactions_df
+
+        result = get_main_page_json("2024-01-15 12:00:00")
+
+        assert "metrics" not in result
+
+
+class TestListTransactions:
+    """Тесты постраничной истории операций"""
+
+    @pytest.fixture
+    def transactions(self):
+        """Операции по дате; у части одинаковые даты"""
+        from src.storage import normalize_transactions
+
+        dates = pd.to_datetime(["2024-01-01 10:00:00"] * 3 + ["2024-01-02 09:00:00"] * 4 + ["2024-01-03 12:00:00"] * 3)
+        return normalize_transactions(
+            pd.DataFrame(
+                {
+                    "date": dates,
+                    "card_number": ["*1234", "*5678"] * 5,
+                    "amount": [-float(value) for value in range(1, 11)],
+                    "category": ["Food", "Food", "Transport", "Food", "Shopping"] * 2,
+                    "description": [f"Покупка {value}" for value in range(10)],
+                }
+            )
+        )
+
+    @staticmethod
+    def _walk(data, query, limit, newest_first):
+        items, cursor = [], None
+        while True:
+            page = json.loads(list_transactions(data, query, cursor, limit, newest_first))
+            assert len(page["items"]) <= limit
+            items += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return items
+
+    @pytest.mark.parametrize("limit", [1, 2, 4, 50])
+    @pytest.mark.parametrize("newest_first", [True, False])
+    def test_pages_cover_query(self, transactions, limit, newest_first):
+        """Страницы по курсору без пропусков и повторов дают все подходящие операции по порядку"""
+        query = Query(cards=["*1234"], categories=["Food", "Shopping"])
+        expected = query.apply(transactions)["description"].tolist()
+        items = self._walk(transactions, query, limit, newest_first)
+        assert [item["description"] for item in items] == (expected[::-1] if newest_first else expected)
+
+    def test_period_and_invalid_arguments(self, transactions):
+        """Период задаётся запросом; неверный курсор и размер страницы - ошибка"""
+        page = json.loads(list_transactions(transactions, Query(start="2024-01-02", end="2024-01-02 23:59:59")))
+        assert [item["amount"] for item in page["items"]] == [-7.0, -6.0, -5.0, -4.0]
+        assert page["next_cursor"] is None
+
+        with pytest.raises(ValueError):
+            list_transactions(transactions, cursor="broken")
+        with pytest.raises(ValueError):
+            list_transactions(transactions, limit=0)
+
+    @pytest.mark.parametrize("newest_first", [True, False])
+    def test_duplicate_fingerprints_rejected(self, transactions, newest_first):
+        """Повторы с одной датой и отпечатком дают ошибку, а не бесконечную или неполную выдачу"""
+        duplicated = pd.concat([transactions.iloc[:4], transactions.iloc[[3]], transactions.iloc[4:]])
+        duplicated = duplicated.reset_index(drop=True)
+        with pytest.raises(ValueError, match="Повторяющиеся"):
+            self._walk(duplicated, Query(), 1, newest_first)